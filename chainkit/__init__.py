@@ -1,8 +1,8 @@
 """Main tools kit of the project HBitGuard"""
 
 from .decoders import decode_address, decode_uint256
-from .tx_tracker import analyze_tx
-from .registry_event import build_registry
+from .tx_tracker import analyze_tx, analyze_block, analyze_many, decode_logs
+from .registry_event import build_registry, registry_from_abi
 from .min_abi import get_erc20_abi, get_v2_factory_abi, get_v2_pair_abi
 
 from . import collector
@@ -14,9 +14,9 @@ __all__ = [
     # from decoders
     "decode_adress", "decode_uint256",
     # from tx_tracker
-    "analyze_tx",
+    "analyze_tx", "analyze_block", "analyze_many", "decode_logs",
     # from registry_event
-    "build_registry",
+    "build_registry", "registry_from_abi",
     # from min_abi
     "get_erc20_abi", "get_v2_factory_abi", "get_v2_pair_abi",
     # submodules
@@ -0,0 +1,139 @@
+"""
+Parallel historical backfill.
+- Split [from_block, to_block] into shards, processed by a thread or process pool
+- Same collector / decode logic as the Runner (analyze_many, or decode_logs with log_only)
+- Each shard appends results to its own JSON lines file and checkpoints (next block, byte offset),
+  a crash resumes only unfinished shards, from their last checkpoint
+- Shard files are merged in block order into a single output file
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from web3 import Web3
+import json, os, time
+
+from .collector import collect_tx_hashes, normalize_watchlist, PANCAKE_V2_BCFX_BUSD_ADDR, MAX_ADDRESSES_PER_FILTER
+from .runner import Runner
+from .tx_tracker import analyze_many, decode_logs
+
+def split_range(from_block: int, to_block: int, shard_blocks: int) -> List[tuple]:
+    shard_blocks = max(1, int(shard_blocks))
+    return [(b, min(to_block, b + shard_blocks - 1)) for b in range(from_block, to_block + 1, shard_blocks)]
+
+def _shard_paths(checkpoint_dir: str, b0: int, b1: int) -> tuple:
+    base = os.path.join(checkpoint_dir, f"shard_{b0}_{b1}")
+    return base + ".jsonl", base + ".ckpt.json"
+
+def _read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_checkpoint(path: str, data: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def run_shard(rpc_url: str, watchlist: List[str], b0: int, b1: int, checkpoint_dir: str, step: int=500, topics: Optional[List[str]]=None, log_only: bool=False, batch_size: int=100, shard_size: int=MAX_ADDRESSES_PER_FILTER) -> Dict[str, Any]:
+    """Process one shard [b0, b1] in steps of `step` blocks, resuming from its checkpoint. Module-level to be picklable."""
+    out_path, ckpt_path = _shard_paths(checkpoint_dir, b0, b1)
+    ckpt = _read_checkpoint(ckpt_path) or {"next_block": b0, "offset": 0, "txs": 0}
+    start = ckpt["next_block"]
+    if start > b1:
+        return {"range": (b0, b1), "blocks": 0, "txs": ckpt["txs"], "secs": 0.0}
+
+    w3 = Web3(Web3.HTTPProvider(rpc_url))
+    first = start
+    t0 = time.time()
+    with open(out_path, "a+b") as f:
+        # Drop anything written after the last checkpoint (crash between write and checkpoint)
+        f.truncate(ckpt["offset"])
+        f.seek(ckpt["offset"])
+        while start <= b1:
+            end = min(b1, start + step - 1)
+            logs = collect_tx_hashes(w3, watchlist, start, end, topics=topics, shard_size=shard_size)
+            if log_only:
+                out = decode_logs(logs)
+            else:
+                hashes = [h for hashes in Runner._group_by_block(logs).values() for h in hashes]
+                out = analyze_many(w3, hashes, batch_size=batch_size)
+            for r in out:
+                f.write((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            ckpt = {"next_block": end + 1, "offset": f.tell(), "txs": ckpt["txs"] + len(out)}
+            _write_checkpoint(ckpt_path, ckpt)
+            start = end + 1
+    return {"range": (b0, b1), "blocks": b1 - first + 1, "txs": ckpt["txs"], "secs": time.time() - t0}
+
+def merge_shards(shards: Iterable[tuple], checkpoint_dir: str, out_path: str) -> int:
+    """Concatenate shard files in block order into out_path, return the number of results"""
+    n = 0
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as out:
+        for b0, b1 in sorted(shards):
+            shard_path, _ = _shard_paths(checkpoint_dir, b0, b1)
+            with open(shard_path, "rb") as f:
+                for line in f:
+                    out.write(line)
+                    n += 1
+    os.replace(tmp, out_path)
+    return n
+
+def backfill(rpc_url: str, from_block: int, to_block: int, out_path: str, checkpoint_dir: str, watchlist: Optional[Iterable[str]]=None, shard_blocks: int=10000, step: int=500, workers: int=4, use_processes: bool=False, topics: Optional[List[str]]=None, log_only: bool=False, batch_size: int=100, shard_size: int=MAX_ADDRESSES_PER_FILTER) -> Dict[str, Any]:
+    """
+    Backfill [from_block, to_block] in parallel and merge the results into out_path (JSON lines).
+    Re-running with the same arguments and checkpoint_dir resumes the unfinished shards only.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    watch = normalize_watchlist(watchlist or [PANCAKE_V2_BCFX_BUSD_ADDR])
+    shards = split_range(from_block, to_block, shard_blocks)
+    total_blocks = to_block - from_block + 1
+
+    pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    t0 = time.time()
+    done_blocks = 0
+    print(f"[backfill] blocks [{from_block},{to_block}] shards={len(shards)} workers={workers} {'processes' if use_processes else 'threads'}")
+    with pool_cls(max_workers=workers) as ex:
+        futures = {
+            ex.submit(run_shard, rpc_url, watch, b0, b1, checkpoint_dir, step, topics, log_only, batch_size, shard_size): (b0, b1)
+            for b0, b1 in shards
+        }
+        for fut in as_completed(futures):
+            b0, b1 = futures[fut]
+            st = fut.result()
+            done_blocks += b1 - b0 + 1
+            elapsed = max(time.time() - t0, 1e-9)
+            print(f"[backfill] shard [{b0},{b1}] txs={st['txs']} | {done_blocks}/{total_blocks} blocks, {done_blocks / elapsed:.1f} blocks/s")
+
+    n = merge_shards(shards, checkpoint_dir, out_path)
+    elapsed = max(time.time() - t0, 1e-9)
+    stats = {"blocks": total_blocks, "results": n, "secs": elapsed, "blocks_per_sec": total_blocks / elapsed}
+    print(f"[backfill] done: {n} results in {elapsed:.1f}s ({stats['blocks_per_sec']:.1f} blocks/s) -> {out_path}")
+    return stats
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Parallel historical backfill")
+    parser.add_argument("from_block", type=int)
+    parser.add_argument("to_block", type=int)
+    parser.add_argument("--out", default="backfill.jsonl")
+    parser.add_argument("--checkpoints", default="backfill_ckpt")
+    parser.add_argument("--address", action="append", help="watched address, repeatable (default: PancakeV2 BCFX/BUSD)")
+    parser.add_argument("--shard-blocks", type=int, default=10000)
+    parser.add_argument("--step", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", action="store_true")
+    parser.add_argument("--log-only", action="store_true")
+    args = parser.parse_args()
+
+    backfill(os.environ["RPC_URL"], args.from_block, args.to_block, args.out, args.checkpoints,
+             watchlist=args.address, shard_blocks=args.shard_blocks, step=args.step, workers=args.workers,
+             use_processes=args.processes, log_only=args.log_only)
+
+# End of file
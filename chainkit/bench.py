@@ -0,0 +1,250 @@
+"""
+Offline throughput benchmarks over recorded (or synthetic) chain traffic.
+- `python -m chainkit.bench record fixture.json.gz`: run a Runner round and analyze_block / analyze_tx against RPC_URL
+  through a RecordingProvider and save the traffic as a fixture
+- `python -m chainkit.bench run [fixture]`: replay it with FakeNode.replay (synthetic BSC-like traffic without a fixture) and measure
+  analyze_tx latency per tx, per-log handler cost by event type, Runner.proceed blocks/s and tx/s per analysis mode
+- `--save baseline.json` / `--check baseline.json`: keep the metrics, fail (exit 1) on a regression beyond `--tolerance`
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+from web3 import Web3
+import contextlib, copy, io, random, statistics, time
+
+from .fake_node import FakeNode, RecordingProvider, new_fixture, load_fixture
+from .rpc_cache import cache_key
+from .decoders import sig_topic
+from .runner import Runner
+from .scheduler import PollScheduler
+from .collector import collect_tx_hashes, PANCAKE_V2_BCFX_BUSD_ADDR
+from .tx_tracker import registry_by_topic, analyze_tx, analyze_block, decode_logs
+
+MODES = ("per_tx", "log_only", "block_mode")
+
+# (signature, indexed address topics, data words) of the synthetic logs
+_SHAPES = {
+    "swap_v2": ("Swap(address,uint256,uint256,uint256,uint256,address)", 2, 4),
+    "sync": ("Sync(uint112,uint112)", 0, 2),
+    "transfer": ("Transfer(address,address,uint256)", 2, 1),
+    "swap_v3": ("Swap(address,address,int256,int256,uint160,uint128,int24)", 2, 5),
+}
+
+def synthetic_fixture(n_blocks: int=200, txs_per_block: int=5, pairs: int=20, first_block: int=40_000_000, seed: int=7) -> Dict[str, Any]:
+    """
+    BSC-like fixture without a node: swaps on `pairs` watched pools (V2 swap + sync + 2 token transfers, or a V3 swap),
+    with transactions, receipts, block receipts and full blocks for every analysis mode
+    """
+    rnd = random.Random(seed)
+    word = lambda x: "0x" + x.to_bytes(32, "big").hex()
+    addr = lambda: "0x" + rnd.randbytes(20).hex()
+    pools = [addr() for _ in range(pairs)]
+    tokens = [addr() for _ in range(8)]
+    fx = new_fixture()
+    fx["chain_id"] = "0x38"
+    last = first_block + n_blocks - 1
+    fx["heads"] = [hex(last)]
+    fx["log_ranges"] = [[first_block, last]]
+
+    def log_of(b: Dict[str, Any], tx: Dict[str, Any], i: int, address: str, shape: str) -> Dict[str, Any]:
+        sig, n_idx, n_words = _SHAPES[shape]
+        topics = [sig_topic(sig)] + ["0x" + "00" * 12 + addr()[2:] for _ in range(n_idx)]
+        data = "0x" + "".join(rnd.getrandbits(96).to_bytes(32, "big").hex() for _ in range(n_words))
+        return {"address": address, "topics": topics, "data": data, "blockNumber": b["number"], "blockHash": b["hash"],
+                "transactionHash": tx["hash"], "transactionIndex": tx["transactionIndex"], "logIndex": hex(i), "removed": False}
+
+    for n in range(first_block, last + 1):
+        b = {"number": hex(n), "hash": word(n), "parentHash": word(n - 1), "timestamp": hex(1_700_000_000 + 3 * n),
+             "logsBloom": "0x" + "00" * 256, "miner": "0x" + "00" * 20, "gasLimit": hex(140_000_000), "gasUsed": "0x0",
+             "difficulty": "0x2", "extraData": "0x", "size": "0x0", "transactions": []}
+        receipts, log_index = [], 0
+        for t in range(txs_per_block):
+            tx = {"hash": word((n << 16) + t), "from": addr(), "to": addr(), "blockNumber": b["number"], "blockHash": b["hash"],
+                  "transactionIndex": hex(t), "nonce": hex(t), "value": "0x0", "gas": hex(300_000), "gasPrice": hex(10**9),
+                  "input": "0x", "type": "0x0", "v": "0x93", "r": word(1), "s": word(2)}
+            pool = rnd.choice(pools)
+            if rnd.random() < 0.7:
+                shapes = [(tokens[t % 8], "transfer"), (tokens[(t + 1) % 8], "transfer"), (pool, "sync"), (pool, "swap_v2")]
+            else:
+                shapes = [(tokens[t % 8], "transfer"), (pool, "swap_v3")]
+            logs = []
+            for address, shape in shapes:
+                logs.append(log_of(b, tx, log_index, address, shape))
+                log_index += 1
+            receipt = {"transactionHash": tx["hash"], "blockNumber": b["number"], "blockHash": b["hash"], "transactionIndex": hex(t),
+                       "from": tx["from"], "to": tx["to"], "gasUsed": hex(120_000 + t), "cumulativeGasUsed": "0x0", "status": "0x1",
+                       "logs": logs, "logsBloom": "0x" + "00" * 256, "type": "0x0", "effectiveGasPrice": hex(10**9), "contractAddress": None}
+            b["transactions"].append(tx)
+            receipts.append(receipt)
+            fx["logs"].extend(logs)
+            fx["answers"][cache_key("eth_getTransactionByHash", [tx["hash"]]).hex()] = tx
+            fx["answers"][cache_key("eth_getTransactionReceipt", [tx["hash"]]).hex()] = receipt
+        fx["answers"][cache_key("eth_getBlockReceipts", [b["number"]]).hex()] = receipts
+        fx["answers"][cache_key("eth_getBlockByNumber", [b["number"], True]).hex()] = b
+    watched = set(pools)
+    fx["meta"] = {"source": "synthetic", "from_block": first_block, "to_block": last, "watchlist": pools,
+                  "tx_hashes": list(dict.fromkeys(log["transactionHash"] for log in fx["logs"] if log["address"] in watched))}
+    return fx
+
+def record_fixture(rpc_url: str, path: str, blocks: int=20, tx_hashes: Iterable[str]=(), watchlist: Optional[List[str]]=None,
+                   confirmations: int=15) -> Dict[str, Any]:
+    """Record one Runner round over the last `blocks` safe blocks, block receipts of the blocks hit, and extra txs"""
+    rec = RecordingProvider(Web3.HTTPProvider(rpc_url))
+    w3 = Web3(rec)
+    runner = Runner(w3, window=blocks, confirmations=confirmations, watchlist=watchlist or [PANCAKE_V2_BCFX_BUSD_ADDR])
+    runner.proceed()
+    b0, b1 = runner.last_safe_head - blocks + 1, runner.last_safe_head
+    hit = sorted({int(log["blockNumber"], 16) for log in rec.fixture["logs"]})
+    for bn in hit:
+        analyze_block(w3, bn)
+    extra = list(tx_hashes)
+    for h in extra:
+        analyze_tx(w3, h)
+    rec.fixture["meta"] = {"source": rpc_url.split("?")[0], "from_block": b0, "to_block": b1, "watchlist": sorted(runner.watchlist),
+                           "tx_hashes": list(dict.fromkeys([log["transactionHash"] for log in rec.fixture["logs"]] + extra))}
+    rec.save(path)
+    print(f"[bench] recorded blocks [{b0},{b1}]: {len(rec.fixture['logs'])} logs, {len(rec.fixture['answers'])} answers -> {path}")
+    return rec.fixture
+
+def _pct(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def bench_analyze_tx(w3: Web3, tx_hashes: List[str]) -> Dict[str, float]:
+    """analyze_tx wall time per transaction (2 RPC calls + decode)"""
+    analyze_tx(w3, tx_hashes[0])  # warm up
+    secs = []
+    for h in tx_hashes:
+        t0 = time.perf_counter()
+        analyze_tx(w3, h)
+        secs.append(time.perf_counter() - t0)
+    return {"analyze_tx_ms_mean": round(statistics.mean(secs) * 1e3, 3), "analyze_tx_ms_p50": round(_pct(secs, 0.5) * 1e3, 3),
+            "analyze_tx_ms_p95": round(_pct(secs, 0.95) * 1e3, 3)}
+
+def bench_handlers(logs: List[Dict[str, Any]], repeat: int=5) -> Dict[str, float]:
+    """Decode cost per log (decode_logs on web3-shaped logs), overall and per event type"""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for log in logs:
+        meta = registry_by_topic().get(bytes(log["topics"][0])) if log["topics"] else None
+        groups.setdefault(meta["name"] if meta else "unknown", []).append(log)
+
+    def cost(items: List[Dict[str, Any]]) -> float:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            decode_logs(items)
+            best = min(best, time.perf_counter() - t0)
+        return round(best / len(items) * 1e6, 3)
+
+    out = {"handler_us_per_log": cost(logs)}
+    for name, items in sorted(groups.items()):
+        out[f"handler_us_per_log[{name}]"] = cost(items)
+    return out
+
+def bench_runner(url: str, fx: Dict[str, Any], mode: str, window: int=50) -> Dict[str, float]:
+    """Runner.proceed over the fixture range in contiguous rounds of `window` blocks (head at the last block)"""
+    w3 = Web3(Web3.HTTPProvider(url))
+    b0, b1 = fx["meta"]["from_block"], fx["meta"]["to_block"]
+    runner = Runner(w3, window=window, confirmations=0, watchlist=fx["meta"]["watchlist"], scheduler=PollScheduler(window=window, catchup_lag=0),
+                    log_only=mode == "log_only", block_mode=mode == "block_mode")
+    runner.last_safe_head = b0 - 1
+    txs = 0
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while runner.last_safe_head < b1:
+            txs += runner.proceed()
+    secs = time.perf_counter() - t0
+    return {f"runner_{mode}_blocks_per_s": round((b1 - b0 + 1) / secs, 1), f"runner_{mode}_tx_per_s": round(txs / secs, 1)}
+
+def run_benchmarks(fx: Optional[Dict[str, Any]]=None, latency: float=0.0, n_tx: int=100, modes: Iterable[str]=MODES) -> Dict[str, float]:
+    """Every benchmark against a replay node serving `fx` (synthetic traffic when None)"""
+    fx = fx or synthetic_fixture()
+    fx = copy.copy(fx)
+    fx["heads"] = [hex(fx["meta"]["to_block"])]  # runners start from the recorded range, not the recorded head
+    out: Dict[str, float] = {}
+    with FakeNode.replay(fx, latency=latency) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        hashes = [h for h in fx["meta"]["tx_hashes"] if h][:n_tx]
+        if hashes:
+            out.update(bench_analyze_tx(w3, hashes))
+        logs = collect_tx_hashes(w3, fx["meta"]["watchlist"], fx["meta"]["from_block"], fx["meta"]["to_block"])
+        if logs:
+            out.update(bench_handlers(logs))
+        for mode in modes:
+            out.update(bench_runner(node.url, fx, mode))
+    return out
+
+def check_regressions(current: Dict[str, float], baseline: Dict[str, float], tolerance: float=0.25) -> List[str]:
+    """Metrics worse than the baseline by more than `tolerance` (rates: lower, times / costs: higher)"""
+    bad = []
+    for key, base in baseline.items():
+        cur = current.get(key)
+        if cur is None or not base:
+            continue
+        higher_is_better = key.endswith("_per_s")
+        ratio = cur / base
+        if (higher_is_better and ratio < 1 - tolerance) or (not higher_is_better and ratio > 1 + tolerance):
+            bad.append(f"{key}: {base} -> {cur} ({(ratio - 1) * 100:+.0f}%)")
+    return bad
+
+def _test_record_replay() -> None:
+    """Record traffic from a synthetic replay node, replay the recording: same analysis results, no missing answer"""
+    import os, tempfile
+    src = synthetic_fixture(n_blocks=30, txs_per_block=3, pairs=4)
+    with FakeNode.replay(src) as node, tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "fx.json.gz")
+        with contextlib.redirect_stdout(io.StringIO()):
+            fx = record_fixture(node.url, path, blocks=30, watchlist=src["meta"]["watchlist"], confirmations=0)
+        assert fx["meta"]["from_block"] == src["meta"]["from_block"] and len(fx["logs"]) == sum(
+            1 for log in src["logs"] if log["address"] in src["meta"]["watchlist"])
+        loaded = load_fixture(path)
+        live, replayed = Web3(Web3.HTTPProvider(node.url)), None
+        with FakeNode.replay(loaded, latency=0.001) as again:
+            replayed = Web3(Web3.HTTPProvider(again.url))
+            for h in loaded["meta"]["tx_hashes"][:10]:
+                assert analyze_tx(replayed, h) == analyze_tx(live, h)
+            b0, b1 = fx["meta"]["from_block"], fx["meta"]["to_block"]
+            assert collect_tx_hashes(replayed, fx["meta"]["watchlist"], b0 + 3, b1 - 3) == collect_tx_hashes(live, fx["meta"]["watchlist"], b0 + 3, b1 - 3)
+            metrics = run_benchmarks(loaded, n_tx=10, modes=("log_only",))
+    assert metrics["runner_log_only_tx_per_s"] > 0 and metrics["handler_us_per_log"] > 0
+    assert check_regressions({"a_per_s": 70, "b_ms": 1.0}, {"a_per_s": 100, "b_ms": 1.0}) == ["a_per_s: 100 -> 70 (-30%)"]
+    print("[bench] record / replay round trip OK")
+
+if __name__ == "__main__":
+    import argparse, json, os, sys
+    parser = argparse.ArgumentParser(description="Record RPC traffic fixtures and run offline benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="record a fixture from RPC_URL")
+    rec.add_argument("out")
+    rec.add_argument("--blocks", type=int, default=20)
+    rec.add_argument("--tx", action="append", default=[], help="extra tx hash to record, repeatable (default: EX_TX_HASH)")
+    rec.add_argument("--address", action="append", help="watched address, repeatable (default: PancakeV2 BCFX/BUSD)")
+    run = sub.add_parser("run", help="run the benchmarks against a fixture (synthetic traffic without one)")
+    run.add_argument("fixture", nargs="?")
+    run.add_argument("--latency", type=float, default=0.0, help="seconds added to every replayed HTTP round trip")
+    run.add_argument("--save", help="write the metrics as a baseline")
+    run.add_argument("--check", help="compare against a baseline, exit 1 on regression")
+    run.add_argument("--tolerance", type=float, default=0.25)
+    sub.add_parser("test", help="record / replay self check")
+    args = parser.parse_args()
+
+    if args.cmd == "record":
+        from dotenv import load_dotenv
+        load_dotenv()
+        txs = args.tx or [t for t in [os.getenv("EX_TX_HASH")] if t]
+        record_fixture(os.environ["RPC_URL"], args.out, blocks=args.blocks, tx_hashes=txs, watchlist=args.address)
+    elif args.cmd == "test":
+        _test_record_replay()
+    else:
+        metrics = run_benchmarks(load_fixture(args.fixture) if args.fixture else None, latency=args.latency)
+        print(json.dumps(metrics, indent=2))
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump(metrics, f, indent=2)
+        if args.check:
+            with open(args.check) as f:
+                regressions = check_regressions(metrics, json.load(f), args.tolerance)
+            for r in regressions:
+                print(f"[bench] regression {r}")
+            sys.exit(1 if regressions else 0)
+
+# End of file
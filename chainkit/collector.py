@@ -1,19 +1,228 @@
 
-from typing import Iterable, List, Set, Optional
+from typing import Iterable, List, Set, Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from web3 import Web3
+import asyncio
 
 from .decoders import to_hexstr
 
 PANCAKE_V2_BCFX_BUSD_ADDR = "0xA0387eBeA6be90849c2261b911fBBD52B4C9eAC4"
 
-def collect_tx_hashes(w3: Web3, watch_addresses: Iterable[str], from_block: int, to_block: int, topics: Optional[List[str]]=None) -> List[dict]:
+# Addresses per eth_getLogs filter, most providers accept a few hundred to a thousand
+MAX_ADDRESSES_PER_FILTER = 500
+
+# Phrases of eth_getLogs rejections of free/mid-tier providers (range too wide / too many results / response too big),
+# specific enough not to match unrelated failures; -32005 and a bare "limit exceeded" are also used for throttling
+LIMIT_ERROR_MARKERS = (
+    "block range", "blocks range", "range is too large", "range too large", "range too wide", "too many blocks",
+    "max range", "query returned more than", "more than 10000 results", "response size exceeded",
+    "response size should not", "response is too big", "request entity too large", "too many addresses",
+)
+
+# Throttling replies, never a span limit even when they share a marker
+RATE_LIMIT_PHRASES = ("rate limit", "too many requests")
+
+def is_limit_error(e: Exception) -> bool:
+    """Check if an exception looks like a provider limit rejection rather than a real failure or throttling"""
+    msg = str(e).lower()
+    if any(m in msg for m in RATE_LIMIT_PHRASES):
+        return False
+    return any(m in msg for m in LIMIT_ERROR_MARKERS)
+
+def is_timeout(e: Exception) -> bool:
+    return "timeout" in type(e).__name__.lower() or "read timed out" in str(e).lower()
+
+def provider_key(w3: Web3) -> str:
+    """Key used to remember tuning per provider (endpoint uri when available)"""
+    provider = w3.provider
+    return str(getattr(provider, "endpoint_uri", None) or type(provider).__name__)
+
+class SpanTuner:
+    """
+    Remember the largest eth_getLogs block span accepted by each provider.
+    - Unknown provider: try the full requested range first
+    - Limit error: the failing span becomes a ceiling, retry with half of it
+    - Success: grow span by `grow` without crossing the ceiling,
+      after `probe_every` successes right under the ceiling, probe above it again (busy hours pass)
+    """
+    def __init__(self, min_span: int=1, max_span: int=100000, grow: float=2.0, probe_every: int=20):
+        self.min_span = int(min_span)
+        self.max_span = int(max_span)
+        self.grow = float(grow)
+        self.probe_every = int(probe_every)
+        self._span: Dict[str, int] = {}
+        self._ceiling: Dict[str, int] = {}
+        self._streak: Dict[str, int] = {}
+
+    def span_for(self, key: str, wanted: int) -> int:
+        """Span to use for the next call, at most `wanted`"""
+        span = self._span.get(key, self.max_span)
+        return max(self.min_span, min(span, wanted, self.max_span))
+
+    def best_span(self, key: str) -> Optional[int]:
+        return self._span.get(key)
+
+    def on_success(self, key: str, span: int) -> None:
+        ceiling = self._ceiling.get(key)
+        cur = max(self._span.get(key, span), span)
+        nxt = min(self.max_span, max(cur + 1, int(cur * self.grow)))
+        if ceiling is not None:
+            if nxt >= ceiling:
+                streak = self._streak.get(key, 0) + 1
+                if streak >= self.probe_every:
+                    # Forget the ceiling and probe a wider span again
+                    self._ceiling.pop(key, None)
+                    streak = 0
+                else:
+                    nxt = max(cur, ceiling - 1)
+                self._streak[key] = streak
+        self._span[key] = max(self.min_span, nxt)
+
+    def on_limit(self, key: str, span: int) -> int:
+        """Register a rejected span and return the next (halved) span to try"""
+        ceiling = self._ceiling.get(key)
+        self._ceiling[key] = span if ceiling is None else min(ceiling, span)
+        self._streak[key] = 0
+        nxt = max(self.min_span, span // 2)
+        self._span[key] = nxt
+        return nxt
+
+DEFAULT_SPAN_TUNER = SpanTuner()
+
+def normalize_watchlist(watch_addresses: Iterable[str]) -> List[str]:
+    """Checksum addresses and drop duplicates, keeping order"""
+    return list(dict.fromkeys(Web3.to_checksum_address(a) for a in watch_addresses))
+
+def shard_addresses(addresses: List[str], shard_size: int) -> List[List[str]]:
+    shard_size = max(1, int(shard_size))
+    return [addresses[i:i + shard_size] for i in range(0, len(addresses), shard_size)]
+
+def _log_order(log: dict) -> tuple:
+    return (log["blockNumber"], log["logIndex"])
+
+class _ShardWalk:
+    """
+    Span / split bookkeeping of one address shard, shared by the sync and async collectors.
+    - params(): next eth_getLogs filter, None once [from_block, to_block] is covered
+    - done(logs): the last filter succeeded
+    - failed(e): the last filter failed; returns the address halves to query for that single block,
+      or [] to retry (same span after a first timeout, shorter span after a limit); other errors are raised
+    """
+    def __init__(self, w3, addresses: List[str], from_block: int, to_block: int, topics: Optional[List[str]], tuner: SpanTuner):
+        self.key = provider_key(w3)
+        self.addresses = addresses
+        self.topics = topics
+        self.tuner = tuner
+        self.to_block = to_block
+        self.start = self.end = from_block
+        self.span = tuner.span_for(self.key, to_block - from_block + 1)
+        self.logs: List[dict] = []
+        self._timed_out = False
+
+    def params(self) -> Optional[dict]:
+        if self.start > self.to_block:
+            return None
+        self.end = min(self.to_block, self.start + self.span - 1)
+        params = {"fromBlock": self.start, "toBlock": self.end, "address": self.addresses}
+        if self.topics:
+            params["topics"] = [self.topics]
+        return params
+
+    def done(self, logs: List[dict]) -> None:
+        self.logs.extend(logs)
+        self.tuner.on_success(self.key, self.end - self.start + 1)
+        self._next()
+        self.span = self.tuner.span_for(self.key, self.to_block - self.start + 1)
+
+    def failed(self, e: Exception) -> List[List[str]]:
+        if is_timeout(e) and not self._timed_out:
+            # A slow reply is retried once before it counts as a span limit
+            self._timed_out = True
+            return []
+        if not (is_limit_error(e) or is_timeout(e)):
+            raise e
+        self._timed_out = False
+        if self.end == self.start:
+            if len(self.addresses) == 1:
+                raise e
+            half = len(self.addresses) // 2
+            return [self.addresses[:half], self.addresses[half:]]
+        self.span = self.tuner.on_limit(self.key, self.end - self.start + 1)
+        return []
+
+    def split_done(self, parts: List[List[dict]]) -> None:
+        """Logs of the address halves of a single block"""
+        for logs in parts:
+            self.logs.extend(logs)
+        self.logs.sort(key=_log_order)
+        self._next()
+
+    def _next(self) -> None:
+        self.start = self.end + 1
+        self._timed_out = False
+
+def _collect_shard(w3: Web3, addresses: List[str], from_block: int, to_block: int, topics: Optional[List[str]], tuner: SpanTuner) -> List[dict]:
+    """eth_getLogs over one address shard, with adaptive spans; a single block still rejected splits the shard"""
+    walk = _ShardWalk(w3, addresses, from_block, to_block, topics, tuner)
+    while True:
+        params = walk.params()
+        if params is None:
+            return walk.logs
+        try:
+            logs = w3.eth.get_logs(params)
+        except Exception as e:
+            parts = walk.failed(e)
+            if parts:
+                walk.split_done([_collect_shard(w3, part, walk.start, walk.end, topics, tuner) for part in parts])
+            continue
+        walk.done(logs)
+
+def collect_tx_hashes(w3: Web3, watch_addresses: Iterable[str], from_block: int, to_block: int, topics: Optional[List[str]]=None, tuner: Optional[SpanTuner]=None, shard_size: int=MAX_ADDRESSES_PER_FILTER, max_workers: int=4) -> List[dict]:
+    """
+    Collect logs of watched addresses in [from_block, to_block].
+    - The range is cut into spans tuned per provider, and bisected whenever the provider raises a limit error
+    - Large watchlists are sharded into filters of `shard_size` addresses, queried concurrently
+      (`max_workers` threads), and merged in (block, logIndex) order
+    """
+    if not watch_addresses or from_block > to_block:
+        return []
+    tuner = tuner or DEFAULT_SPAN_TUNER
+    shards = shard_addresses(normalize_watchlist(watch_addresses), shard_size)
+    if len(shards) == 1:
+        return _collect_shard(w3, shards[0], from_block, to_block, topics, tuner)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(shards))) as ex:
+        parts = list(ex.map(lambda shard: _collect_shard(w3, shard, from_block, to_block, topics, tuner), shards))
+    return sorted((log for part in parts for log in part), key=_log_order)
+
+async def _async_collect_shard(w3, addresses: List[str], from_block: int, to_block: int, topics: Optional[List[str]], tuner: SpanTuner, sem: Optional[asyncio.Semaphore]=None) -> List[dict]:
+    """Same as `_collect_shard` for an AsyncWeb3 instance, each eth_getLogs holds one slot of `sem`"""
+    walk = _ShardWalk(w3, addresses, from_block, to_block, topics, tuner)
+    while True:
+        params = walk.params()
+        if params is None:
+            return walk.logs
+        try:
+            async with sem if sem is not None else nullcontext():
+                logs = await w3.eth.get_logs(params)
+        except Exception as e:
+            parts = walk.failed(e)
+            if parts:
+                walk.split_done([await _async_collect_shard(w3, part, walk.start, walk.end, topics, tuner, sem) for part in parts])
+            continue
+        walk.done(logs)
+
+async def async_collect_tx_hashes(w3, watch_addresses: Iterable[str], from_block: int, to_block: int, topics: Optional[List[str]]=None, tuner: Optional[SpanTuner]=None, shard_size: int=MAX_ADDRESSES_PER_FILTER, sem: Optional[asyncio.Semaphore]=None) -> List[dict]:
+    """Same as `collect_tx_hashes` for an AsyncWeb3 instance, shards are queried concurrently (at most `sem` calls in flight)"""
     if not watch_addresses or from_block > to_block:
         return []
-    # TODO: consider to apply binary cut when free level rpc raises limit error
-    params = {"fromBlock": from_block, "toBlock": to_block, "address": watch_addresses}
-    if topics:
-        params["topics"] = [topics]
-    return w3.eth.get_logs(params)
+    tuner = tuner or DEFAULT_SPAN_TUNER
+    shards = shard_addresses(normalize_watchlist(watch_addresses), shard_size)
+    parts = await asyncio.gather(*(_async_collect_shard(w3, shard, from_block, to_block, topics, tuner, sem) for shard in shards))
+    if len(parts) == 1:
+        return parts[0]
+    return sorted((log for part in parts for log in part), key=_log_order)
 
 def _test_collector():
     import os, json
@@ -0,0 +1,309 @@
+"""
+Batch (columnar) decoding of many logs sharing one topic0 (needs numpy).
+- decode_batch(logs) groups logs by topic0 and returns one EventBatch per registered event
+- Data payloads are concatenated into one buffer and read through a (n, width) uint8 view: no per-log slicing
+- Columns: addresses as (n, 20) uint8, ints up to 64 bits as int64 / uint64, bools,
+  wider ints and bytesN as (n, 32) raw big-endian words, converted to Python ints only on demand (EventBatch.ints)
+- EventBatch.rows() gives the handler output shape, EventBatch.to_arrow() feeds ParquetSink.add_batch
+- Logs with fewer topics / data bytes than the event layout (check_layout) or dynamic args are left to the per-log handlers;
+  extra topics / trailing data bytes are ignored, as by the handlers
+"""
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from operator import itemgetter
+
+from .decoders import to_bytes, to_hexstr
+from .registry_event import BUILTIN_EVENTS, K_TOPIC_HEX, _event_sig, compile_fields, head_words
+from . import min_abi
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("Batch decoding requires numpy: pip install numpy")
+    return np
+
+def _min_abi_events() -> Dict[str, Mapping[str, Any]]:
+    """event signature -> ABI item, first definition wins (ERC20 Transfer before the ERC721 one)"""
+    out: Dict[str, Mapping[str, Any]] = {}
+    for abi in (min_abi.ERC20_MIN_ABI, min_abi.ERC721_MIN_ABI, min_abi.WETH_MIN_ABI,
+                min_abi.UNIV2_PAIR_MIN_ABI, min_abi.UNIV3_POOL_MIN_ABI):
+        for it in abi:
+            if it.get("type") == "event":
+                out.setdefault(_event_sig(it), it)
+    return out
+
+MIN_ABI_EVENTS = _min_abi_events()
+
+def _join(values: List[Any]) -> bytes:
+    """Concatenate bytes / HexBytes (one join) or '0x' hex strings (one fromhex)"""
+    try:
+        return b"".join(values)
+    except TypeError:
+        return b"".join(to_bytes(v) for v in values)
+
+def _nbytes(value: Any) -> int:
+    """Byte length of bytes / HexBytes, or of the payload of a '0x' hex string"""
+    return (len(value) - 2) // 2 if isinstance(value, str) else len(value)
+
+def _int_bits(abi_type: str) -> Tuple[bool, int]:
+    signed = abi_type.startswith("int")
+    digits = abi_type[3 if signed else 4:]
+    return signed, int(digits) if digits else 256
+
+class EventLayout:
+    """Fixed layout of one event: topics count, data width and (arg, abi type, indexed, topic index / byte offset)"""
+    def __init__(self, meta: Mapping[str, Any]):
+        item = meta.get("abi") or MIN_ABI_EVENTS.get(meta["sig"])
+        if item is None:
+            raise ValueError(f"No ABI definition for {meta['sig']}")
+        fields, generic, data_types = compile_fields(item)
+        if generic or "bytes" in data_types or "string" in data_types:
+            raise ValueError(f"{meta['sig']} has dynamic arguments, not supported by batch decoding")
+        self.name = meta["name"]
+        self.type = meta.get("type")
+        types = {(arg.get("name") or f"arg{pos}"): arg["type"] for pos, arg in enumerate(item.get("inputs", []))}
+        self.fields: List[Tuple[str, str, bool, int]] = [
+            (arg, types[arg], kind <= K_TOPIC_HEX, off) for arg, kind, off in fields
+        ]
+        self.topics_count = 1 + sum(1 for f in self.fields if f[2])
+        self.data_width = 32 * sum(head_words(t) for t in data_types)  # offsets and width from the same head layout
+
+class EventBatch:
+    """Decoded columns of n logs of one event type, in (block_number, log_index) order"""
+    def __init__(self, layout: EventLayout, logs: List[Mapping[str, Any]]):
+        np = _numpy()
+        self.np = np
+        self.layout = layout
+        self.type, self.name = layout.type, layout.name
+        k, w = layout.topics_count, layout.data_width
+
+        # Logs not matching the layout are left in self.rejected, same rule as check_layout
+        topics = list(map(itemgetter("topics"), logs))
+        datas = list(map(itemgetter("data"), logs))
+        sizes = np.fromiter(map(_nbytes, datas), np.int64, len(logs))
+        counts = np.fromiter(map(len, topics), np.int64, len(logs))
+        ok = (counts >= k) & (sizes >= w)
+        self.rejected: List[Mapping[str, Any]] = []
+        if not ok.all():
+            self.rejected = [log for log, good in zip(logs, ok.tolist()) if not good]
+            logs = [log for log, good in zip(logs, ok.tolist()) if good]
+            topics = list(map(itemgetter("topics"), logs))
+            datas = list(map(itemgetter("data"), logs))
+            sizes = sizes[ok]
+        if (sizes > w).any():
+            # Trailing bytes after the head are not part of the layout
+            datas = [d if s == w else to_bytes(d)[:w] for d, s in zip(datas, sizes.tolist())]
+
+        n = self.n = len(logs)
+        self.block_number = np.fromiter(map(itemgetter("blockNumber"), logs), np.int64, n)
+        self.log_index = np.fromiter(map(itemgetter("logIndex"), logs), np.int64, n)
+        self.tx_hash = np.frombuffer(_join(list(map(itemgetter("transactionHash"), logs))), np.uint8).reshape(n, 32)
+        # "0x" only appears as the prefix of each address ("x" is not a hex digit)
+        self.contract = np.frombuffer(bytes.fromhex("".join(map(itemgetter("address"), logs)).replace("0x", "")), np.uint8).reshape(n, 20)
+        # Indexed args only, topic0 is the same for every log
+        self._topics = {i: np.frombuffer(_join(list(map(itemgetter(i), topics))), np.uint8).reshape(n, 32) for i in range(1, k)}
+        self._data = np.frombuffer(_join(datas), np.uint8).reshape(n, w)
+        self._fields = {f[0]: f for f in layout.fields}
+
+        # eth_getLogs output is already ordered, reorder the columns otherwise
+        order = np.lexsort((self.log_index, self.block_number))
+        if n and not (order == np.arange(n)).all():
+            for attr in ("block_number", "log_index", "tx_hash", "contract", "_data"):
+                setattr(self, attr, getattr(self, attr)[order])
+            self._topics = {i: col[order] for i, col in self._topics.items()}
+
+    def __len__(self) -> int:
+        return self.n
+
+    def words(self, arg: str) -> Any:
+        """(n, 32) uint8 view of the raw 32-byte word of an argument"""
+        _, _, indexed, off = self._fields[arg]
+        return self._topics[off] if indexed else self._data[:, off:off + 32]
+
+    def column(self, arg: str) -> Any:
+        """NumPy column of an argument, see module doc for the types"""
+        np = self.np
+        _, abi_type, _, _ = self._fields[arg]
+        w = self.words(arg)
+        if abi_type == "address":
+            return w[:, 12:]
+        if abi_type == "bool":
+            return w.any(axis=1)
+        if abi_type.startswith(("uint", "int")):
+            signed, bits = _int_bits(abi_type)
+            if bits <= 64:
+                # Big-endian low 8 bytes of the word (values are sign extended in the ABI word)
+                return np.ascontiguousarray(w[:, 24:]).view(">i8" if signed else ">u8").ravel().astype(np.int64 if signed else np.uint64)
+        return w
+
+    def ints(self, arg: str) -> List[int]:
+        """Python ints of an integer argument"""
+        _, abi_type, _, _ = self._fields[arg]
+        signed, bits = _int_bits(abi_type)
+        if bits <= 64:
+            return self.column(arg).tolist()
+        buf = self.np.ascontiguousarray(self.words(arg)).tobytes()
+        return [int.from_bytes(buf[i:i + 32], "big", signed=signed) for i in range(0, len(buf), 32)]
+
+    def hex(self, arg: Optional[str]=None, col: Any=None) -> List[str]:
+        """'0x..' strings of an address / bytesN argument, or of a uint8 column (e.g. batch.contract)"""
+        col = self.column(arg) if col is None else col
+        width = col.shape[1]
+        h = self.np.ascontiguousarray(col).tobytes().hex()
+        step = 2 * width
+        return ["0x" + h[i:i + step] for i in range(0, len(h), step)]
+
+    def values(self, arg: str) -> List[Any]:
+        """Python values as the handlers give them"""
+        _, abi_type, indexed, _ = self._fields[arg]
+        if abi_type.startswith("bytes") and not indexed:
+            return self.hex(col=self.words(arg)[:, :int(abi_type[5:])])  # bytesN: first N bytes of the word
+        if abi_type == "address" or not abi_type.startswith(("uint", "int", "bool")):
+            return self.hex(arg)
+        if abi_type == "bool":
+            return self.column(arg).tolist()
+        return self.ints(arg)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Events in the `analyze_tx` "events" shape (ABI args only, e.g. without ERC20.Approval "unlimited")"""
+        cols = {arg: self.values(arg) for arg in self._fields}
+        contracts, tx_hashes = self.hex(col=self.contract), self.hex(col=self.tx_hash)
+        blocks, indexes = self.block_number.tolist(), self.log_index.tolist()
+        return [{
+            "type": self.type,
+            "name": self.name,
+            "contract": contracts[i],
+            "args": {arg: col[i] for arg, col in cols.items()},
+            "block_number": blocks[i],
+            "tx_hash": tx_hashes[i],
+            "log_index": indexes[i],
+        } for i in range(self.n)]
+
+    def to_arrow(self) -> Any:
+        """pyarrow table with the ParquetSink column types"""
+        import pyarrow as pa
+        np = self.np
+
+        def fixed(col, width):
+            return pa.FixedSizeBinaryArray.from_buffers(pa.binary(width), self.n, [None, pa.py_buffer(np.ascontiguousarray(col).tobytes())])
+
+        arrays = {
+            "block_number": pa.array(self.block_number, pa.int64()),
+            "tx_hash": fixed(self.tx_hash, 32),
+            "log_index": pa.array(self.log_index.astype(np.int32), pa.int32()),
+            "contract": fixed(self.contract, 20),
+        }
+        for arg, abi_type, _, _ in self.layout.fields:
+            col = self.column(arg)
+            if abi_type == "address":
+                arrays[arg] = fixed(col, 20)
+            elif abi_type == "bool":
+                arrays[arg] = pa.array(col, pa.bool_())
+            elif col.ndim == 1:
+                signed, bits = _int_bits(abi_type)
+                arrays[arg] = pa.array(col, pa.int64() if signed or bits < 64 else pa.uint64())
+            else:
+                arrays[arg] = fixed(col, 32)
+        return pa.table(arrays)
+
+_LAYOUTS: Dict[str, Optional[EventLayout]] = {}
+
+def layout_for(topic0: str, meta: Mapping[str, Any]) -> Optional[EventLayout]:
+    """Cached layout of a registry entry, None when the event cannot be batch decoded"""
+    key = f"{topic0}:{meta['name']}"
+    if key not in _LAYOUTS:
+        try:
+            _LAYOUTS[key] = EventLayout(meta)
+        except ValueError:
+            _LAYOUTS[key] = None
+    return _LAYOUTS[key]
+
+def decode_batch(logs: Iterable[Mapping[str, Any]], registry: Optional[Mapping[str, Mapping[str, Any]]]=None) -> Tuple[Dict[str, EventBatch], List[Mapping[str, Any]]]:
+    """
+    Decode logs into one EventBatch per topic0.
+    - registry: default to the builtin events
+    - return ({topic0: EventBatch}, rest) where rest are the logs to decode one by one
+      (unregistered topic0, dynamic arguments, or a topics count / data length not matching the ABI)
+    """
+    registry = BUILTIN_EVENTS if registry is None else registry
+    # Group on the raw topic0 value, hex only once per distinct topic0
+    by_raw: Dict[Any, List[Mapping[str, Any]]] = {}
+    rest: List[Mapping[str, Any]] = []
+    for log in logs:
+        topics = log.get("topics")
+        if topics:
+            by_raw.setdefault(topics[0], []).append(log)
+        else:
+            rest.append(log)
+    groups: Dict[str, List[Mapping[str, Any]]] = {}
+    for raw, group in by_raw.items():
+        groups.setdefault(to_hexstr(raw).lower(), []).extend(group)
+
+    batches: Dict[str, EventBatch] = {}
+    for topic0, group in groups.items():
+        meta = registry.get(topic0)
+        layout = layout_for(topic0, meta) if meta is not None else None
+        if layout is None:
+            rest.extend(group)
+            continue
+        batch = EventBatch(layout, group)
+        rest.extend(batch.rejected)
+        if batch.n:
+            batches[topic0] = batch
+    rest.sort(key=itemgetter("blockNumber", "logIndex"))
+    return batches, rest
+
+def _bench_columnar(n: int=100_000, repeat: int=3) -> Dict[str, float]:
+    """Per-log handlers (as in tx_tracker) vs decode_batch on n synthetic UniV2 Swap logs"""
+    import random, timeit
+    from hexbytes import HexBytes
+    from .decoders import sig_topic
+    from .registry_event import h_v2_swap
+
+    rnd = random.Random(7)
+    topic0 = HexBytes(sig_topic("Swap(address,uint256,uint256,uint256,uint256,address)"))
+    logs = [{
+        "address": "0x" + rnd.randbytes(20).hex(),
+        "topics": [topic0, HexBytes(bytes(12) + rnd.randbytes(20)), HexBytes(bytes(12) + rnd.randbytes(20))],
+        "data": HexBytes(b"".join(rnd.getrandbits(112).to_bytes(32, "big") for _ in range(4))),
+        "blockNumber": 1000 + i // 50, "logIndex": i % 50, "transactionHash": HexBytes(rnd.randbytes(32)),
+    } for i in range(n)]
+
+    topic0 = to_hexstr(topic0)
+    names = ("sender", "to", "amount0In", "amount1In", "amount0Out", "amount1Out")
+
+    def handlers():
+        out = []
+        for log in logs:
+            topics_hex = [to_hexstr(t).lower() for t in log["topics"]]
+            ev = BUILTIN_EVENTS[topics_hex[0]]["handler"](log, topics_hex, to_bytes(log["data"]))
+            ev.update({"block_number": log["blockNumber"], "tx_hash": to_hexstr(log["transactionHash"]).lower(), "log_index": log["logIndex"]})
+            out.append(ev)
+        return out
+
+    def columns():
+        batch = decode_batch(logs)[0][topic0]
+        return {arg: batch.column(arg) for arg in names}
+
+    def rows():
+        return decode_batch(logs)[0][topic0].rows()
+
+    assert rows() == handlers() and BUILTIN_EVENTS[topic0]["handler"] is h_v2_swap and len(columns()["to"]) == n
+    # Best of `repeat` runs, gc disabled during each run (timeit)
+    t_handlers, t_columns, t_rows = (min(timeit.repeat(fn, number=1, repeat=repeat)) for fn in (handlers, columns, rows))
+    out = {
+        "logs": n,
+        "handlers_s": round(t_handlers, 3),
+        "batch_columns_s": round(t_columns, 3),
+        "batch_rows_s": round(t_rows, 3),
+        "speedup_columns": round(t_handlers / t_columns, 1),
+        "speedup_rows": round(t_handlers / t_rows, 1),
+    }
+    print(f"[columnar] {out}")
+    return out
+
+if __name__ == "__main__":
+    _bench_columnar()
+
+# End of file
@@ -26,6 +26,10 @@ def sig_topic(sig: str) -> str:
     """Event sig to topics[0]"""
     return to_hex(keccak(text=sig)).lower()
 
+def fn_selector(sig: str) -> bytes:
+    """Function sig, e.g. "decimals()", to its 4-byte selector"""
+    return keccak(text=sig)[:4]
+
 def to_hexstr(x) -> str:
     """HexBytes/bytes -> '0x...'; for string, return itself"""
     if isinstance(x, (bytes, bytearray, HexBytes)):
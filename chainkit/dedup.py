@@ -0,0 +1,169 @@
+"""
+Compact FIFO dedup of fixed-size binary keys.
+- Keys live back to back in a preallocated ring buffer (bytearray), oldest evicted first like DequeSet
+- An open-addressing index (array of uint32 slot numbers, linear probing, load <= 0.5) gives O(1) lookups
+- Memory per entry: key_size + 8 bytes (32-byte tx hash -> 40 B instead of ~250 B for a hex str in deque + set)
+- Binary snapshot: header + keys in FIFO order, the index is rebuilt on load
+"""
+
+from typing import Iterable, List, Union
+from array import array
+import os, struct
+
+TX_KEY_SIZE = 32      # tx hash
+LOG_KEY_SIZE = 36     # tx hash + uint32 log index
+
+_MAGIC = b"CKDD"
+_HEADER = struct.Struct(">4sBHII")  # magic, version, key_size, capacity, count
+
+Key = Union[str, bytes, bytearray, memoryview]
+
+def log_key(tx_hash: Key, log_index: int) -> bytes:
+    """(tx_hash, log_index) dedup key of LOG_KEY_SIZE bytes"""
+    return _raw(tx_hash) + int(log_index).to_bytes(4, "big")
+
+def _raw(key: Key) -> bytes:
+    if isinstance(key, str):
+        return bytes.fromhex(key[2:] if key.startswith("0x") else key)
+    return bytes(key)
+
+class CompactDedup:
+    """Fixed volume dedup of binary keys (hex strings accepted), same add / contains / FIFO semantics as DequeSet"""
+    def __init__(self, capacity: int=20000, key_size: int=TX_KEY_SIZE):
+        self.capacity = int(capacity)
+        self.key_size = int(key_size)
+        self._buf = bytearray(self.capacity * self.key_size)
+        self._mv = memoryview(self._buf)
+        size = 1
+        while size < 2 * max(1, self.capacity):
+            size <<= 1
+        self._mask = size - 1
+        self._table = array("I", bytes(4 * size))  # slot + 1, 0 = empty
+        self._head = 0   # slot of the oldest key
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _hash(self, key) -> int:
+        # Keys are keccak outputs: their leading bytes are already uniform; fold the tail in for log keys
+        return (int.from_bytes(key[:8], "little") ^ int.from_bytes(key[-8:], "big")) & self._mask
+
+    def _key_at(self, slot: int) -> memoryview:
+        start = slot * self.key_size
+        return self._mv[start:start + self.key_size]
+
+    def _find(self, key) -> int:
+        """Index table position of key, -1 if absent"""
+        table, mask = self._table, self._mask
+        i = self._hash(key)
+        while True:
+            v = table[i]
+            if v == 0:
+                return -1
+            if self._key_at(v - 1) == key:
+                return i
+            i = (i + 1) & mask
+
+    def _remove_at(self, i: int) -> None:
+        """Backward shift deletion, keeps probe chains intact without tombstones"""
+        table, mask = self._table, self._mask
+        j = i
+        while True:
+            j = (j + 1) & mask
+            v = table[j]
+            if v == 0:
+                break
+            k = self._hash(self._key_at(v - 1))
+            if (i <= j and i < k <= j) or (i > j and (k > i or k <= j)):
+                continue
+            table[i] = v
+            i = j
+        table[i] = 0
+
+    def _insert_index(self, key, slot: int) -> None:
+        table, mask = self._table, self._mask
+        i = self._hash(key)
+        while table[i] != 0:
+            i = (i + 1) & mask
+        table[i] = slot + 1
+
+    def add(self, key: Key) -> bool:
+        """Add new key, return False if key already stored"""
+        raw = _raw(key)
+        if len(raw) != self.key_size:
+            raise ValueError(f"key of {len(raw)} bytes, expected {self.key_size}")
+        if self.capacity <= 0 or self._find(raw) >= 0:
+            return False
+        if self._count == self.capacity:
+            slot = self._head
+            self._remove_at(self._find(self._key_at(slot)))
+            self._head = (self._head + 1) % self.capacity
+        else:
+            slot = (self._head + self._count) % self.capacity
+            self._count += 1
+        start = slot * self.key_size
+        self._buf[start:start + self.key_size] = raw
+        self._insert_index(raw, slot)
+        return True
+
+    def __contains__(self, key: Key) -> bool:
+        raw = _raw(key)
+        return len(raw) == self.key_size and self._find(raw) >= 0
+
+    def keys(self) -> Iterable[bytes]:
+        """Raw keys from oldest to newest"""
+        for n in range(self._count):
+            yield bytes(self._key_at((self._head + n) % self.capacity))
+
+    def to_list(self) -> List[str]:
+        return ["0x" + k.hex() for k in self.keys()]
+
+    @classmethod
+    def from_list(cls, items: Iterable[Key], capacity: int=20000, key_size: int=TX_KEY_SIZE) -> "CompactDedup":
+        inst = cls(capacity, key_size)
+        for k in items:
+            inst.add(k)
+        return inst
+
+    # ---- binary snapshot ----
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(_MAGIC, 1, self.key_size, self.capacity, self._count)
+        end = self._head + self._count
+        if end <= self.capacity:
+            body = self._mv[self._head * self.key_size:end * self.key_size]
+            return header + bytes(body)
+        first = self._mv[self._head * self.key_size:]
+        second = self._mv[:(end - self.capacity) * self.key_size]
+        return header + bytes(first) + bytes(second)
+
+    @staticmethod
+    def stored_capacity(data: bytes) -> int:
+        """Capacity recorded in a `to_bytes` snapshot"""
+        return _HEADER.unpack_from(data, 0)[3]
+
+    @classmethod
+    def from_bytes(cls, data: bytes, capacity: int=None) -> "CompactDedup":
+        """Rebuild from `to_bytes`, optionally with another capacity (oldest keys dropped if smaller)"""
+        magic, version, key_size, cap, count = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != 1:
+            raise ValueError("not a CompactDedup snapshot")
+        inst = cls(cap if capacity is None else capacity, key_size)
+        mv = memoryview(data)[_HEADER.size:]
+        for n in range(count):
+            inst.add(mv[n * key_size:(n + 1) * key_size])
+        return inst
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, capacity: int=None) -> "CompactDedup":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read(), capacity)
+
+# End of file
@@ -0,0 +1,229 @@
+"""
+Local fake JSON-RPC node, served over HTTP on 127.0.0.1.
+- Single and batch requests, with an optional provider-like batch size cap
+- Handlers: {method: callable(params) -> result}, an unknown method answers -32601
+- Record / replay: `RecordingProvider` captures real traffic into a JSON fixture, `FakeNode.replay(fixture)` serves it
+  again offline (with `latency` to mimic a remote node)
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from web3.providers.base import JSONBaseProvider
+import bisect, gzip, json, threading, time
+
+from .rpc_cache import cache_key
+
+# Methods captured by RecordingProvider (eth_getLogs is stored as logs + covered ranges, the others per params)
+RECORDED_METHODS = frozenset({
+    "eth_chainId", "eth_blockNumber", "eth_getLogs", "eth_getTransactionByHash", "eth_getTransactionReceipt",
+    "eth_getBlockReceipts", "eth_getBlockByNumber",
+})
+
+class RPCError(Exception):
+    """Raise inside a handler to answer a JSON-RPC error object"""
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+class FakeNode:
+    def __init__(self, handlers: Optional[Dict[str, Callable[[list], Any]]]=None, max_batch: Optional[int]=None, latency: float=0.0):
+        self.handlers: Dict[str, Callable[[list], Any]] = dict(handlers or {})
+        self.max_batch = max_batch
+        self.latency = float(latency)  # seconds added to every HTTP round trip
+        self.calls: List[Tuple[str, list]] = []
+        self.http_requests = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _answer(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        method, params = req.get("method"), req.get("params") or []
+        with self._lock:
+            self.calls.append((method, params))
+        out: Dict[str, Any] = {"jsonrpc": "2.0", "id": req.get("id")}
+        handler = self.handlers.get(method)
+        if handler is None:
+            out["error"] = {"code": -32601, "message": f"the method {method} does not exist/is not available"}
+            return out
+        try:
+            out["result"] = handler(params)
+        except RPCError as e:
+            out["error"] = {"code": e.code, "message": e.message}
+        except Exception as e:
+            out["error"] = {"code": -32603, "message": f"internal error: {e!r}"}
+        return out
+
+    def handle(self, payload: Any) -> Any:
+        """Answer a decoded JSON-RPC payload (single object or batch list)"""
+        with self._lock:
+            self.http_requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(payload, list):
+            if self.max_batch is not None and len(payload) > self.max_batch:
+                return {"jsonrpc": "2.0", "id": None,
+                        "error": {"code": -32600, "message": f"batch size limit exceeded ({self.max_batch})"}}
+            return [self._answer(r) for r in payload]
+        return self._answer(payload)
+
+    def start(self) -> "FakeNode":
+        node = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.dumps(node.handle(json.loads(self.rfile.read(length)))).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeNode":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @classmethod
+    def replay(cls, fixture: Any, latency: float=0.0, max_batch: Optional[int]=None) -> "FakeNode":
+        """Node answering from a fixture (dict or path written by RecordingProvider.save)"""
+        if isinstance(fixture, str):
+            fixture = load_fixture(fixture)
+        return cls(replay_handlers(fixture), max_batch=max_batch, latency=latency)
+
+def new_fixture() -> Dict[str, Any]:
+    return {"version": 1, "chain_id": None, "heads": [], "logs": [], "log_ranges": [], "answers": {}, "meta": {}}
+
+def load_fixture(path: str) -> Dict[str, Any]:
+    with (gzip.open if path.endswith(".gz") else open)(path, "rt") as f:
+        return json.load(f)
+
+def save_fixture(fixture: Dict[str, Any], path: str) -> None:
+    with (gzip.open if path.endswith(".gz") else open)(path, "wt") as f:
+        json.dump(fixture, f, separators=(",", ":"))
+
+def _log_matches(log: Dict[str, Any], flt: Dict[str, Any]) -> bool:
+    addrs = flt.get("address")
+    if addrs:
+        addrs = [addrs] if isinstance(addrs, str) else addrs
+        if log["address"].lower() not in {a.lower() for a in addrs}:
+            return False
+    for i, want in enumerate(flt.get("topics") or []):
+        if want is None:
+            continue
+        want = [want] if isinstance(want, str) else want
+        if i >= len(log["topics"]) or log["topics"][i].lower() not in {t.lower() for t in want}:
+            return False
+    return True
+
+def replay_handlers(fixture: Dict[str, Any]) -> Dict[str, Callable[[list], Any]]:
+    """
+    Handlers serving a fixture:
+    - eth_blockNumber: the recorded heads in order, the last one repeated
+    - eth_getLogs: recorded logs filtered by range / address / topics; ranges outside the recorded ones are an error
+    - other recorded methods: the answer stored for the same (canonical) params, null when not recorded
+    """
+    logs = sorted(fixture["logs"], key=lambda x: (int(x["blockNumber"], 16), int(x["logIndex"], 16)))
+    blocks = [int(log["blockNumber"], 16) for log in logs]
+    ranges: List[List[int]] = []
+    for r0, r1 in sorted(fixture["log_ranges"]):
+        if ranges and r0 <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], r1)  # adjacent / overlapping ranges merged
+        else:
+            ranges.append([r0, r1])
+    heads = fixture["heads"] or [hex(max((b1 for _, b1 in ranges), default=0))]
+    answers = fixture["answers"]
+    polls = {"n": 0}
+
+    def block_number(params):
+        polls["n"] += 1
+        return heads[min(polls["n"], len(heads)) - 1]
+
+    def get_logs(params):
+        flt = params[0]
+        b0, b1 = int(flt["fromBlock"], 16), int(flt["toBlock"], 16)
+        if not any(r0 <= b0 and b1 <= r1 for r0, r1 in ranges):
+            raise RPCError(-32000, f"block range [{b0},{b1}] not recorded in the fixture")
+        i, j = bisect.bisect_left(blocks, b0), bisect.bisect_right(blocks, b1)
+        return [log for log in logs[i:j] if _log_matches(log, flt)]
+
+    def stored(method):
+        return lambda params: answers.get(cache_key(method, params).hex())
+
+    handlers = {m: stored(m) for m in RECORDED_METHODS}
+    handlers.update({"eth_chainId": lambda p: fixture["chain_id"] or "0x38", "eth_blockNumber": block_number, "eth_getLogs": get_logs})
+    return handlers
+
+class RecordingProvider(JSONBaseProvider):
+    """
+    Wraps a provider and records the answers of RECORDED_METHODS into `fixture` (save() to write it).
+    eth_getLogs answers are merged into one log list; replays must query the same or narrower filters.
+    """
+    def __init__(self, provider: JSONBaseProvider, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.provider = provider
+        self.endpoint_uri = getattr(provider, "endpoint_uri", type(provider).__name__)
+        self.fixture = new_fixture()
+        self._logs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, method: str, params: Any, response: Any) -> None:
+        if method not in RECORDED_METHODS or not isinstance(response, dict) or "result" not in response:
+            return
+        result = response["result"]
+        with self._lock:
+            if method == "eth_chainId":
+                self.fixture["chain_id"] = result
+            elif method == "eth_blockNumber":
+                self.fixture["heads"].append(result)
+            elif method == "eth_getLogs":
+                flt = params[0]
+                self.fixture["log_ranges"].append([int(flt["fromBlock"], 16), int(flt["toBlock"], 16)])
+                for log in result:
+                    self._logs[(log["transactionHash"], log["logIndex"])] = log
+                self.fixture["logs"] = list(self._logs.values())
+            else:
+                self.fixture["answers"][cache_key(method, params).hex()] = result
+
+    def make_request(self, method, params) -> Any:
+        response = self.provider.make_request(method, params)
+        self._record(method, params, response)
+        return response
+
+    def make_batch_request(self, requests) -> Any:
+        responses = self.provider.make_batch_request(requests)
+        if isinstance(responses, list):
+            for (method, params), response in zip(requests, responses):
+                self._record(method, params, response)
+        return responses
+
+    def is_connected(self, show_traceback: bool=False) -> bool:
+        return self.provider.is_connected(show_traceback)
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            save_fixture(self.fixture, path)
+
+# End of file
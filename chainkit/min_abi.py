@@ -70,6 +70,8 @@ UNIV2_PAIR_MIN_ABI = [
     # read
     {"name":"token0","inputs":[],"outputs":[{"type":"address","name":""}],
      "stateMutability":"view","type":"function"},
+    {"name":"factory","inputs":[],"outputs":[{"type":"address","name":""}],
+     "stateMutability":"view","type":"function"},
     {"name":"token1","inputs":[],"outputs":[{"type":"address","name":""}],
      "stateMutability":"view","type":"function"},
     {"name":"getReserves","inputs":[],"outputs":[
@@ -106,6 +108,12 @@ UNIV2_PAIR_MIN_ABI = [
 UNIV2_FACTORY_MIN_ABI = [
     {"name":"getPair","inputs":[{"type":"address","name":"tokenA"},{"type":"address","name":"tokenB"}],
      "outputs":[{"type":"address","name":"pair"}],"stateMutability":"view","type":"function"},
+    {"anonymous":False,"type":"event","name":"PairCreated",
+     "inputs":[
+        {"indexed":True,"name":"token0","type":"address"},
+        {"indexed":True,"name":"token1","type":"address"},
+        {"indexed":False,"name":"pair","type":"address"},
+        {"indexed":False,"name":"","type":"uint256"}]},
 ]
 
 # ------------- UniswapV3 / PancakeV3 --------------
@@ -113,6 +121,8 @@ UNIV3_POOL_MIN_ABI = [
     # read
     {"name":"token0","inputs":[],"outputs":[{"type":"address","name":""}],
      "stateMutability":"view","type":"function"},
+    {"name":"factory","inputs":[],"outputs":[{"type":"address","name":""}],
+     "stateMutability":"view","type":"function"},
     {"name":"token1","inputs":[],"outputs":[{"type":"address","name":""}],
      "stateMutability":"view","type":"function"},
     {"name":"fee","inputs":[],"outputs":[{"type":"uint24","name":""}],
@@ -153,7 +163,30 @@ UNIV3_FACTORY_MIN_ABI = [
         {"type":"address","name":"tokenB"},
         {"type":"uint24","name":"fee"}],
      "outputs":[{"type":"address","name":"pool"}],
-     "stateMutability":"view","type":"function"}
+     "stateMutability":"view","type":"function"},
+    {"anonymous":False,"type":"event","name":"PoolCreated",
+     "inputs":[
+        {"indexed":True,"name":"token0","type":"address"},
+        {"indexed":True,"name":"token1","type":"address"},
+        {"indexed":True,"name":"fee","type":"uint24"},
+        {"indexed":False,"name":"tickSpacing","type":"int24"},
+        {"indexed":False,"name":"pool","type":"address"}]},
+]
+
+# ------------- Multicall3 (same address on BSC and most EVM chains) --------------
+MULTICALL3_ADDR = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_MIN_ABI = [
+    {"name":"aggregate3","inputs":[
+        {"type":"tuple[]","name":"calls","components":[
+            {"type":"address","name":"target"},
+            {"type":"bool","name":"allowFailure"},
+            {"type":"bytes","name":"callData"}]}],
+     "outputs":[
+        {"type":"tuple[]","name":"returnData","components":[
+            {"type":"bool","name":"success"},
+            {"type":"bytes","name":"returnData"}]}],
+     "stateMutability":"payable","type":"function"},
 ]
 
 def _abi_item_key(item: Mapping[str, Any]) -> Tuple[Any, ...]:
@@ -0,0 +1,63 @@
+"""
+Multicall3 batching of read-only calls.
+- aggregate3(w3, calls): many (target, calldata) calls in as few eth_call as possible, each allowed to fail
+- Calls are chunked (`chunk_size` per eth_call) to stay under provider gas / payload limits
+- A chunk reverting as a whole (e.g. a call exhausting the gas) is bisected, the culprit calls come back as failed
+"""
+
+from typing import Any, List, Optional, Sequence, Tuple
+from eth_abi import decode, encode
+from web3 import Web3
+from web3.exceptions import ContractLogicError
+
+from .decoders import fn_selector
+from .min_abi import MULTICALL3_ADDR
+
+AGGREGATE3 = fn_selector("aggregate3((address,bool,bytes)[])")
+MULTICALL_CHUNK = 300
+
+# eth_call errors caused by the calls of the chunk itself, not by the node
+CALL_FAILURE_MARKERS = ("execution reverted", "out of gas", "gas required exceeds", "invalid opcode", "invalid jump")
+
+def is_call_failure(e: Exception) -> bool:
+    """Check if an eth_call error comes from the executed calls (bisecting isolates them) rather than from the transport"""
+    if isinstance(e, ContractLogicError):
+        return True
+    msg = str(e).lower()
+    return any(m in msg for m in CALL_FAILURE_MARKERS)
+
+def encode_aggregate3(calls: Sequence[Tuple[str, bytes]]) -> bytes:
+    return AGGREGATE3 + encode(["(address,bool,bytes)[]"], [[(Web3.to_checksum_address(t), True, bytes(d)) for t, d in calls]])
+
+def decode_aggregate3(ret: bytes) -> List[Tuple[bool, bytes]]:
+    return [(bool(ok), bytes(data)) for ok, data in decode(["(bool,bytes)[]"], bytes(ret))[0]]
+
+def aggregate3(w3: Web3, calls: Sequence[Tuple[str, bytes]], chunk_size: int=MULTICALL_CHUNK, block: Any="latest", multicall: Optional[str]=None) -> List[Tuple[bool, bytes]]:
+    """
+    Run (target, calldata) calls through Multicall3 aggregate3, allowFailure on every call.
+    - return (success, returndata) per call, in input order
+    - a chunk failing for its calls (`is_call_failure`) is split in halves down to the failing calls, (False, b"") each
+    - other eth_call errors (transport, no Multicall3 on the chain) are raised as is
+    """
+    to = Web3.to_checksum_address(multicall or MULTICALL3_ADDR)
+    out: List[Tuple[bool, bytes]] = []
+    for i in range(0, len(calls), chunk_size):
+        out.extend(_aggregate3_chunk(w3, to, calls[i:i + chunk_size], block))
+    return out
+
+def _aggregate3_chunk(w3: Web3, to: str, chunk: Sequence[Tuple[str, bytes]], block: Any) -> List[Tuple[bool, bytes]]:
+    try:
+        ret = w3.eth.call({"to": to, "data": "0x" + encode_aggregate3(chunk).hex()}, block)
+    except Exception as e:
+        if not is_call_failure(e):
+            raise
+        if len(chunk) == 1:
+            return [(False, b"")]
+        half = len(chunk) // 2
+        return _aggregate3_chunk(w3, to, chunk[:half], block) + _aggregate3_chunk(w3, to, chunk[half:], block)
+    results = decode_aggregate3(ret)
+    if len(results) != len(chunk):
+        raise ValueError(f"aggregate3 answered {len(results)} of {len(chunk)} calls")
+    return results
+
+# End of file
@@ -0,0 +1,218 @@
+"""
+Columnar export of decoded events to Parquet (needs pyarrow).
+- One file set per event type: <root>/type=<type>/blocks=<start>-<end>/part-<n>.parquet,
+  block ranges of `partition_blocks`, files rolled over after `max_file_bytes`
+- Typed columns: addresses / hashes as fixed-size binary, bools, small ints as int64 / uint64,
+  uint256 / int256 (and any int wider than 64 bits) as 32-byte big-endian fixed-size binary (two's complement when signed)
+- Argument types come from the minimal ABIs (min_abi) through the registry signatures
+- Unknown raw events go to <root>/type=unknown_events_raw/...
+- add_batch() writes a columnar.EventBatch straight from its NumPy columns
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import json, os
+
+from .sink import EventSink
+from .registry_event import BUILTIN_EVENTS
+from . import min_abi
+
+UNKNOWN_TYPE = "unknown_events_raw"
+
+def _abi_arg_types() -> Dict[str, Dict[str, str]]:
+    """event name in the registry ("UniV2.Swap") -> {arg name: ABI type}, from the min ABIs"""
+    by_sig: Dict[str, Dict[str, str]] = {}
+    for abi in (min_abi.ERC20_MIN_ABI, min_abi.ERC721_MIN_ABI, min_abi.WETH_MIN_ABI,
+                min_abi.UNIV2_PAIR_MIN_ABI, min_abi.UNIV3_POOL_MIN_ABI):
+        for it in abi:
+            if it.get("type") != "event":
+                continue
+            ins = it.get("inputs", [])
+            sig = f"{it['name']}({','.join(a['type'] for a in ins)})"
+            by_sig.setdefault(sig, {a["name"]: a["type"] for a in ins})
+    return {meta["name"]: by_sig.get(meta["sig"], {}) for meta in BUILTIN_EVENTS.values()}
+
+ARG_TYPES = _abi_arg_types()
+
+def _int_bits(abi_type: str) -> Tuple[bool, int]:
+    signed = abi_type.startswith("int")
+    digits = abi_type[3 if signed else 4:]
+    return signed, int(digits) if digits else 256
+
+def _word(v: Optional[int], signed: bool) -> Optional[bytes]:
+    return None if v is None else int(v).to_bytes(32, "big", signed=signed)
+
+def _hex_bytes(v: Optional[str]) -> Optional[bytes]:
+    return None if v is None else bytes.fromhex(v[2:])
+
+class ParquetSink(EventSink):
+    def __init__(self, root: str, partition_blocks: int=100_000, max_file_bytes: int=128 * 1024 * 1024, batch_size: int=50_000, flush_interval: float=30.0, compression: str="zstd"):
+        super().__init__(batch_size, flush_interval)
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("ParquetSink requires pyarrow: pip install pyarrow")
+        self.pa, self.pc, self.pq = pa, pc, pq
+        self.root = root
+        self.partition_blocks = int(partition_blocks)
+        self.max_file_bytes = int(max_file_bytes)
+        self.compression = compression
+        self._writers: Dict[Tuple[str, int], Any] = {}     # (type, partition) -> ParquetWriter
+        self._sizes: Dict[Tuple[str, int], int] = {}       # bytes written to the open file
+        self._parts: Dict[Tuple[str, int], int] = {}       # next part number
+
+    # EventSink keeps rows as they come, typed conversion happens per type at flush
+    def add_events(self, events: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._events.extend(events)
+        self._maybe_flush()
+
+    def add_unknown(self, rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._unknown.extend(rows)
+        self._maybe_flush()
+
+    def add_batch(self, batch: Any) -> None:
+        """Write a columnar.EventBatch as is, no per-row conversion"""
+        with self._lock:
+            self._write_table(batch.type, batch.to_arrow())
+
+    # ---- typing ----
+
+    def _arg_columns(self, name: str, sample: Dict[str, Any]) -> List[Tuple[str, Any, Any]]:
+        """(column, arrow type, converter) for each arg of an event type"""
+        pa = self.pa
+        types = ARG_TYPES.get(name, {})
+        cols = []
+        for arg, value in sample.items():
+            t = types.get(arg)
+            if t == "address" or (t is None and isinstance(value, str) and len(value) == 42):
+                cols.append((arg, pa.binary(20), _hex_bytes))
+            elif t == "bool" or isinstance(value, bool):
+                cols.append((arg, pa.bool_(), None))
+            elif t is not None and t.startswith(("uint", "int")):
+                signed, bits = _int_bits(t)
+                if bits <= 64:
+                    cols.append((arg, pa.int64() if signed or bits < 64 else pa.uint64(), None))
+                else:
+                    cols.append((arg, pa.binary(32), lambda v, s=signed: _word(v, s)))
+            elif isinstance(value, int):
+                cols.append((arg, pa.binary(32), lambda v: _word(v, v is not None and v < 0)))
+            else:
+                cols.append((arg, pa.string(), lambda v: None if v is None else str(v)))
+        return cols
+
+    def _event_table(self, rows: List[Dict[str, Any]]) -> Any:
+        pa = self.pa
+        arg_cols = self._arg_columns(rows[0].get("name"), rows[0]["args"])
+        arrays = {
+            "block_number": pa.array([r["block_number"] for r in rows], pa.int64()),
+            "tx_hash": pa.array([_hex_bytes(r["tx_hash"]) for r in rows], pa.binary(32)),
+            "log_index": pa.array([r["log_index"] for r in rows], pa.int32()),
+            "contract": pa.array([_hex_bytes(r["contract"]) for r in rows], pa.binary(20)),
+        }
+        for arg, typ, conv in arg_cols:
+            values = [r["args"].get(arg) for r in rows]
+            arrays[arg] = pa.array([conv(v) for v in values] if conv else values, typ)
+        return pa.table(arrays)
+
+    def _unknown_table(self, rows: List[Dict[str, Any]]) -> Any:
+        pa = self.pa
+        return pa.table({
+            "block_number": pa.array([r["block_number"] for r in rows], pa.int64()),
+            "block_hash": pa.array([_hex_bytes(r.get("block_hash")) for r in rows], pa.binary(32)),
+            "tx_hash": pa.array([_hex_bytes(r["tx_hash"]) for r in rows], pa.binary(32)),
+            "tx_index": pa.array([r.get("tx_index") for r in rows], pa.int32()),
+            "log_index": pa.array([r["log_index"] for r in rows], pa.int32()),
+            "address": pa.array([_hex_bytes(r["address"]) for r in rows], pa.binary(20)),
+            "topic0": pa.array([_hex_bytes(r.get("topic0")) for r in rows], pa.binary(32)),
+            "topics": pa.array([[_hex_bytes(t) for t in r["topics"]] for r in rows], pa.list_(pa.binary(32))),
+            "data": pa.array([_hex_bytes(r["data_hex"]) for r in rows], pa.binary()),
+            "removed": pa.array([bool(r.get("removed")) for r in rows], pa.bool_()),
+            "parse_error": pa.array([r.get("parse_error") for r in rows], pa.string()),
+        })
+
+    # ---- files ----
+
+    def _write_table(self, typ: str, table: Any) -> None:
+        """Split a table by block partition and append it to the open file of each partition"""
+        pc = self.pc
+        parts = pc.divide(table["block_number"], self.partition_blocks)
+        for p in sorted(set(parts.to_pylist())):
+            chunk = table.filter(pc.equal(parts, p))
+            key = (typ, p)
+            writer = self._writers.get(key)
+            if writer is not None and not writer.schema.equals(chunk.schema):
+                self._close_writer(key)
+                writer = None
+            if writer is None:
+                n = self._parts.get(key, 0)
+                self._parts[key] = n + 1
+                start = p * self.partition_blocks
+                d = os.path.join(self.root, f"type={typ}", f"blocks={start}-{start + self.partition_blocks - 1}")
+                os.makedirs(d, exist_ok=True)
+                path = os.path.join(d, f"part-{n:05d}.parquet")
+                while os.path.exists(path):
+                    # Never overwrite files of a previous run
+                    n = self._parts[key]
+                    self._parts[key] = n + 1
+                    path = os.path.join(d, f"part-{n:05d}.parquet")
+                writer = self.pq.ParquetWriter(path, chunk.schema, compression=self.compression)
+                self._writers[key] = writer
+                self._sizes[key] = 0
+            writer.write_table(chunk)
+            self._sizes[key] += chunk.nbytes
+            if self._sizes[key] >= self.max_file_bytes:
+                self._close_writer(key)
+
+    def _close_writer(self, key: Tuple[str, int]) -> None:
+        writer = self._writers.pop(key, None)
+        if writer is not None:
+            writer.close()
+        self._sizes.pop(key, None)
+
+    def _write(self, events: List[Dict[str, Any]], unknown: List[Dict[str, Any]]) -> None:
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        for ev in events:
+            by_type.setdefault(ev["type"], []).append(ev)
+        for typ, rows in by_type.items():
+            self._write_table(typ, self._event_table(rows))
+        if unknown:
+            self._write_table(UNKNOWN_TYPE, self._unknown_table(unknown))
+
+        # Partitions fully behind this batch will not receive rows anymore: finish their files
+        lowest = min((r["block_number"] for r in events + unknown), default=None)
+        if lowest is not None:
+            for key in [k for k in self._writers if (k[1] + 1) * self.partition_blocks <= lowest]:
+                self._close_writer(key)
+
+    def close(self) -> None:
+        self.flush()
+        for key in list(self._writers):
+            self._close_writer(key)
+
+def open_dataset(root: str, typ: str) -> Any:
+    """pyarrow dataset of one event type, e.g. open_dataset(root, "v2_swap").to_table(columns=[...], filter=...)"""
+    import pyarrow.dataset as ds
+    return ds.dataset(os.path.join(root, f"type={typ}"), format="parquet", partitioning="hive")
+
+def export_jsonl(jsonl_path: str, root: str, **kwargs) -> int:
+    """Export `analyze_tx`-shaped JSON lines (e.g. backfill output) to Parquet, return the number of results"""
+    n = 0
+    with ParquetSink(root, **kwargs) as sink, open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            r = json.loads(line)
+            sink.add_events(r["events"])
+            sink.add_unknown(r["unknown_events_raw"])
+            n += 1
+    return n
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 3:
+        print("usage: python -m chainkit.parquet_sink results.jsonl out_dir")
+        sys.exit(1)
+    print(f"[parquet] exported {export_jsonl(sys.argv[1], sys.argv[2])} results to {sys.argv[2]}")
+
+# End of file
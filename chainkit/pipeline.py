@@ -0,0 +1,192 @@
+"""
+Pipelined runner: collect -> fetch -> decode -> sink stages in their own threads.
+- Bounded queues between stages give backpressure: a slow sink blocks decode, then fetch, then collect
+- The next window is collected / fetched while the current one is decoded and written out
+- Runner state (seen, last_safe_head) is committed by the sink stage only, in window order
+- Same modes as Runner: per tx (batch_size), block_mode (fetch_block per block), log_only (no fetch, logs decoded as collected)
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Set
+from web3 import Web3
+import queue, threading, time
+
+from .runner import Runner
+from .tx_tracker import fetch_block, fetch_many, decode_logs, decode_receipt, save_normalized_events, save_unknown_events, flush_events
+from .collector import collect_tx_hashes
+
+_STOP = object()
+
+def store_sink(results: List[Dict[str, Any]]) -> None:
+    """Default sink when `store_tx_analyze` is set: write events through tx_tracker"""
+    for r in results:
+        save_normalized_events(r["events"])
+        save_unknown_events(r["unknown_events_raw"])
+    flush_events()
+
+class PipelineRunner(Runner):
+    """
+    Runner with staged execution. Every queue item is one block window.
+    - queue_size: max windows waiting between two stages
+    - sink: callable(results) called once per window, after decoding (default: store_sink if store_tx_analyze)
+    """
+    STAGES = ("fetch", "decode", "sink")
+
+    def __init__(self, w3: Web3, queue_size: int=2, sink: Optional[Callable[[List[Dict[str, Any]]], None]]=None, **kwargs):
+        super().__init__(w3, **kwargs)
+        self.queue_size = int(queue_size)
+        self.sink = sink or (store_sink if self.store_tx_analyze else None)
+        self.queues: Dict[str, queue.Queue] = {name: queue.Queue(maxsize=self.queue_size) for name in self.STAGES}
+        self._pending: Set[str] = set()  # collected, not yet committed by the sink
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self.windows_done = 0
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Number of windows waiting in front of each stage"""
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def _put(self, name: str, item: Any) -> bool:
+        """Blocking put that gives up when the pipeline is stopping"""
+        while not self._stop.is_set():
+            try:
+                self.queues[name].put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, name: str) -> Any:
+        """Blocking get that returns _STOP when the pipeline is stopping"""
+        while not self._stop.is_set():
+            try:
+                return self.queues[name].get(timeout=0.2)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    # ---- stages ----
+
+    def _collect_stage(self, max_windows: Optional[int]) -> None:
+        cursor = self.last_safe_head
+        n = 0
+        while not self._stop.is_set() and (max_windows is None or n < max_windows):
+            try:
+                safe = self._safe_head()
+                self.safe_seen = safe
+                b0, b1 = self._range_after(cursor, safe)
+                if b0 > b1:
+                    idle = self.sleep_secs if self.scheduler is None else self.scheduler.after_round(safe, cursor, 0.0)
+                    self._stop.wait(idle)
+                    continue
+                t0 = time.monotonic()
+                self._update_pool_index(b0, b1)
+                logs = collect_tx_hashes(self.w3, self.watchlist, b0, b1, topics=self.topics, shard_size=self.shard_size)
+                if self.scheduler is not None:
+                    self.scheduler.after_round(safe, b1, time.monotonic() - t0)  # span of the next window
+            except Exception as e:
+                print(f"[pipeline] collect error: {e}")
+                self._stop.wait(self.sleep_secs)
+                continue
+            by_block = self._group_by_block(logs)
+            cand = [h for hashes in by_block.values() for h in hashes]
+            with self._lock:
+                todo = [h for h in cand if h not in self.seen and h not in self._pending]
+                self._pending.update(todo)
+            item = {"range": (b0, b1), "candidates": len(cand), "todo": todo}
+            if self.log_only:
+                item["logs"] = self._logs_of(logs, todo)
+            elif self.block_mode:
+                item["by_block"] = self._todo_by_block(by_block, todo)
+            if not self._put("fetch", item):
+                return
+            cursor = b1
+            n += 1
+
+    def _fetch(self, item: Dict[str, Any]) -> Optional[List[tuple]]:
+        """(tx, receipt) pairs of a window with the configured mode, None in log_only mode"""
+        if self.log_only:
+            return None
+        if self.block_mode:
+            return [pair for bn, sel in item["by_block"].items() for pair in fetch_block(self.w3, bn, sel)]
+        return fetch_many(self.w3, item["todo"], batch_size=self.batch_size)
+
+    def _fetch_stage(self) -> None:
+        while True:
+            item = self._get("fetch")
+            if item is _STOP:
+                self._put("decode", _STOP)
+                return
+            while not self._stop.is_set():
+                try:
+                    item["pairs"] = self._fetch(item)
+                    break
+                except Exception as e:
+                    print(f"[pipeline] fetch error: {e}")
+                    self._stop.wait(self.sleep_secs)
+            if not self._put("decode", item):
+                return
+
+    def _decode_stage(self) -> None:
+        while True:
+            item = self._get("decode")
+            if item is _STOP:
+                self._put("sink", _STOP)
+                return
+            pairs = item.pop("pairs")
+            if pairs is None:
+                item["results"] = decode_logs(item.pop("logs"))
+            else:
+                item["results"] = [decode_receipt(tx, receipt) for tx, receipt in pairs]
+            if not self._put("sink", item):
+                return
+
+    def _sink_stage(self) -> None:
+        while True:
+            item = self._get("sink")
+            if item is _STOP:
+                return
+            if self.sink is not None:
+                self.sink(item["results"])
+            b0, b1 = item["range"]
+            with self._lock:
+                self._mark_seen(item["todo"])
+                self._pending.difference_update(item["todo"])
+                self.last_safe_head = b1
+            self._save_state()
+            self.windows_done += 1
+            print(f"[pipeline] blocks [{b0},{b1}] candidates={item['candidates']} processed={len(item['results'])} queues={self.queue_depths()}")
+
+    def _guard(self, fn: Callable, *args) -> Callable[[], None]:
+        def run():
+            try:
+                fn(*args)
+            except BaseException as e:
+                self._errors.append(e)
+                print(f"[pipeline] {fn.__name__} error: {e}")
+                self._stop.set()
+        return run
+
+    def run_loop(self, max_windows: Optional[int]=None) -> None:
+        """Run all stages until interrupted, or until `max_windows` windows went through the sink"""
+        print(f"[pipeline] loop start: window={self.window}, conf={self.confirmations}, queue_size={self.queue_size}")
+        self._stop.clear()
+        workers = [threading.Thread(target=self._guard(fn), daemon=True, name=f"chainkit-{name}")
+                   for name, fn in (("fetch", self._fetch_stage), ("decode", self._decode_stage), ("sink", self._sink_stage))]
+        for t in workers:
+            t.start()
+        try:
+            self._guard(self._collect_stage, max_windows)()
+            if not self._stop.is_set():
+                self._put("fetch", _STOP)
+            for t in workers:
+                while t.is_alive():
+                    t.join(timeout=0.2)
+        except KeyboardInterrupt:
+            print("[pipeline] stopped")
+        finally:
+            self._stop.set()
+        if self._errors:
+            raise self._errors[0]
+
+# End of file
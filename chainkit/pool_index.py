@@ -0,0 +1,271 @@
+"""
+Local pool index built from factory creation events (V2 PairCreated, V3 PoolCreated).
+- backfill(): one-time scan of the factory history, in `step` block chunks, resumable
+- update(): incremental scan up to a block, called by the runners every round (`Runner(pool_index=...)`)
+- SQLite store indexed by token, by pair and by factory: watchlists are built locally, no getPair / getPool calls
+- Pools and scan progress are committed in the same transaction, a crash never leaves a hole in the index
+"""
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from web3 import Web3
+import sqlite3, threading
+
+from .collector import collect_tx_hashes, async_collect_tx_hashes
+from .decoders import sig_topic
+
+PANCAKE_V2_FACTORY_ADDR = "0xcA143Ce32Fe78f1f7019d7d551a6402fC5350c73"
+PANCAKE_V3_FACTORY_ADDR = "0x0BFbCF9fa4f9C56B0F40a671Ad40E0805A091865"
+
+# factory -> first block to scan (at or before the factory deployment, BSC)
+PANCAKE_FACTORIES = {
+    PANCAKE_V2_FACTORY_ADDR: 6_809_000,
+    PANCAKE_V3_FACTORY_ADDR: 26_000_000,
+}
+
+PAIR_CREATED = sig_topic("PairCreated(address,address,address,uint256)")
+POOL_CREATED = sig_topic("PoolCreated(address,address,uint24,int24,address)")
+CREATION_TOPICS = [PAIR_CREATED, POOL_CREATED]
+_RAW_PAIR_CREATED, _RAW_POOL_CREATED = bytes.fromhex(PAIR_CREATED[2:]), bytes.fromhex(POOL_CREATED[2:])
+
+BACKFILL_STEP = 200_000  # blocks per scan chunk, each chunk is committed with its progress
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pools (
+    address TEXT PRIMARY KEY, factory TEXT NOT NULL, version INTEGER NOT NULL, token0 TEXT NOT NULL, token1 TEXT NOT NULL,
+    fee INTEGER, tick_spacing INTEGER, block_number INTEGER NOT NULL, log_index INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pools_by_pair ON pools (token0, token1);
+CREATE INDEX IF NOT EXISTS pools_by_token1 ON pools (token1);
+CREATE INDEX IF NOT EXISTS pools_by_factory ON pools (factory);
+CREATE TABLE IF NOT EXISTS pool_index_progress (
+    factory TEXT PRIMARY KEY, first_block INTEGER NOT NULL, next_block INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+_COLS = ("address", "factory", "version", "token0", "token1", "fee", "tick_spacing", "block_number")
+
+def _address(word: bytes) -> str:
+    return "0x" + word[12:32].hex()
+
+def parse_creation_log(log: Mapping[str, Any]) -> Optional[tuple]:
+    """
+    PairCreated / PoolCreated log to a `pools` row, None for any other log.
+    (address, factory, version, token0, token1, fee, tick_spacing, block_number, log_index)
+    """
+    topics = log["topics"]
+    if not topics:
+        return None
+    topic0, data = bytes(topics[0]), bytes(log["data"])
+    factory = log["address"].lower()
+    if topic0 == _RAW_PAIR_CREATED and len(topics) == 3 and len(data) >= 64:
+        return (_address(data[:32]), factory, 2, _address(bytes(topics[1])), _address(bytes(topics[2])),
+                None, None, log["blockNumber"], log["logIndex"])
+    if topic0 == _RAW_POOL_CREATED and len(topics) == 4 and len(data) >= 64:
+        return (_address(data[32:64]), factory, 3, _address(bytes(topics[1])), _address(bytes(topics[2])),
+                int.from_bytes(bytes(topics[3]), "big"), int.from_bytes(data[:32], "big", signed=True),
+                log["blockNumber"], log["logIndex"])
+    return None
+
+class PoolIndex:
+    def __init__(self, path: str="pool_index.db", factories: Optional[Mapping[str, int]]=None, step: int=BACKFILL_STEP):
+        self.factories = {f.lower(): int(b) for f, b in (factories or PANCAKE_FACTORIES).items()}  # factory -> first block
+        self.step = max(1, int(step))
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    # ---- scanning ----
+
+    def progress(self) -> Dict[str, Tuple[int, int]]:
+        """{factory: (first block scanned, next block to scan)}"""
+        with self._lock:
+            rows = self.conn.execute("SELECT factory, first_block, next_block FROM pool_index_progress").fetchall()
+        return {f: (b0, nxt) for f, b0, nxt in rows}
+
+    def _commit(self, logs: Iterable[Mapping[str, Any]], factories: List[str], b0: int, b1: int) -> int:
+        """Store the pools created in [b0, b1] by `factories` and extend their scanned range, in one transaction"""
+        wanted = set(factories)
+        rows = [row for row in map(parse_creation_log, logs) if row is not None and row[1] in wanted]
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO pools VALUES (?,?,?,?,?,?,?,?,?)", rows)
+            added = self.conn.total_changes - before
+            self.conn.executemany(
+                "INSERT INTO pool_index_progress (factory, first_block, next_block) VALUES (?,?,?) "
+                "ON CONFLICT(factory) DO UPDATE SET first_block=min(first_block, excluded.first_block), "
+                "next_block=max(next_block, excluded.next_block)",
+                [(f, b0, b1 + 1) for f in factories])
+        return added
+
+    def _plan(self, to_block: int, start: Optional[int]) -> List[Tuple[int, int, List[str]]]:
+        """(b0, b1, factories) chunks to scan up to to_block; factories at the same progress share their eth_getLogs"""
+        progress = self.progress()
+        groups: Dict[int, List[str]] = {}
+        for f, first in self.factories.items():
+            b0 = progress[f][1] if f in progress else (first if start is None else max(first, start))
+            if b0 <= to_block:
+                groups.setdefault(b0, []).append(f)
+        return [(s, min(to_block, s + self.step - 1), fs)
+                for b0, fs in sorted(groups.items()) for s in range(b0, to_block + 1, self.step)]
+
+    def update(self, w3: Web3, to_block: int, start: Optional[int]=None) -> int:
+        """
+        Scan every factory from its progress up to to_block, return the number of new pools.
+        A factory never scanned starts at `start` (default: its first block), see backfill() for the history before it.
+        """
+        added = 0
+        for b0, b1, fs in self._plan(to_block, start):
+            added += self._commit(collect_tx_hashes(w3, fs, b0, b1, topics=CREATION_TOPICS), fs, b0, b1)
+        return added
+
+    async def async_update(self, w3, to_block: int, start: Optional[int]=None) -> int:
+        """Same as `update` for an AsyncWeb3 instance"""
+        added = 0
+        for b0, b1, fs in self._plan(to_block, start):
+            added += self._commit(await async_collect_tx_hashes(w3, fs, b0, b1, topics=CREATION_TOPICS), fs, b0, b1)
+        return added
+
+    def backfill(self, w3: Web3, to_block: Optional[int]=None, confirmations: int=3) -> int:
+        """
+        One-time history scan: every factory from its first block up to to_block (default: latest - confirmations).
+        - Resumable: progress is committed every `step` blocks
+        - Blocks left before an index started by the runner are scanned downwards, keeping the scanned range contiguous
+        """
+        if to_block is None:
+            to_block = max(0, w3.eth.block_number - confirmations)
+        added = 0
+        for f, (first_done, _) in self.progress().items():
+            first = self.factories.get(f)
+            if first is None:
+                continue
+            for b1 in range(first_done - 1, first - 1, -self.step):
+                b0 = max(first, b1 - self.step + 1)
+                added += self._commit(collect_tx_hashes(w3, [f], b0, b1, topics=CREATION_TOPICS), [f], b0, b1)
+        added += self.update(w3, to_block)
+        print(f"[pool_index] backfill up to {to_block}: {added} new pools, {len(self)} indexed")
+        return added
+
+    # ---- lookups ----
+
+    def _select(self, where: str, args: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {', '.join(_COLS)} FROM pools WHERE {where} ORDER BY block_number, log_index", args).fetchall()
+        return [dict(zip(_COLS, row)) for row in rows]
+
+    def get(self, pool: str) -> Optional[Dict[str, Any]]:
+        rows = self._select("address = ?", (pool.lower(),))
+        return rows[0] if rows else None
+
+    def get_many(self, pools: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """{pool address (lowercase): row} for the indexed pools only"""
+        addrs = list(dict.fromkeys(p.lower() for p in pools))
+        out: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(addrs), 500):
+            chunk = addrs[i:i + 500]
+            for row in self._select(f"address IN ({','.join('?' * len(chunk))})", tuple(chunk)):
+                out[row["address"]] = row
+        return out
+
+    def by_token(self, token: str, factory: Optional[str]=None) -> List[Dict[str, Any]]:
+        """Every pool containing `token`, optionally from one factory"""
+        t = token.lower()
+        if factory is None:
+            return self._select("token0 = ? OR token1 = ?", (t, t))
+        return self._select("(token0 = ? OR token1 = ?) AND factory = ?", (t, t, factory.lower()))
+
+    def by_pair(self, token_a: str, token_b: str, factory: Optional[str]=None) -> List[Dict[str, Any]]:
+        """Pools of a token pair, in any order (V2 pair and every V3 fee tier)"""
+        t0, t1 = sorted((token_a.lower(), token_b.lower()))
+        if factory is None:
+            return self._select("token0 = ? AND token1 = ?", (t0, t1))
+        return self._select("token0 = ? AND token1 = ? AND factory = ?", (t0, t1, factory.lower()))
+
+    def by_factory(self, factory: str) -> List[Dict[str, Any]]:
+        return self._select("factory = ?", (factory.lower(),))
+
+    def watchlist(self, tokens: Iterable[str]=(), pairs: Iterable[Tuple[str, str]]=(), factory: Optional[str]=None) -> List[str]:
+        """Pool addresses (unique, creation order per lookup) of the pools containing any of `tokens` or matching any of `pairs`"""
+        rows = [r for t in tokens for r in self.by_token(t, factory)]
+        rows += [r for a, b in pairs for r in self.by_pair(a, b, factory)]
+        return list(dict.fromkeys(r["address"] for r in rows))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT count(*) FROM pools").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+def _test_pool_index(n_pairs: int=5000) -> None:
+    """Offline check against a fake node: chunked backfill, runner-style updates, head gap, lookups and their latency"""
+    import os, tempfile, time
+    from .fake_node import FakeNode
+
+    v2, v3 = "0x" + "f2" * 20, "0x" + "f3" * 20
+    word = lambda x: x.to_bytes(32, "big")
+    addr = lambda i: "0x" + f"{i:040x}"
+    tokens = [addr(0x1000 + i) for i in range(200)]
+    logs = []
+    for i in range(n_pairs):
+        bn = 100 + i // 10
+        t0, t1 = sorted((tokens[i % 200], tokens[(i * 7 + 1) % 200]))
+        if i % 5:
+            logs.append({"address": v2, "blockNumber": bn, "logIndex": i % 10, "data": word(int(addr(0x10**9 + i), 16)) + word(i + 1),
+                         "topics": [PAIR_CREATED, "0x" + word(int(t0, 16)).hex(), "0x" + word(int(t1, 16)).hex()]})
+        else:
+            logs.append({"address": v3, "blockNumber": bn, "logIndex": i % 10, "data": word(10) + word(int(addr(0x10**10 + i), 16)),
+                         "topics": [POOL_CREATED, "0x" + word(int(t0, 16)).hex(), "0x" + word(int(t1, 16)).hex(), "0x" + word(500).hex()]})
+    head = logs[-1]["blockNumber"] + 10
+
+    def get_logs(params):
+        p = params[0]
+        b0, b1 = int(p["fromBlock"], 16), int(p["toBlock"], 16)
+        wanted = {a.lower() for a in p["address"]}
+        return [{"address": log["address"], "topics": log["topics"], "data": "0x" + log["data"].hex(),
+                 "blockNumber": hex(log["blockNumber"]), "logIndex": hex(log["logIndex"]), "blockHash": "0x" + word(log["blockNumber"]).hex(),
+                 "transactionHash": "0x" + word(log["blockNumber"] * 10 + log["logIndex"]).hex(), "transactionIndex": "0x0", "removed": False}
+                for log in logs if b0 <= log["blockNumber"] <= b1 and log["address"] in wanted and log["topics"][0] in p["topics"][0]]
+
+    handlers = {"eth_getLogs": get_logs, "eth_blockNumber": lambda p: hex(head), "eth_chainId": lambda p: "0x38"}
+    with FakeNode(handlers) as node, tempfile.TemporaryDirectory() as d:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        factories = {v2: 50, v3: 50}
+
+        full = PoolIndex(os.path.join(d, "full.db"), factories=factories, step=100)
+        assert full.backfill(w3) == n_pairs and len(full) == n_pairs
+        assert full.progress() == {v2: (50, head - 2), v3: (50, head - 2)}
+        assert full.update(w3, head - 3) == 0  # already scanned
+
+        # Runner first (window started at block 300), history backfilled afterwards: same index
+        live = PoolIndex(os.path.join(d, "live.db"), factories=factories, step=100)
+        live.update(w3, 305, start=300)
+        live.update(w3, 310)
+        assert live.progress()[v2] == (300, 311)
+        live.backfill(w3, to_block=head - 3)
+        assert len(live) == n_pairs and live.progress() == full.progress()
+
+        token = tokens[5]
+        t = time.perf_counter()
+        pools = full.by_token(token)
+        secs = time.perf_counter() - t
+        expected = {parse_creation_log(dict(log, topics=[bytes.fromhex(x[2:]) for x in log["topics"]]))[0]
+                    for log in logs if token[2:] in "".join(log["topics"][1:3])}
+        assert {p["address"] for p in pools} == expected and secs < 0.05
+        v3_pool = next(p for p in pools if p["version"] == 3)
+        assert v3_pool["fee"] == 500 and v3_pool["tick_spacing"] == 10 and v3_pool["factory"] == v3
+        pair = full.by_pair(v3_pool["token1"], v3_pool["token0"])
+        assert v3_pool in pair and all({p["token0"], p["token1"]} == {v3_pool["token0"], v3_pool["token1"]} for p in pair)
+        assert full.watchlist(tokens=[token]) == [p["address"] for p in pools]
+        assert len(full.by_factory(v3)) == n_pairs // 5 and full.get(v3_pool["address"]) == v3_pool
+        from .pool_meta import PoolMetadata
+        pm = PoolMetadata(w3, path=None, index=full)
+        assert pm.get(v3_pool["address"])["fee"] == 500 and pm.rpc_rounds == 0  # read from the index
+        full.close()
+        live.close()
+    print(f"[pool_index] backfill, incremental updates and lookups OK ({len(pools)} pools of one token in {secs * 1000:.2f} ms)")
+
+if __name__ == "__main__":
+    _test_pool_index()
+
+# End of file
@@ -0,0 +1,216 @@
+"""
+Pool metadata (token0 / token1 / fee / factory) of V2 pairs and V3 pools.
+- resolve(): one Multicall3 aggregate3 round for the pools not seen before, whatever the number of swaps
+- Pool metadata is immutable: cached for good in memory and in SQLite; addresses found not to be pools
+  (or whose calls failed) are asked again after `negative_ttl` seconds
+- A pool answering fee() is a V3 pool, a V2 pair otherwise
+- With a pool_index.PoolIndex, indexed pools are read locally, only unknown addresses go to the Multicall
+- enrich(results): pool events carry ev["pool"] = {"version", "token0", "token1", "fee", "factory"},
+  and amounts normalized per side (exact Decimals) when a TokenMetadata is given
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+from web3 import Web3
+import sqlite3, threading, time
+
+from .decoders import fn_selector
+from .multicall import aggregate3, MULTICALL_CHUNK
+from .token_meta import scale
+
+TOKEN0, TOKEN1, FEE, FACTORY = fn_selector("token0()"), fn_selector("token1()"), fn_selector("fee()"), fn_selector("factory()")
+
+# event type -> {amount arg: side (0: token0, 1: token1)}
+POOL_EVENTS = {
+    "v2_swap": {"amount0In": 0, "amount1In": 1, "amount0Out": 0, "amount1Out": 1},
+    "v2_mint": {"amount0": 0, "amount1": 1},
+    "v2_burn": {"amount0": 0, "amount1": 1},
+    "v2_sync": {"reserve0": 0, "reserve1": 1},
+    "v3_swap": {"amount0": 0, "amount1": 1},
+    "v3_flash": {"amount0": 0, "amount1": 1, "paid0": 0, "paid1": 1},
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pool_meta (
+    address TEXT PRIMARY KEY, ok INTEGER NOT NULL, version INTEGER, token0 TEXT, token1 TEXT, fee INTEGER, factory TEXT,
+    checked_at REAL
+) WITHOUT ROWID;
+"""
+
+def _address(ret: bytes) -> Optional[str]:
+    return "0x" + ret[12:32].hex() if len(ret) >= 32 else None
+
+class PoolMetadata:
+    def __init__(self, w3: Web3, path: Optional[str]="pool_meta.db", chunk_size: int=MULTICALL_CHUNK, index: Any=None, negative_ttl: float=3600.0):
+        self.w3 = w3
+        self.index = index
+        self.chunk_size = int(chunk_size)
+        self.negative_ttl = float(negative_ttl)
+        self._cache: Dict[str, Optional[Dict[str, Any]]] = {}  # address -> meta, None: not a pool
+        self._checked: Dict[str, float] = {}  # address -> time of the answer, for the None entries
+        self._lock = threading.Lock()
+        self.rpc_rounds = 0  # aggregate3 rounds sent so far
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(_SCHEMA)
+            if "checked_at" not in {row[1] for row in self.conn.execute("PRAGMA table_info(pool_meta)")}:
+                self.conn.execute("ALTER TABLE pool_meta ADD COLUMN checked_at REAL")  # stores of older versions
+            # Immutable data: load everything once
+            for a, ok, version, t0, t1, fee, factory, t in self.conn.execute(
+                    "SELECT address, ok, version, token0, token1, fee, factory, checked_at FROM pool_meta"):
+                self._cache[a] = {"version": version, "token0": t0, "token1": t1, "fee": fee, "factory": factory} if ok else None
+                if not ok:
+                    self._checked[a] = t or 0.0
+
+    def _fetch(self, addrs: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        calls = [(a, sel) for a in addrs for sel in (TOKEN0, TOKEN1, FEE, FACTORY)]
+        results = aggregate3(self.w3, calls, chunk_size=self.chunk_size)
+        self.rpc_rounds += 1
+        out: Dict[str, Optional[Dict[str, Any]]] = {}
+        for i, a in enumerate(addrs):
+            (ok0, r0), (ok1, r1), (okf, rf), (okc, rc) = results[4 * i:4 * i + 4]
+            t0, t1 = _address(r0) if ok0 else None, _address(r1) if ok1 else None
+            if t0 is None or t1 is None:
+                out[a] = None
+                continue
+            fee = int.from_bytes(rf[:32], "big") if okf and len(rf) >= 32 else None
+            out[a] = {"version": 3 if fee is not None else 2, "token0": t0, "token1": t1,
+                      "fee": fee, "factory": _address(rc) if okc else None}
+        return out
+
+    def _known(self, addr: str, now: float) -> bool:
+        if addr not in self._cache:
+            return False
+        return self._cache[addr] is not None or now - self._checked.get(addr, 0.0) < self.negative_ttl
+
+    def resolve(self, pools: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """{pool address (lowercase): metadata or None when not a pool}, new pools in one Multicall round"""
+        addrs = list(dict.fromkeys(p.lower() for p in pools))
+        now = time.time()
+        with self._lock:
+            new = [a for a in addrs if not self._known(a, now)]
+        fetched: Dict[str, Optional[Dict[str, Any]]] = {}
+        if new and self.index is not None:
+            for a, row in self.index.get_many(new).items():
+                fetched[a] = {k: row[k] for k in ("version", "token0", "token1", "fee", "factory")}
+            new = [a for a in new if a not in fetched]
+        if new:
+            try:
+                fetched.update(self._fetch(new))
+            except Exception as e:
+                # Transient RPC failure: nothing cached, asked again next round
+                print(f"[pool_meta] multicall failed for {len(new)} pools: {e}")
+        if fetched:
+            with self._lock:
+                self._cache.update(fetched)
+                for a, m in fetched.items():
+                    if m is None:
+                        self._checked[a] = now
+                    else:
+                        self._checked.pop(a, None)
+                if self.conn is not None:
+                    with self.conn:
+                        self.conn.executemany(
+                            "INSERT OR REPLACE INTO pool_meta (address, ok, version, token0, token1, fee, factory, checked_at) VALUES (?,?,?,?,?,?,?,?)",
+                            [(a, 0, None, None, None, None, None, now) if m is None else
+                             (a, 1, m["version"], m["token0"], m["token1"], m["fee"], m["factory"], now) for a, m in fetched.items()])
+        return {a: self._cache.get(a) for a in addrs}
+
+    def get(self, pool: str) -> Optional[Dict[str, Any]]:
+        return self.resolve([pool])[pool.lower()]
+
+    def enrich_events(self, events: List[Dict[str, Any]], token_meta: Any=None) -> None:
+        """
+        Add ev["pool"] to V2 / V3 pool events in place; with a token_meta.TokenMetadata, also
+        ev["normalized"] = {"token0", "token1", "symbol0", "symbol1", <amount arg>: Decimal}.
+        Event dicts only (lazy EventRecord are read-only).
+        """
+        todo = [ev for ev in events if isinstance(ev, dict) and ev.get("type") in POOL_EVENTS]
+        pools = self.resolve(ev["contract"] for ev in todo)
+        tokens = {}
+        if token_meta is not None:
+            tokens = token_meta.get_many(t for m in pools.values() if m is not None for t in (m["token0"], m["token1"]))
+        for ev in todo:
+            meta = pools.get(ev["contract"].lower())
+            if meta is None:
+                continue
+            ev["pool"] = dict(meta)
+            t0, t1 = tokens.get(meta["token0"]), tokens.get(meta["token1"])
+            if t0 is None or t1 is None:
+                continue
+            sides = (t0, t1)
+            norm = {"token0": meta["token0"], "token1": meta["token1"], "symbol0": t0["symbol"], "symbol1": t1["symbol"]}
+            for arg, side in POOL_EVENTS[ev["type"]].items():
+                if ev["args"].get(arg) is not None:
+                    norm[arg] = scale(ev["args"][arg], sides[side]["decimals"])
+            ev["normalized"] = norm
+
+    def enrich(self, results: Iterable[Dict[str, Any]], token_meta: Any=None) -> None:
+        """enrich_events over `analyze_tx`-shaped results"""
+        self.enrich_events([ev for r in results for ev in r["events"]], token_meta=token_meta)
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+
+def _test_pool_meta() -> None:
+    """Offline check against a fake node answering aggregate3: one round per new pools, disk reload, enrichment"""
+    import os, tempfile
+    from decimal import Decimal
+    from eth_abi import decode, encode
+    from .fake_node import FakeNode
+    from .multicall import AGGREGATE3
+    from .token_meta import TokenMetadata, DECIMALS, SYMBOL, NAME
+
+    word = lambda a: bytes(12) + bytes.fromhex(a[2:])
+    v2, v3, eoa = "0x" + "a2" * 20, "0x" + "a3" * 20, "0x" + "ee" * 20
+    t0, t1, factory = "0x" + "01" * 20, "0x" + "02" * 20, "0x" + "fa" * 20
+    answers = {
+        v2: {TOKEN0: word(t0), TOKEN1: word(t1), FACTORY: word(factory)},
+        v3: {TOKEN0: word(t0), TOKEN1: word(t1), FACTORY: word(factory), FEE: (500).to_bytes(32, "big")},
+        t0: {DECIMALS: (18).to_bytes(32, "big"), SYMBOL: encode(["string"], ["WBNB"]), NAME: encode(["string"], ["Wrapped BNB"])},
+        t1: {DECIMALS: (6).to_bytes(32, "big"), SYMBOL: encode(["string"], ["USD"]), NAME: encode(["string"], ["Dollar"])},
+    }
+
+    def eth_call(params):
+        data = bytes.fromhex(params[0]["data"][2:])
+        assert data[:4] == AGGREGATE3
+        out = []
+        for target, _, calldata in decode(["(address,bool,bytes)[]"], data[4:])[0]:
+            ret = answers.get(target.lower(), {}).get(calldata[:4])
+            out.append((ret is not None, ret or b""))
+        return "0x" + encode(["(bool,bytes)[]"], [out]).hex()
+
+    swaps = [{"type": "v2_swap", "contract": v2, "args": {"amount0In": 10**18, "amount1In": 0, "amount0Out": 0, "amount1Out": 3 * 10**6}}
+             for _ in range(50)]
+    swaps.append({"type": "v3_swap", "contract": v3, "args": {"amount0": -10**17, "amount1": 5 * 10**5}})
+    swaps.append({"type": "v2_sync", "contract": eoa, "args": {"reserve0": 1, "reserve1": 1}})
+
+    with FakeNode({"eth_call": eth_call, "eth_chainId": lambda p: "0x38"}) as node, tempfile.TemporaryDirectory() as d:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        pm = PoolMetadata(w3, path=os.path.join(d, "pools.db"))
+        tm = TokenMetadata(w3, path=None)
+        pm.enrich([{"events": swaps}], token_meta=tm)
+        assert pm.rpc_rounds == 1 and tm.rpc_rounds == 1  # 51 swaps, 3 new addresses: one round each
+        assert swaps[0]["pool"]["version"] == 2 and swaps[0]["pool"]["token1"] == t1
+        assert swaps[0]["normalized"]["amount0In"] == Decimal(1) and swaps[0]["normalized"]["amount1Out"] == Decimal(3)
+        assert swaps[50]["pool"] == {"version": 3, "token0": t0, "token1": t1, "fee": 500, "factory": factory}
+        assert swaps[50]["normalized"]["amount0"] == Decimal("-0.1") and "pool" not in swaps[51]
+        pm.enrich([{"events": swaps}])
+        assert pm.rpc_rounds == 1
+        pm.close()
+
+        warm = PoolMetadata(w3, path=os.path.join(d, "pools.db"))
+        assert warm.resolve([v2, v3, eoa]) == {v2: swaps[0]["pool"], v3: swaps[50]["pool"], eoa: None} and warm.rpc_rounds == 0
+        answers[eoa] = answers[v2]  # its calls failed the first time (or the pool did not exist yet)
+        warm.negative_ttl = 0  # expired negative entry: asked again, pools stay cached
+        assert warm.resolve([v2, eoa])[eoa] == swaps[0]["pool"] and warm.rpc_rounds == 1
+        assert warm.resolve([eoa]) and warm.rpc_rounds == 1
+        warm.close()
+    print("[pool_meta] batched resolution, pool / negative cache and enrichment OK")
+
+if __name__ == "__main__":
+    _test_pool_meta()
+
+# End of file
@@ -0,0 +1,170 @@
+"""
+Compact decoded event records.
+- EventRecord keeps the raw log (address + topics + data in one bytes object) and its registry entry,
+  arguments are decoded by the registry handler on first access, then kept in the record
+- Read like the event dicts: record["args"], record.get("name"); as_dict() gives the exact dict schema
+- tx hash bytes are shared between the events of one transaction
+"""
+
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+EVENT_KEYS = ("type", "name", "contract", "args", "block_number", "tx_hash", "log_index")
+
+class EventRecord:
+    __slots__ = ("meta", "block_number", "log_index", "_tx_hash", "_raw", "_ntopics", "_decoded")
+
+    def __init__(self, meta: Mapping[str, Any], address: bytes, topics: bytes, data: bytes, block_number: int, tx_hash: bytes, log_index: int):
+        self.meta = meta                  # registry entry, shared
+        self.block_number = block_number
+        self.log_index = log_index
+        self._tx_hash = tx_hash           # 32 bytes, shared by the events of a tx
+        self._raw = address + topics + data  # 20 bytes address, 32 bytes per topic, data
+        self._ntopics = len(topics) // 32
+        self._decoded: Optional[Dict[str, Any]] = None  # handler output, on first access
+
+    @property
+    def contract(self) -> str:
+        return "0x" + self._raw[:20].hex()
+
+    @property
+    def tx_hash(self) -> str:
+        return "0x" + self._tx_hash.hex()
+
+    @property
+    def topics(self) -> list:
+        raw = self._raw
+        return ["0x" + raw[i:i + 32].hex() for i in range(20, 20 + 32 * self._ntopics, 32)]
+
+    @property
+    def data(self) -> bytes:
+        return self._raw[20 + 32 * self._ntopics:]
+
+    def _decode(self) -> Dict[str, Any]:
+        if self._decoded is None:
+            self._decoded = self.meta["handler"]({"address": self.contract}, self.topics, self.data)
+        return self._decoded
+
+    def decode(self) -> Dict[str, Any]:
+        """Registry handler output, run once: {"type", "name", "contract", "args"} (a copy)"""
+        return dict(self._decode())
+
+    @property
+    def args(self) -> Dict[str, Any]:
+        return self._decode()["args"]
+
+    @property
+    def type(self) -> str:
+        t = self.meta.get("type")
+        return t if t is not None else self._decode()["type"]
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.meta.get("name")
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Same dict as the eager decoding path"""
+        ev = self.decode()
+        ev.update({
+            "block_number": self.block_number,
+            "tx_hash": self.tx_hash,
+            "log_index": self.log_index,
+        })
+        return ev
+
+    # Read-only mapping access, for consumers of the event dicts (sinks, json export through as_dict)
+    def __getitem__(self, key: str) -> Any:
+        if key not in EVENT_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any=None) -> Any:
+        return getattr(self, key) if key in EVENT_KEYS else default
+
+    def keys(self) -> tuple:
+        return EVENT_KEYS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(EVENT_KEYS)
+
+    def __len__(self) -> int:
+        return len(EVENT_KEYS)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, EventRecord):
+            other = other.as_dict()
+        return isinstance(other, Mapping) and self.as_dict() == dict(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"EventRecord({self.name}, block={self.block_number}, tx={self.tx_hash}, log_index={self.log_index})"
+
+def _test_records(n: int=20000) -> Dict[str, float]:
+    """Lazy records against the event dicts on n synthetic UniV2 Swap logs (and malformed logs): same dicts, bytes held per event"""
+    import random, tracemalloc
+    from eth_abi import encode
+    from hexbytes import HexBytes
+    from .decoders import sig_topic
+    from .sink import event_row
+    from .tx_tracker import decode_logs
+
+    rnd = random.Random(5)
+    topic0 = HexBytes(sig_topic("Swap(address,uint256,uint256,uint256,uint256,address)"))
+    logs = [{
+        "address": "0x" + rnd.randbytes(20).hex(),
+        "topics": [topic0, HexBytes(bytes(12) + rnd.randbytes(20)), HexBytes(bytes(12) + rnd.randbytes(20))],
+        "data": HexBytes(b"".join(rnd.getrandbits(112).to_bytes(32, "big") for _ in range(4))),
+        "blockNumber": 1000 + i // 20, "logIndex": i % 4, "transactionHash": HexBytes((i // 4).to_bytes(32, "big")),
+        "blockHash": HexBytes(bytes(32)), "transactionIndex": i // 4 % 5,
+    } for i in range(n)]
+
+    sizes = {}
+    for lazy in (False, True):
+        tracemalloc.start()
+        results = decode_logs(logs, lazy=lazy)
+        sizes[lazy] = tracemalloc.get_traced_memory()[0] / n
+        tracemalloc.stop()
+        if lazy:
+            lazy_results = results
+        else:
+            eager_results = results
+
+    for eager, lazy in zip(eager_results, lazy_results):
+        for ev, rec in zip(eager["events"], lazy["events"]):
+            assert rec.as_dict() == ev and rec == ev and event_row(rec) == event_row(ev)
+
+    # The handler runs once per record, whatever the number of reads
+    first = lazy_results[0]["events"][0]
+    runs = []
+    counted = dict(first.meta, handler=lambda *a: runs.append(1) or first.meta["handler"](*a))
+    rec = EventRecord(counted, first._raw[:20], first._raw[20:20 + 32 * first._ntopics], first.data, first.block_number, first._tx_hash, first.log_index)
+    assert rec["args"] == rec.args == first.args and rec.as_dict() == first.as_dict() and len(runs) == 1
+
+    # Malformed logs: the same events / unknown rows (with parse_error) in both modes
+    from .registry_event import build_registry
+    from .tx_tracker import get_registry, set_registry
+    item = {"type": "event", "name": "Amounts", "inputs": [{"indexed": False, "name": "values", "type": "uint256[]"}]}
+    bad = [
+        dict(logs[0], topics=[topic0]),                               # Swap without its indexed args
+        dict(logs[1], data=logs[1]["data"][:64]),                     # Swap with 2 of its 4 data words
+        dict(logs[2], topics=[HexBytes(sig_topic("Amounts(uint256[])"))], data=HexBytes((1 << 70).to_bytes(32, "big"))),  # bad offset
+        dict(logs[3], topics=[HexBytes(sig_topic("Amounts(uint256[])"))], data=HexBytes(encode(["uint256[]"], [[7, 8]]))),
+    ]
+    previous = get_registry()
+    set_registry(build_registry(extra_abis={"demo": [item]}))
+    try:
+        eager, lazy = decode_logs(bad), decode_logs(bad, lazy=True)
+    finally:
+        set_registry(previous)
+    assert [[r.as_dict() for r in res["events"]] for res in lazy] == [res["events"] for res in eager]
+    assert [res["unknown_events_raw"] for res in lazy] == [res["unknown_events_raw"] for res in eager]
+    errors = [raw.get("parse_error") for res in eager for raw in res["unknown_events_raw"]]
+    assert len(errors) == 3 and all(errors) and sum(len(res["events"]) for res in eager) == 1
+    out = {"events": n, "dict_bytes_per_event": round(sizes[False]), "record_bytes_per_event": round(sizes[True])}
+    print(f"[records] {out}")
+    return out
+
+if __name__ == "__main__":
+    _test_records()
+
+# End of file
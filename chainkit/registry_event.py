@@ -3,18 +3,19 @@ Events registry and handler.
 - Builtin events: ERC20/271, PancakeSwap V2/V3 pools, WBNB
 - Tools to use
 - build_registry()
+- registry_from_abi() / load_extras(): decoders compiled from ABI event definitions
 """
 
 from typing import Dict, Any, List
 from hexbytes import HexBytes
 from eth_utils import keccak, to_hex
-import json, os
+import json, os, re
 from types import MappingProxyType
-from typing import Mapping, Optional
+from typing import Callable, Iterable, Mapping, Optional, Tuple
 
 from .decoders import sig_topic, uint256_at, int256_at, bool_at, to_hexstr, make_readonly
 
-# Handlers
+# Handlers: handler(log, topics_hex, data_bytes)
 def h_erc20_transfer(log, topics_hex: List[str], data_bytes: bytes) -> Dict[str, Any]:
     return {
         "type": "erc20_transfer",
@@ -23,12 +24,12 @@ def h_erc20_transfer(log, topics_hex: List[str], data_bytes: bytes) -> Dict[str,
         "args": {
             "from": "0x" + topics_hex[1][-40:],
             "to":   "0x" + topics_hex[2][-40:],
-            "value": int.from_bytes(data_bytes[-32:], "big"),
+            "value": uint256_at(data_bytes, 0),
         },
     }
 
 def h_erc20_approval(log, topics_hex: List[str], data_bytes: bytes) -> Dict[str, Any]:
-    value = int.from_bytes(data_bytes[-32:], "big")
+    value = uint256_at(data_bytes, 0)
     return {
         "type": "erc20_approval",
         "name": "ERC20.Approval",
@@ -171,60 +172,265 @@ def h_v3_flash(log, topics_hex: List[str], data_bytes: bytes) -> Dict[str, Any]:
 
 
 # builtin events registry
+# layout: (topics needed, data words read, fixed size); logs not fitting it are kept as unknown with a parse_error
 BUILTIN_EVENTS: Dict[str, Dict[str, Any]] = {
     # ERC20
     sig_topic("Transfer(address,address,uint256)"): {
-        "name": "ERC20.Transfer", "sig": "Transfer(address,address,uint256)",
-        "handler": h_erc20_transfer, "priority": 100,
+        "name": "ERC20.Transfer", "type": "erc20_transfer", "sig": "Transfer(address,address,uint256)",
+        "handler": h_erc20_transfer, "layout": (3, 1, True), "priority": 100,
     },
     sig_topic("Approval(address,address,uint256)"): {
-        "name": "ERC20.Approval", "sig": "Approval(address,address,uint256)",
-        "handler": h_erc20_approval, "priority": 95,
+        "name": "ERC20.Approval", "type": "erc20_approval", "sig": "Approval(address,address,uint256)",
+        "handler": h_erc20_approval, "layout": (3, 1, True), "priority": 95,
     },
     # ERC721/1155
     sig_topic("ApprovalForAll(address,address,bool)"): {
-        "name": "ERC721.ApprovalForAll", "sig": "ApprovalForAll(address,address,bool)",
-        "handler": h_erc721_approval_for_all, "priority": 94,
+        "name": "ERC721.ApprovalForAll", "type": "erc721_approval_for_all", "sig": "ApprovalForAll(address,address,bool)",
+        "handler": h_erc721_approval_for_all, "layout": (3, 1, True), "priority": 94,
     },
     # V2
     sig_topic("Swap(address,uint256,uint256,uint256,uint256,address)"): {
-        "name": "UniV2.Swap", "sig": "Swap(address,uint256,uint256,uint256,uint256,address)",
-        "handler": h_v2_swap, "priority": 90,
+        "name": "UniV2.Swap", "type": "v2_swap", "sig": "Swap(address,uint256,uint256,uint256,uint256,address)",
+        "handler": h_v2_swap, "layout": (3, 4, True), "priority": 90,
     },
     sig_topic("Mint(address,uint256,uint256)"): {
-        "name": "UniV2.Mint", "sig": "Mint(address,uint256,uint256)",
-        "handler": h_v2_mint, "priority": 70,
+        "name": "UniV2.Mint", "type": "v2_mint", "sig": "Mint(address,uint256,uint256)",
+        "handler": h_v2_mint, "layout": (2, 2, True), "priority": 70,
     },
     sig_topic("Burn(address,uint256,uint256,address)"): {
-        "name": "UniV2.Burn", "sig": "Burn(address,uint256,uint256,address)",
-        "handler": h_v2_burn, "priority": 70,
+        "name": "UniV2.Burn", "type": "v2_burn", "sig": "Burn(address,uint256,uint256,address)",
+        "handler": h_v2_burn, "layout": (2, 2, True), "priority": 70,
     },
     sig_topic("Sync(uint112,uint112)"): {
-        "name": "UniV2.Sync", "sig": "Sync(uint112,uint112)",
-        "handler": h_v2_sync, "priority": 60,
+        "name": "UniV2.Sync", "type": "v2_sync", "sig": "Sync(uint112,uint112)",
+        "handler": h_v2_sync, "layout": (1, 2, True), "priority": 60,
     },
     # WBNB / WETH
     sig_topic("Deposit(address,uint256)"): {
-        "name": "WBNB.Deposit", "sig": "Deposit(address,uint256)",
-        "handler": h_wrap_deposit, "priority": 80,
+        "name": "WBNB.Deposit", "type": "wrap_deposit", "sig": "Deposit(address,uint256)",
+        "handler": h_wrap_deposit, "layout": (2, 1, True), "priority": 80,
     },
     sig_topic("Withdrawal(address,uint256)"): {
-        "name": "WBNB.Withdrawal", "sig": "Withdrawal(address,uint256)",
-        "handler": h_wrap_withdrawal, "priority": 80,
+        "name": "WBNB.Withdrawal", "type": "wrap_withdrawal", "sig": "Withdrawal(address,uint256)",
+        "handler": h_wrap_withdrawal, "layout": (2, 1, True), "priority": 80,
     },
     # V3
     sig_topic("Swap(address,address,int256,int256,uint160,uint128,int24)"): {
-        "name": "UniV3.Swap", "sig": "Swap(address,address,int256,int256,uint160,uint128,int24)",
-        "handler": h_v3_swap, "priority": 88,
+        "name": "UniV3.Swap", "type": "v3_swap", "sig": "Swap(address,address,int256,int256,uint160,uint128,int24)",
+        "handler": h_v3_swap, "layout": (3, 5, True), "priority": 88,
     },
     sig_topic("Flash(address,address,uint256,uint256,uint256,uint256)"): {
-        "name": "UniV3.Flash", "sig": "Flash(address,address,uint256,uint256,uint256,uint256)",
-        "handler": h_v3_flash, "priority": 85,
+        "name": "UniV3.Flash", "type": "v3_flash", "sig": "Flash(address,address,uint256,uint256,uint256,uint256)",
+        "handler": h_v3_flash, "layout": (3, 4, True), "priority": 85,
     },
 }
 
-def build_registry(extra_paths: List[str] = None) -> Mapping[str, Mapping[str, Any]]:
+# --- ABI compiled decoders ---
+# Field extractors kinds, resolved once per event definition
+K_TOPIC_ADDR, K_TOPIC_UINT, K_TOPIC_INT, K_TOPIC_BOOL, K_TOPIC_HEX = range(5)
+K_ADDR, K_UINT, K_INT, K_BOOL, K_BYTESN, K_BYTES, K_STRING = range(5, 12)
+K_GENERIC = 12  # decoded by eth_abi, offset is the position among the data types
+
+def _abi_type(arg: Mapping[str, Any]) -> str:
+    """Canonical type of an ABI input: tuples spelled out from their components, e.g. (uint256,address)[2]"""
+    t = arg["type"]
+    if t.startswith("tuple"):
+        return f"({','.join(_abi_type(c) for c in arg.get('components', []))})" + t[len("tuple"):]
+    return t
+
+def _event_sig(item: Mapping[str, Any]) -> str:
+    return f"{item['name']}({','.join(_abi_type(arg) for arg in item.get('inputs', []))})"
+
+def _static_words(node: Any) -> int:
+    if node.is_dynamic:
+        return 1  # head holds the offset of the tail
+    if node.is_array:
+        return node.arrlist[-1][0] * _static_words(node.item_type)
+    if getattr(node, "components", None) is not None:
+        return sum(_static_words(c) for c in node.components)
+    return 1
+
+def head_words(abi_type: str) -> int:
+    """32-byte words an argument takes in the head of the ABI encoding (static arrays / tuples take several)"""
+    if "[" not in abi_type and not abi_type.startswith("("):
+        return 1
+    from eth_abi.grammar import parse
+    return _static_words(parse(abi_type))
+
+def _field_kind(abi_type: str, indexed: bool) -> Optional[int]:
+    """Extractor kind of an ABI type, None for types needing the generic ABI decoder (arrays, tuples)"""
+    if indexed:
+        if "[" in abi_type or abi_type.startswith("("):
+            return K_TOPIC_HEX  # keccak of the encoded array / tuple
+        if abi_type == "address":
+            return K_TOPIC_ADDR
+        if abi_type == "bool":
+            return K_TOPIC_BOOL
+        if abi_type.startswith("uint"):
+            return K_TOPIC_UINT
+        if abi_type.startswith("int"):
+            return K_TOPIC_INT
+        return K_TOPIC_HEX  # bytesN, or keccak of a dynamic value
+    if "[" in abi_type or abi_type.startswith("("):
+        return None
+    if abi_type == "address":
+        return K_ADDR
+    if abi_type == "bool":
+        return K_BOOL
+    if abi_type.startswith("uint"):
+        return K_UINT
+    if abi_type.startswith("int"):
+        return K_INT
+    if abi_type == "bytes":
+        return K_BYTES
+    if abi_type == "string":
+        return K_STRING
+    if abi_type.startswith("bytes"):
+        return K_BYTESN
+    return None
+
+def _json_value(node: Any, value: Any) -> Any:
+    """eth_abi output to the shape of the builtin handlers: lists, '0x' hex bytes, lowercase addresses"""
+    if node.is_array:
+        return [_json_value(node.item_type, v) for v in value]
+    if getattr(node, "components", None) is not None:
+        return [_json_value(c, v) for c, v in zip(node.components, value)]
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    if node.base == "address":
+        return value.lower()
+    return value
+
+def event_type_name(name: str) -> str:
+    """Event type from a registry name, e.g. UniV3.Swap -> uni_v3_swap"""
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name.replace(".", "_")).lower().replace("__", "_")
+
+def compile_fields(item: Mapping[str, Any]) -> Tuple[Tuple[Tuple[str, int, int], ...], List[Tuple[int, str]], List[str]]:
+    """
+    Field plan of an ABI event, in argument order: ((arg, kind, offset), ...), args left to the generic decoder
+    [(data position, arg)] (also in the plan as K_GENERIC), and the ABI types of the data part.
+    Head offsets advance by the static size of each type (a uint256[2] takes 2 words).
+    """
+    fields: List[Tuple[str, int, int]] = []
+    generic: List[Tuple[int, str]] = []
+    data_types: List[str] = []
+    topic_i, word_i = 1, 0
+    for pos, arg in enumerate(item.get("inputs", [])):
+        arg_name = arg.get("name") or f"arg{pos}"
+        abi_type = _abi_type(arg)
+        if arg.get("indexed"):
+            fields.append((arg_name, _field_kind(abi_type, True), topic_i))
+            topic_i += 1
+            continue
+        data_types.append(abi_type)
+        kind = _field_kind(abi_type, False)
+        if kind is None:
+            generic.append((len(data_types) - 1, arg_name))
+            fields.append((arg_name, K_GENERIC, len(data_types) - 1))
+        else:
+            fields.append((arg_name, kind, 32 * word_i))
+        word_i += head_words(abi_type)
+    return tuple(fields), generic, data_types
+
+def event_layout(item: Mapping[str, Any]) -> Tuple[int, int, bool]:
+    """(topics count, data head words, fixed) of an ABI event; not fixed: dynamic or generic args, checked by decoding"""
+    fields, generic, data_types = compile_fields(item)
+    topics = 1 + sum(1 for arg in item.get("inputs", []) if arg.get("indexed"))
+    fixed = not generic and not any(t in ("bytes", "string") for t in data_types)
+    return topics, sum(head_words(t) for t in data_types), fixed
+
+def check_layout(meta: Mapping[str, Any], ntopics: int, data_len: int) -> Optional[str]:
+    """Why a log does not fit the layout of its registry entry (None: it fits, or the entry has no layout)"""
+    layout = meta.get("layout")
+    if layout is None:
+        return None
+    if ntopics < layout[0]:
+        return f"expected {layout[0]} topics, got {ntopics}"
+    if data_len < 32 * layout[1]:
+        return f"expected at least {32 * layout[1]} data bytes, got {data_len}"
+    return None
+
+def compile_event(item: Mapping[str, Any], name: Optional[str]=None, type_name: Optional[str]=None) -> Callable[..., Dict[str, Any]]:
+    """
+    Compile an ABI event definition into a handler with the same signature and output as the builtin ones.
+    Signature parsing happens here only: the handler walks a fixed list of (arg, kind, offset) extractors,
+    offset being the topic index for indexed args and the byte offset of the 32-bytes head word otherwise.
+    """
+    ev_name = name or item["name"]
+    ev_type = type_name or event_type_name(ev_name)
+    extractors, generic, data_types = compile_fields(item)
+    if generic:
+        from eth_abi import decode as abi_decode
+        from eth_abi.grammar import parse
+        nodes = {pos: parse(data_types[pos]) for pos, _ in generic}
+    # bytesN width per argument
+    widths = {(arg.get("name") or f"arg{pos}"): int(arg["type"][5:])
+              for pos, arg in enumerate(item.get("inputs", [])) if re.fullmatch(r"bytes\d+", arg["type"])}
+
+    def handler(log, topics_hex: List[str], data_bytes: bytes) -> Dict[str, Any]:
+        args: Dict[str, Any] = {}
+        values = abi_decode(data_types, bytes(data_bytes)) if generic else None
+        for arg_name, kind, off in extractors:
+            if kind == K_TOPIC_ADDR:
+                args[arg_name] = "0x" + topics_hex[off][-40:]
+            elif kind == K_UINT:
+                args[arg_name] = int.from_bytes(data_bytes[off:off + 32], "big")
+            elif kind == K_INT:
+                args[arg_name] = int.from_bytes(data_bytes[off:off + 32], "big", signed=True)
+            elif kind == K_ADDR:
+                args[arg_name] = "0x" + data_bytes[off + 12:off + 32].hex()
+            elif kind == K_BOOL:
+                args[arg_name] = any(data_bytes[off:off + 32])
+            elif kind == K_TOPIC_UINT:
+                args[arg_name] = int(topics_hex[off], 16)
+            elif kind == K_TOPIC_INT:
+                v = int(topics_hex[off], 16)
+                args[arg_name] = v - (1 << 256) if v >> 255 else v
+            elif kind == K_TOPIC_BOOL:
+                args[arg_name] = int(topics_hex[off], 16) != 0
+            elif kind == K_TOPIC_HEX:
+                args[arg_name] = topics_hex[off]
+            elif kind == K_BYTESN:
+                args[arg_name] = "0x" + data_bytes[off:off + widths[arg_name]].hex()
+            elif kind == K_GENERIC:
+                args[arg_name] = _json_value(nodes[off], values[off])
+            else:  # K_BYTES / K_STRING: head word is the offset of (length, payload)
+                start = int.from_bytes(data_bytes[off:off + 32], "big")
+                length = int.from_bytes(data_bytes[start:start + 32], "big")
+                raw = data_bytes[start + 32:start + 32 + length]
+                args[arg_name] = bytes(raw).decode("utf-8", "replace") if kind == K_STRING else "0x" + raw.hex()
+        return {
+            "type": ev_type,
+            "name": ev_name,
+            "contract": log["address"].lower(),
+            "args": args,
+        }
+    handler.__name__ = f"h_{ev_type}"
+    return handler
+
+def registry_from_abi(abi: Iterable[Mapping[str, Any]], prefix: Optional[str]=None, priority: int=50) -> Dict[str, Dict[str, Any]]:
+    """Registry entries {topic0: meta} with compiled handlers for every non-anonymous event of an ABI"""
+    out: Dict[str, Dict[str, Any]] = {}
+    for item in abi:
+        if (item or {}).get("type") != "event" or item.get("anonymous"):
+            continue
+        sig = _event_sig(item)
+        name = f"{prefix}.{item['name']}" if prefix else item["name"]
+        out[sig_topic(sig)] = {
+            "name": name, "type": event_type_name(name), "sig": sig,
+            "handler": compile_event(item, name=name), "layout": event_layout(item), "priority": priority, "abi": item,
+        }
+    return out
+
+def build_registry(extra_paths: List[str] = None, extra_abis: Optional[Mapping[str, Iterable[Mapping[str, Any]]]] = None) -> Mapping[str, Mapping[str, Any]]:
+    """
+    Builtin handlers, plus compiled decoders from ABI JSON files (`extra_paths`, see load_extras)
+    and from in-memory ABIs (`extra_abis`: {prefix: abi}). Extra entries override builtin ones of the same topic0.
+    """
     merged = dict(BUILTIN_EVENTS)
+    if extra_abis:
+        for prefix, abi in extra_abis.items():
+            merged.update(registry_from_abi(abi, prefix=prefix))
     if extra_paths:
         merged.update(load_extras(extra_paths))
     return make_readonly(merged)
@@ -244,22 +450,49 @@ def topic0_allowlist_minimal_v2() -> list[str]:
     return list({t.lower() for t in topics})
 
 def load_extras(paths: List[str]) -> Dict[str, Dict[str, Any]]:
-    raise NotImplementedError("Fonctionality of load_extras should still be tested.")
+    """
+    Compile registry entries from ABI JSON files. Each file holds either
+    - an ABI list (events are picked, prefix = file name), or
+    - {"prefix": "PancakeV3", "priority": 50, "abi": [...]}
+    """
     merged = {}
     for p in paths:
-        if not p or not os.path.exists(p): 
+        if not p or not os.path.exists(p):
             continue
         with open(p, "r", encoding="utf-8") as f:
             data = json.load(f)
-        for e in data:
-            topic0 = e.get("topic0") or sig_topic(e["sig"])
-            merged[topic0.lower()] = {
-                "name": e.get("name"), "sig": e["sig"],
-                "handler": e["handler"], "priority": e.get("priority", 50),
-                **{k:v for k,v in e.items() if k not in {"name","sig","handler","priority","topic0"}}
-            }
+        if isinstance(data, list):
+            data = {"abi": data}
+        prefix = data.get("prefix") or os.path.splitext(os.path.basename(p))[0]
+        merged.update(registry_from_abi(data["abi"], prefix=prefix, priority=data.get("priority", 50)))
     return merged
 
+def raw_topic_registry(registry: Mapping[str, Mapping[str, Any]]) -> Dict[bytes, Mapping[str, Any]]:
+    """Same entries keyed by the raw 32-byte topic0, looked up straight with the log topics (HexBytes hash as bytes)"""
+    return {bytes.fromhex(topic0[2:]): meta for topic0, meta in registry.items()}
+
+class HexTopics:
+    """
+    Read-only `topics_hex` for the handlers over raw log topics:
+    a topic becomes a lowercase '0x' string only when a handler reads it (topic0 never is)
+    """
+    __slots__ = ("_topics",)
+
+    def __init__(self, topics: List[Any]):
+        self._topics = topics
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self._topics)))]
+        t = self._topics[i]
+        return "0x" + bytes.hex(t) if isinstance(t, bytes) else to_hexstr(t).lower()
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self._topics)))
+
 def make_unknown_raw(tx: Dict[str, Any], receipt: Dict[str, Any], log: Dict[str, Any]) -> Dict[str, Any]:
     """Make unknown (un registered) events dictionary, in order to store to row database and consider to add or not in the registery.
     """
@@ -280,4 +513,60 @@ def make_unknown_raw(tx: Dict[str, Any], receipt: Dict[str, Any], log: Dict[str,
         "removed": bool(log.get("removed", False)),
     }
 
+def _test_compiled_decoders() -> None:
+    import tempfile
+    from . import min_abi
+    log = {"address": "0xAbCd000000000000000000000000000000000001"}
+    topic0 = sig_topic("Swap(address,address,int256,int256,uint160,uint128,int24)")
+    topics = [topic0, "0x" + "0" * 24 + "11" * 20, "0x" + "0" * 24 + "22" * 20]
+    data = b"".join(v.to_bytes(32, "big", signed=True) for v in (-5, 7, 2**150, 10**20, -200))
+    compiled = registry_from_abi(min_abi.UNIV3_POOL_MIN_ABI, prefix="UniV3")[topic0]["handler"]
+    assert compiled(log, topics, data)["args"] == h_v3_swap(log, topics, data)["args"]
+
+    # Dynamic args through an ABI file
+    item = {"type": "event", "name": "Named", "inputs": [
+        {"indexed": True, "name": "who", "type": "address"},
+        {"indexed": False, "name": "label", "type": "string"},
+        {"indexed": False, "name": "ok", "type": "bool"}]}
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "demo.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([item], f)
+        reg = build_registry([path])
+    meta = reg[sig_topic("Named(address,string,bool)")]
+    data = (64).to_bytes(32, "big") + (1).to_bytes(32, "big") + (5).to_bytes(32, "big") + b"hello".ljust(32, b"\0")
+    out = meta["handler"](log, [None, topics[1]], data)
+    assert meta["name"] == "demo.Named" and out["type"] == "demo_named"
+    assert out["args"] == {"who": "0x" + "11" * 20, "label": "hello", "ok": True}
+
+    # Multi-word static args: later fields shifted by the array / tuple size, argument order kept
+    item = {"type": "event", "name": "Wide", "inputs": [
+        {"indexed": False, "name": "a", "type": "uint256[2]"},
+        {"indexed": False, "name": "p", "type": "tuple", "components": [{"name": "x", "type": "uint256"}, {"name": "y", "type": "address"}]},
+        {"indexed": False, "name": "b", "type": "uint256"}]}
+    meta = registry_from_abi([item])[sig_topic("Wide(uint256[2],(uint256,address),uint256)")]
+    data = b"".join(v.to_bytes(32, "big") for v in (1, 2, 3, 0x33, 4))
+    out = meta["handler"](log, [None], data)
+    assert list(out["args"]) == ["a", "p", "b"]
+    assert out["args"] == {"a": [1, 2], "p": [3, "0x" + "00" * 19 + "33"], "b": 4}, out["args"]
+
+    # Indexed arrays are topic hashes, bytesN cut to N, generic values JSON-safe (bytes inside tuples / arrays)
+    item = {"type": "event", "name": "Mixed", "inputs": [
+        {"indexed": True, "name": "ids", "type": "uint256[]"},
+        {"indexed": False, "name": "sel", "type": "bytes4"},
+        {"indexed": False, "name": "q", "type": "tuple", "components": [{"name": "d", "type": "bytes"}, {"name": "who", "type": "address"}]},
+        {"indexed": False, "name": "tags", "type": "bytes2[]"}]}
+    meta = registry_from_abi([item])[sig_topic("Mixed(uint256[],bytes4,(bytes,address),bytes2[])")]
+    from eth_abi import encode
+    who = "0x" + "ab" * 20
+    data = encode(["bytes4", "(bytes,address)", "bytes2[]"], [b"\x12\x34\x56\x78", (b"\xca\xfe", who), [b"\x01\x02", b"\x03\x04"]])
+    out = meta["handler"](log, [None, "0x" + "ee" * 32], data)
+    assert out["args"] == {"ids": "0x" + "ee" * 32, "sel": "0x12345678", "q": ["0xcafe", who], "tags": ["0x0102", "0x0304"]}, out["args"]
+    json.dumps(out["args"])
+    assert head_words("uint256[2]") == 2 and head_words("(uint256,bytes)") == 1 and head_words("uint8[2][3]") == 6
+    print("[registry] compiled decoders OK")
+
+if __name__ == "__main__":
+    _test_compiled_decoders()
+
 # End of file
@@ -0,0 +1,312 @@
+"""
+Persistent cache of immutable JSON-RPC answers: `Web3(CachedProvider(HTTPProvider(url)))` (or around an RPCPool).
+- Content addressed: key = sha256(method, canonical params), the answer is stored zlib compressed in SQLite
+- Only finalized data is stored: transactions / receipts / blocks / logs / state reads whose block is at or below
+  the finalized head (`finalized` block tag, or head - `confirmations` on nodes without it); chainId always
+- Hits never touch the network: re-analyzing a recorded incident runs fully offline
+- Size capped (`max_bytes`), least recently used entries evicted first; small in-memory LRU in front of the disk
+- Errors, null answers (unknown / pending tx) and anything above the finalized head go straight to the inner provider
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from web3.providers.base import JSONBaseProvider
+from web3._utils.encoding import Web3JsonEncoder
+import hashlib, json, sqlite3, threading, time, zlib
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rpc_cache (
+    key BLOB PRIMARY KEY, method TEXT NOT NULL, block INTEGER NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL, body BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rpc_cache_used ON rpc_cache(used);
+"""
+
+# Methods answered from a block given in the last param (a block number, not a tag)
+STATE_AT_BLOCK = frozenset({"eth_call", "eth_getCode", "eth_getBalance", "eth_getStorageAt", "eth_getTransactionCount"})
+
+def _canonical(value: Any) -> Any:
+    """Hex strings lowercased (checksummed vs lowercase addresses hit the same entry)"""
+    if isinstance(value, str):
+        return value.lower() if value[:2] in ("0x", "0X") else value
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+def cache_key(method: str, params: Any) -> bytes:
+    body = json.dumps(_canonical(params or []), cls=Web3JsonEncoder, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(method.encode() + b"\0" + body.encode()).digest()
+
+def _block_number(value: Any) -> Optional[int]:
+    """Block number of a hex / int param, None for tags (latest, pending, ...)"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value[:2] in ("0x", "0X"):
+        return int(value, 16)
+    return None
+
+def block_of(method: str, params: Any, result: Any) -> Optional[int]:
+    """
+    Newest block an answer depends on (-1: chain constant), None when the answer may still change.
+    """
+    params = params or []
+    if result is None:
+        return None
+    if method == "eth_chainId":
+        return -1
+    if method == "eth_getLogs":
+        f = params[0] if params else {}
+        if "blockHash" in f:
+            return max((_block_number(log.get("blockNumber")) or 0 for log in result), default=None)
+        b0, b1 = _block_number(f.get("fromBlock")), _block_number(f.get("toBlock"))
+        return b1 if b0 is not None and b1 is not None else None
+    if method in ("eth_getBlockByNumber", "eth_getBlockByHash"):
+        return _block_number(result.get("number")) if isinstance(result, dict) else None
+    if method == "eth_getBlockReceipts":
+        b = _block_number(params[0]) if params else None
+        if b is None and result:
+            b = _block_number(result[0].get("blockNumber"))
+        return b
+    if method in STATE_AT_BLOCK:
+        return _block_number(params[-1]) if len(params) > 1 else None
+    if isinstance(result, dict) and "blockNumber" in result:  # transactions, receipts
+        return _block_number(result["blockNumber"])
+    return None
+
+class CachedProvider(JSONBaseProvider):
+    """
+    - provider: inner provider doing the network calls (HTTPProvider, RPCPool, ...)
+    - path: SQLite file of the cache (None: memory only, for tests)
+    - max_bytes: cap of the stored (compressed) answers, LRU eviction down to 90% of it
+    - confirmations: depth counted as final when the node has no `finalized` tag
+    - head_ttl: seconds the finalized head is trusted before it is asked again (only on misses)
+    """
+    def __init__(self, provider: JSONBaseProvider, path: Optional[str]="rpc_cache.db", max_bytes: int=1 << 30,
+                 capacity: int=10000, confirmations: int=15, head_ttl: float=30.0, commit_every: int=200, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.provider = provider
+        self.endpoint_uri = getattr(provider, "endpoint_uri", type(provider).__name__)  # same provider_key as the inner one
+        self.max_bytes = int(max_bytes)
+        self.capacity = int(capacity)
+        self.confirmations = int(confirmations)
+        self.head_ttl = float(head_ttl)
+        self.commit_every = max(1, int(commit_every))
+        self.finalized = -1
+        self._head_checked = 0.0
+        self.hits = self.misses = self.stored = self.evicted = 0
+        self._lru: "OrderedDict[bytes, Any]" = OrderedDict()
+        self._touched: Dict[bytes, float] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM rpc_cache").fetchone()[0]
+
+    # ---- storage ----
+
+    def _remember(self, key: bytes, result: Any) -> None:
+        self._lru[key] = result
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, key: bytes) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self._touched[key] = time.time()
+                return True, self._lru[key]
+            row = self.conn.execute("SELECT body FROM rpc_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            result = json.loads(zlib.decompress(row[0]))
+            self._remember(key, result)
+            self._touched[key] = time.time()
+            return True, result
+
+    def _store(self, key: bytes, method: str, block: int, result: Any) -> None:
+        body = zlib.compress(json.dumps(result, cls=Web3JsonEncoder, separators=(",", ":")).encode(), 6)
+        with self._lock:
+            old = self.conn.execute("SELECT size FROM rpc_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO rpc_cache VALUES (?, ?, ?, ?, ?, ?)",
+                              (key, method, block, len(body), time.time(), body))
+            self.size += len(body) - (old[0] if old else 0)
+            self.stored += 1
+            self._remember(key, result)
+            self._pending += 1
+            if self.size > self.max_bytes:
+                self._evict()
+            if self._pending >= self.commit_every:
+                self._commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries down to 90% of max_bytes (lock held)"""
+        self._flush_touched()
+        target = int(self.max_bytes * 0.9)
+        rows = self.conn.execute("SELECT key, size FROM rpc_cache ORDER BY used")
+        drop: List[bytes] = []
+        for key, size in rows:
+            if self.size <= target:
+                break
+            drop.append(key)
+            self.size -= size
+        self.conn.executemany("DELETE FROM rpc_cache WHERE key = ?", [(k,) for k in drop])
+        for k in drop:
+            self._lru.pop(k, None)
+        self.evicted += len(drop)
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self.conn.executemany("UPDATE rpc_cache SET used = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def _commit(self) -> None:
+        self._flush_touched()
+        self.conn.commit()
+        self._pending = 0
+
+    # ---- finality ----
+
+    def _is_final(self, block: int) -> bool:
+        if block <= self.finalized:
+            return True
+        now = time.monotonic()
+        if now - self._head_checked < self.head_ttl:
+            return False
+        self._head_checked = now
+        resp = self.provider.make_request("eth_getBlockByNumber", ["finalized", False])
+        result = resp.get("result") if isinstance(resp, dict) else None
+        if result:
+            self.finalized = int(result["number"], 16)
+        else:
+            resp = self.provider.make_request("eth_blockNumber", [])
+            if isinstance(resp, dict) and resp.get("result"):
+                self.finalized = int(resp["result"], 16) - self.confirmations
+        return block <= self.finalized
+
+    def _maybe_store(self, key: bytes, method: str, params: Any, response: Any) -> None:
+        if not isinstance(response, dict) or "error" in response or "result" not in response:
+            return
+        block = block_of(method, params, response["result"])
+        if block is not None and self._is_final(block):
+            self._store(key, method, block, response["result"])
+
+    # ---- provider API ----
+
+    def make_request(self, method, params) -> Any:
+        key = cache_key(method, params)
+        hit, result = self._lookup(key)
+        if hit:
+            self.hits += 1
+            return {"jsonrpc": "2.0", "id": next(self.request_counter), "result": result}
+        self.misses += 1
+        response = self.provider.make_request(method, params)
+        self._maybe_store(key, method, params, response)
+        return response
+
+    def make_batch_request(self, requests) -> Any:
+        """Hits answered locally, the misses sent as one (smaller) batch to the inner provider"""
+        out: List[Any] = [None] * len(requests)
+        keys = [cache_key(m, p) for m, p in requests]
+        misses: List[int] = []
+        for i, key in enumerate(keys):
+            hit, result = self._lookup(key)
+            if hit:
+                out[i] = {"jsonrpc": "2.0", "id": next(self.request_counter), "result": result}
+            else:
+                misses.append(i)
+        self.hits += len(requests) - len(misses)
+        self.misses += len(misses)
+        if misses:
+            responses = self.provider.make_batch_request([requests[i] for i in misses])
+            if not isinstance(responses, list):
+                return responses  # batch level error, handled by the caller as without the cache
+            for i, response in zip(misses, responses):
+                out[i] = response
+                self._maybe_store(keys[i], requests[i][0], requests[i][1], response)
+        return out
+
+    def is_connected(self, show_traceback: bool=False) -> bool:
+        return self.provider.is_connected(show_traceback)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM rpc_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "stored": self.stored, "evicted": self.evicted,
+                "entries": entries, "bytes": self.size, "finalized": self.finalized}
+
+    def flush(self) -> None:
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+def _test_rpc_cache() -> None:
+    """Offline check: re-analyzing final txs makes no network call, recent blocks are not cached, LRU size cap"""
+    import os, tempfile
+    from web3 import Web3
+    from .fake_node import FakeNode
+    from .decoders import sig_topic
+    from .tx_tracker import analyze_tx, analyze_many
+
+    transfer = sig_topic("Transfer(address,address,uint256)")
+    word = lambda x: "0x" + x.to_bytes(32, "big").hex()
+    head = {"n": 200}
+    def tx_of(i: int) -> dict:
+        return {"hash": word(i), "from": "0x" + f"{i:040x}", "to": "0x" + "22" * 20, "blockNumber": hex(100 + i),
+                "blockHash": word(7), "transactionIndex": "0x0", "nonce": "0x0", "value": "0x0", "gas": "0x5208",
+                "gasPrice": "0x1", "input": "0x", "type": "0x0", "v": "0x1b", "r": word(1), "s": word(1)}
+    def receipt_of(i: int) -> dict:
+        log = {"address": "0x" + "ab" * 20, "topics": [transfer, word(i), word(2)], "data": word(i * 10), "logIndex": "0x0",
+               "blockNumber": hex(100 + i), "blockHash": word(7), "transactionHash": word(i), "transactionIndex": "0x0", "removed": False}
+        return {"transactionHash": word(i), "blockNumber": hex(100 + i), "blockHash": word(7), "transactionIndex": "0x0",
+                "from": "0x" + f"{i:040x}", "to": "0x" + "22" * 20, "gasUsed": hex(21000 + i), "cumulativeGasUsed": "0x0",
+                "status": "0x1", "logs": [log], "logsBloom": "0x" + "00" * 256, "type": "0x0",
+                "effectiveGasPrice": "0x1", "contractAddress": None}
+    handlers = {
+        "eth_chainId": lambda p: "0x38",
+        "eth_getBlockByNumber": lambda p: {"number": hex(head["n"] - 2), "hash": word(3)} if p[0] == "finalized" else None,
+        "eth_getTransactionByHash": lambda p: tx_of(int(p[0], 16)),
+        "eth_getTransactionReceipt": lambda p: receipt_of(int(p[0], 16)),
+    }
+    final = [word(i) for i in range(1, 51)]       # blocks 101..150, below the finalized head (198)
+    recent = [word(i) for i in range(150, 153)]   # blocks 250..252, above it
+
+    with FakeNode(handlers) as node, tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "rpc.db")
+        cache = CachedProvider(Web3.HTTPProvider(node.url), path=path)
+        w3 = Web3(cache)
+        expected = [analyze_tx(w3, h) for h in final] + analyze_many(w3, recent)
+        cache.close()
+
+        cache = CachedProvider(Web3.HTTPProvider(node.url), path=path)  # new process, warm disk
+        w3 = Web3(cache)
+        node.http_requests = 0
+        t0 = time.perf_counter()
+        got = [analyze_tx(w3, h) for h in final]
+        secs = time.perf_counter() - t0
+        assert got == expected[:len(final)] and node.http_requests == 0, node.http_requests
+        assert analyze_many(w3, final + recent) == expected
+        st = cache.stats()
+        assert st["misses"] == 2 * len(recent) and st["entries"] == 2 * len(final)  # only the recent txs asked, never stored
+        cache.close()
+
+        small = CachedProvider(Web3.HTTPProvider(node.url), path=None, max_bytes=4000, capacity=4)
+        w3 = Web3(small)
+        for h in final:
+            analyze_tx(w3, h)
+        st = small.stats()
+        assert st["bytes"] <= 4000 and st["evicted"] > 0
+        node.http_requests = 0
+        analyze_tx(w3, final[-1])  # most recently used: still there
+        assert node.http_requests == 0
+    print(f"[rpc_cache] offline re-analysis of {len(final)} txs in {secs * 1000:.1f} ms, finality and LRU cap OK")
+
+if __name__ == "__main__":
+    _test_rpc_cache()
+
+# End of file
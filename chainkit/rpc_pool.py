@@ -0,0 +1,295 @@
+"""
+Multi-endpoint JSON-RPC provider: `Web3(RPCPool(urls))` is a drop-in for `Web3(HTTPProvider(url))`.
+- Per-endpoint token bucket (`rate` requests/s, `burst`), a batch costs one token per call (borrowed beyond `burst`)
+- Health score per endpoint from latency (EWMA), error rate (EWMA) and calls in flight; the best endpoint is picked per call
+- Failover: transport errors (timeouts, HTTP 429 / 5xx, refused connections) and rate-limit error answers are retried
+  on the next endpoint; failing endpoints are benched with an exponential cooldown
+- Hedged requests for latency-critical methods (eth_blockNumber, receipts, ...): a duplicate goes to the second best
+  endpoint when the first one is slower than `hedge_after`, the first answer wins
+- Other JSON-RPC error answers (reverts, range limits of eth_getLogs, ...) and other HTTP 4xx (413, ...) are returned / raised
+  as is, callers keep their own handling
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from web3 import HTTPProvider
+from web3.providers.base import JSONBaseProvider
+import os, threading, time
+
+HEDGED_METHODS = frozenset({
+    "eth_blockNumber", "eth_getTransactionReceipt", "eth_getTransactionByHash", "eth_getBlockReceipts",
+})
+
+# Fragments of error answers meaning "this endpoint is throttling us", not "this request is wrong"
+# (HTTP 429 is matched on the response status, see _endpoint_failure)
+RATE_LIMIT_MARKERS = ("rate limit", "too many requests", "exceeded the quota", "daily limit", "capacity exceeded", "try again later")
+
+class Endpoint:
+    """One RPC URL: HTTP provider, token bucket and health statistics"""
+    def __init__(self, url: str, rate: float, burst: float, timeout: float):
+        self.url = url
+        self.provider = HTTPProvider(url, request_kwargs={"timeout": timeout}, exception_retry_configuration=None)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self._refilled = time.monotonic()
+        self.latency: Optional[float] = None  # EWMA, seconds
+        self.error_rate = 0.0                 # EWMA of failures
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.hedge_wins = 0
+        self._failures = 0                    # consecutive
+        self.cooldown_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def wait_for(self, cost: float, now: float) -> float:
+        """
+        Seconds until `cost` tokens are available (0: now). A cost above `burst` (large batch) only needs a full bucket
+        and is borrowed: the bucket goes negative and the following calls wait for the debt to be refilled.
+        """
+        self._refill(now)
+        need = min(cost, self.burst)
+        return 0.0 if self.tokens >= need else (need - self.tokens) / self.rate
+
+    def score(self, now: float) -> float:
+        """Lower is better; benched endpoints last"""
+        latency = self.latency if self.latency is not None else 0.05
+        return latency * (1 + self.in_flight) * (1 + 4 * self.error_rate) + (1e6 if now < self.cooldown_until else 0.0)
+
+    def record(self, secs: float, ok: bool, cooldown: float) -> None:
+        self.calls += 1
+        if ok:
+            self.latency = secs if self.latency is None else self.latency + 0.3 * (secs - self.latency)
+            self.error_rate *= 0.7
+            self._failures = 0
+        else:
+            self.errors += 1
+            self.error_rate = self.error_rate * 0.7 + 0.3
+            self._failures += 1
+            self.cooldown_until = time.monotonic() + min(60.0, cooldown * 2 ** (self._failures - 1))
+
+def _endpoint_failure(e: BaseException) -> bool:
+    """Failover-worthy: no HTTP status (timeout, refused connection, throttling answer), HTTP 429 or 5xx"""
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+def _rate_limited(response: Any) -> bool:
+    """Error answer (single or inside a batch) saying the endpoint throttles us"""
+    items = response if isinstance(response, list) else [response]
+    for item in items:
+        err = item.get("error") if isinstance(item, dict) else None
+        if err and any(m in str(err).lower() for m in RATE_LIMIT_MARKERS):
+            return True
+    return False
+
+class RPCPool(JSONBaseProvider):
+    """
+    - urls: RPC endpoints of the same chain
+    - rate / burst: token bucket per endpoint (requests per second / bucket size)
+    - hedge_after: seconds before a hedged duplicate is sent (None: 3x the best latency, at least 50 ms)
+    - max_attempts: endpoints tried per call before the last error is raised / returned
+    """
+    def __init__(self, urls: Sequence[str], rate: float=10.0, burst: Optional[float]=None, timeout: float=10.0,
+                 hedge_after: Optional[float]=None, hedge_methods: Iterable[str]=HEDGED_METHODS, max_attempts: int=3,
+                 cooldown: float=2.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))
+        if not urls:
+            raise ValueError("RPCPool needs at least one endpoint URL")
+        self.endpoints = [Endpoint(u, rate, burst if burst is not None else max(1.0, rate), timeout) for u in urls]
+        self.hedge_after = hedge_after
+        self.hedge_methods = frozenset(hedge_methods)
+        self.max_attempts = max(1, int(max_attempts))
+        self.cooldown = float(cooldown)
+        self.endpoint_uri = "pool:" + ",".join(urls)  # stable key for per-provider tuning (collector / tx_tracker)
+        self.failovers = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(self.endpoints) + 4, thread_name_prefix="chainkit-rpc")
+
+    # ---- endpoint selection ----
+
+    def _acquire(self, cost: float, exclude: Sequence[Endpoint]=()) -> Endpoint:
+        """Best endpoint with `cost` tokens available, waiting for a token refill when all are throttled"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                candidates = [ep for ep in self.endpoints if ep not in exclude] or list(self.endpoints)
+                candidates.sort(key=lambda ep: ep.score(now))
+                waits = [(ep.wait_for(cost, now), ep) for ep in candidates]
+                ready = [ep for w, ep in waits if w == 0.0]
+                if ready:
+                    ep = ready[0]
+                    ep.tokens -= cost
+                    ep.in_flight += 1
+                    return ep
+                delay = min(w for w, _ in waits)
+            time.sleep(delay)
+
+    def _hedge_delay(self) -> float:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        known = [ep.latency for ep in self.endpoints if ep.latency is not None]
+        return max(0.05, 3 * min(known)) if known else 0.25
+
+    # ---- calls ----
+
+    def _call(self, ep: Endpoint, fn: str, payload: Any) -> Any:
+        """Call one endpoint (in_flight already counted), record health; raise on transport errors and throttling"""
+        t0 = time.monotonic()
+        try:
+            response = getattr(ep.provider, fn)(*payload)
+            if _rate_limited(response):
+                raise RuntimeError(f"rate limited by {ep.url}: {response}")
+        except Exception as e:
+            with self._lock:
+                ep.in_flight -= 1
+                ep.record(time.monotonic() - t0, not _endpoint_failure(e), self.cooldown)
+            raise
+        with self._lock:
+            ep.in_flight -= 1
+            ep.record(time.monotonic() - t0, True, self.cooldown)
+        return response
+
+    def _hedged(self, fn: str, payload: Any, cost: float, tried: List[Endpoint]) -> Any:
+        first = self._acquire(cost, tried)
+        tried.append(first)
+        futures = {self._executor.submit(self._call, first, fn, payload): first}
+        done, _ = wait(futures, timeout=self._hedge_delay())
+        if not done and len(tried) < len(self.endpoints):
+            second = self._acquire(cost, tried)
+            tried.append(second)
+            self.hedges += 1
+            futures[self._executor.submit(self._call, second, fn, payload)] = second
+        error: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    ep = futures[f]
+                    if ep is not first:
+                        ep.hedge_wins += 1
+                    return f.result()
+                error = f.exception()
+        raise error
+
+    def _dispatch(self, fn: str, payload: Any, cost: float, hedge: bool) -> Any:
+        tried: List[Endpoint] = []
+        error: Optional[BaseException] = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.failovers += 1
+            try:
+                if hedge and len(self.endpoints) > 1:
+                    return self._hedged(fn, payload, cost, tried)
+                ep = self._acquire(cost, tried)
+                tried.append(ep)
+                return self._call(ep, fn, payload)
+            except Exception as e:
+                if not _endpoint_failure(e):
+                    raise
+                error = e
+        raise error
+
+    def make_request(self, method, params) -> Any:
+        return self._dispatch("make_request", (method, params), 1.0, method in self.hedge_methods)
+
+    def make_batch_request(self, requests) -> Any:
+        return self._dispatch("make_batch_request", (requests,), float(max(1, len(requests))), False)
+
+    def is_connected(self, show_traceback: bool=False) -> bool:
+        return any(ep.provider.is_connected(show_traceback) for ep in self.endpoints)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Health of every endpoint, for monitoring"""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "url": ep.url, "calls": ep.calls, "errors": ep.errors, "hedge_wins": ep.hedge_wins,
+                "latency_ms": None if ep.latency is None else round(ep.latency * 1000, 1),
+                "error_rate": round(ep.error_rate, 3), "tokens": round(ep.tokens, 2),
+                "benched": now < ep.cooldown_until,
+            } for ep in self.endpoints]
+
+def pool_from_env(**kwargs: Any) -> RPCPool:
+    """RPCPool over RPC_URLS (comma separated), or RPC_URL alone"""
+    urls = [u for u in os.getenv("RPC_URLS", "").split(",") if u.strip()] or [os.environ["RPC_URL"]]
+    return RPCPool(urls, **kwargs)
+
+def _test_rpc_pool() -> None:
+    """Offline check with fake nodes: spread and rate limits, failover on a dead endpoint, hedged block_number"""
+    from web3 import Web3
+    from requests import HTTPError, Response
+    from .fake_node import FakeNode, RPCError
+
+    def http_error(status: int) -> HTTPError:
+        response = Response()
+        response.status_code = status
+        return HTTPError(f"{status} Client Error: chain 429 for url: http://x/429", response=response)
+    assert _endpoint_failure(http_error(429)) and _endpoint_failure(http_error(503)) and _endpoint_failure(TimeoutError())
+    assert not _endpoint_failure(http_error(413)) and not _endpoint_failure(http_error(400))
+    assert not _rate_limited({"error": {"code": -32000, "message": "header not found for block 0x4290429"}})
+
+    throttled = {"on": False}
+    def block_number(params):
+        if throttled["on"]:
+            raise RPCError(-32005, "rate limit exceeded, too many requests")
+        return "0x64"
+    handlers = {"eth_chainId": lambda p: "0x38", "eth_blockNumber": block_number, "eth_gasPrice": lambda p: "0x1"}
+
+    dead = FakeNode(handlers).start()
+    dead_url = dead.url
+    dead.stop()  # nothing listens there any more
+
+    with FakeNode(handlers) as a, FakeNode(handlers) as b, FakeNode(dict(handlers, eth_blockNumber=lambda p: "0x64")) as c:
+        # Spread + token bucket: 2 endpoints at 20 req/s each
+        pool = RPCPool([a.url, b.url], rate=20, burst=5, hedge_methods=())
+        w3 = Web3(pool)
+        t0 = time.monotonic()
+        for _ in range(60):
+            assert w3.eth.gas_price == 1
+        secs = time.monotonic() - t0
+        assert a.http_requests > 10 and b.http_requests > 10
+        assert secs >= (60 - 10) / 40 * 0.9  # never faster than 2 x (20/s) after the bursts
+
+        # Batch larger than the bucket: sent at once on a full bucket, the debt delays the next call
+        pool = RPCPool([a.url], rate=50)
+        t0 = time.monotonic()
+        assert len(pool.make_batch_request([("eth_gasPrice", [])] * 100)) == 100
+        assert time.monotonic() - t0 < 0.5
+        w3 = Web3(pool)
+        assert w3.eth.gas_price == 1 and time.monotonic() - t0 >= 0.9  # 50 tokens of debt + 1 at 50/s
+
+        # Failover: a dead endpoint and a throttling one, every call still answered by c
+        pool = RPCPool([dead_url, a.url, c.url], rate=1000, hedge_methods=(), timeout=2)
+        w3 = Web3(pool)
+        throttled["on"] = True
+        for _ in range(10):
+            assert w3.eth.block_number == 100
+        throttled["on"] = False
+        st = {s["url"]: s for s in pool.stats()}
+        assert st[dead_url]["errors"] >= 1 and st[a.url]["errors"] >= 1 and st[c.url]["errors"] == 0 and pool.failovers >= 2
+
+        # Hedging: the preferred endpoint turns slow, the duplicate on the other one answers first
+        pool = RPCPool([a.url, b.url], rate=1000, hedge_after=0.05)
+        w3 = Web3(pool)
+        for _ in range(5):
+            w3.eth.block_number
+        slow = min(pool.endpoints, key=lambda ep: ep.score(time.monotonic()))
+        (a if slow.url == a.url else b).latency = 1.0
+        t0 = time.monotonic()
+        assert w3.eth.block_number == 100
+        secs = time.monotonic() - t0
+        assert secs < 0.5 and pool.hedges >= 1 and sum(ep.hedge_wins for ep in pool.endpoints) >= 1
+        a.latency = b.latency = 0.0
+    print(f"[rpc_pool] rate limits, failover and hedging OK (hedged block_number in {secs * 1000:.0f} ms behind a 1 s endpoint)")
+
+if __name__ == "__main__":
+    _test_rpc_pool()
+
+# End of file
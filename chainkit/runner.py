@@ -1,15 +1,20 @@
 
-from typing import Optional, Iterable, Set, List
+from typing import Optional, Iterable, Set, List, Dict
 from web3 import Web3
 from collections import deque
-import json, os, time
+import asyncio, time
 
 from .registry_event import topic0_allowlist_minimal_v2
-from .tx_tracker import analyze_tx
-from .collector import collect_tx_hashes, PANCAKE_V2_BCFX_BUSD_ADDR
+from .decoders import to_hexstr
+from .dedup import CompactDedup
+from .state import StateStore
+from .pool_index import PoolIndex
+from .scheduler import PollScheduler
+from .tx_tracker import analyze_many, analyze_block, async_analyze_block, async_analyze_many, decode_logs, save_normalized_events, save_unknown_events, flush_events
+from .collector import collect_tx_hashes, async_collect_tx_hashes, normalize_watchlist, PANCAKE_V2_BCFX_BUSD_ADDR, MAX_ADDRESSES_PER_FILTER
 
 class DequeSet:
-    """Fixed volume deque + set to store detected tx hashes"""
+    """Fixed volume deque + set to store detected tx hashes (Runner now uses the more compact dedup.CompactDedup)"""
     def __init__(self, capacity: int=20000):
         self.capacity = int(capacity)
         self._dq = deque(maxlen=capacity)
@@ -41,7 +46,7 @@ class DequeSet:
         return inst
 
 class Runner:
-    def __init__(self, w3: Web3, window: int=5, confirmations: int=3, sleep_secs: float=10.0, max_seen: int=20000, overlap_blocks: int=0, store_tx_hashes: bool=False, store_tx_analyze: bool=False, state_path: Optional[str]=None, topics: Optional[List[str]]=None):
+    def __init__(self, w3: Web3, window: int=5, confirmations: int=3, sleep_secs: float=10.0, max_seen: int=20000, overlap_blocks: int=0, store_tx_hashes: bool=False, store_tx_analyze: bool=False, state_path: Optional[str]=None, topics: Optional[List[str]]=None, block_mode: bool=False, batch_size: int=100, log_only: bool=False, watchlist: Optional[Iterable[str]]=None, shard_size: int=MAX_ADDRESSES_PER_FILTER, compact_every: int=200, pool_index: Optional[PoolIndex]=None, scheduler: Optional[PollScheduler]=None):
         self.w3 = w3
         self.window = int(window)
         self.confirmations = int(confirmations)
@@ -49,22 +54,27 @@ class Runner:
         self.overlap_blocks = int(overlap_blocks) # Allow slight overlapping when requesting blocks
         self.store_tx_hashes = store_tx_hashes
         self.store_tx_analyze = store_tx_analyze
-        self.seen = DequeSet(max_seen)
+        self.seen = CompactDedup(max_seen)
         self.state_path = state_path
         self.topics = topics
+        self.block_mode = block_mode # Analyze per block (eth_getBlockReceipts) instead of per tx
+        self.batch_size = int(batch_size) # Max JSON-RPC calls per batch when analyzing per tx
+        self.log_only = log_only # Decode the collected logs directly, no tx / receipt fetching
+        self.watchlist = normalize_watchlist(watchlist or [PANCAKE_V2_BCFX_BUSD_ADDR])
+        self.shard_size = int(shard_size) # Max addresses per eth_getLogs filter
+        self.pool_index = pool_index # Kept up to date with the pools created in each round
+        self.scheduler = scheduler # Adaptive span / sleep instead of the fixed window / sleep_secs
+        self.safe_seen: Optional[int] = None # Safe head seen by the last round
         self.last_safe_head: Optional[int] = None
 
-        # Allow continue guarding from state file
-        if self.state_path and os.path.exists(self.state_path):
+        # Allow continue guarding from state file (snapshot + journal, see state.StateStore)
+        self._store = StateStore(self.state_path, compact_every=compact_every) if self.state_path else None
+        self._unsaved: List[str] = []
+        if self._store is not None:
             try:
-                with open(self.state_path, "r", encoding="utf-8") as f:
-                    st = json.load(f)
-                self.last_safe_head = st.get("last_safe_head")
-                self.seen = DequeSet.from_list(
-                    st.get("seen_tx", []),
-                    capacity=st.get("max_seen", max_seen),
-                )
-                print(f"[runner] restored last_safe_head={self.last_safe_head}, seen={len(self.seen.to_list())}")
+                self.last_safe_head, self.seen = self._store.load(max_seen)
+                if self.last_safe_head is not None:
+                    print(f"[runner] restored last_safe_head={self.last_safe_head}, seen={len(self.seen)}")
             except Exception as e:
                 print(f"[runner] restore failed: {e}")
 
@@ -78,16 +88,25 @@ class Runner:
         - Basically: [safe_head - window + 1, safe_head]
         - Overlapping: Allow overlap blocks before last_safe_head
         """
-        if self.last_safe_head is not None and safe_head <= self.last_safe_head:
+        return self._range_after(self.last_safe_head, safe_head)
+
+    def _range_after(self, last_head: Optional[int], safe_head: int) -> tuple[int, int]:
+        """Range of the round following `last_head` (None: nothing processed yet)"""
+        if last_head is not None and safe_head <= last_head:
             return -1, -2
 
+        if self.scheduler is not None and last_head is not None:
+            # No block skipped: continue after last_head, as far as the scheduler span allows
+            start = max(0, last_head + 1 - self.overlap_blocks)
+            return start, min(safe_head, last_head + self.scheduler.span_for(safe_head - last_head))
+
         end = safe_head
         base_start = max(0, end - (self.window - 1))
 
-        if self.last_safe_head is None:
+        if last_head is None:
             candidate = max(0, end - (self.window - 1 + self.overlap_blocks))
         else:
-            candidate = max(0, self.last_safe_head + 1 - self.overlap_blocks)
+            candidate = max(0, last_head + 1 - self.overlap_blocks)
 
         start = max(base_start, candidate)
 
@@ -98,21 +117,93 @@ class Runner:
                 start = 0
         return start, end
 
+    @staticmethod
+    def _group_by_block(logs: Iterable[dict]) -> Dict[int, List[str]]:
+        """Unique tx hashes of the collected logs, grouped by block number in chain order"""
+        by_block: Dict[int, List[str]] = {}
+        met: Set[str] = set()
+        for log in sorted(logs, key=lambda x: (x["blockNumber"], x["logIndex"])):
+            h = to_hexstr(log["transactionHash"]).lower()
+            if h in met:
+                continue
+            met.add(h)
+            by_block.setdefault(log["blockNumber"], []).append(h)
+        return by_block
+
+    def _unseen(self, cand: List[str]) -> List[str]:
+        """Candidate tx hashes of a round still to process"""
+        return [h for h in cand if h not in self.seen]
+
+    def _mark_seen(self, hashes: Iterable[str]) -> None:
+        for h in hashes:
+            if self.seen.add(h):
+                self._unsaved.append(h)
+
     def _save_state(self) -> None:
-        if not self.state_path:
+        """Append this round (new keys + last_safe_head) to the journal, compact from time to time"""
+        if self.store_tx_analyze:
+            # Events of the round must be durable before the round is marked as done
+            flush_events()
+        if self._store is None:
+            return
+        self._store.append(self._unsaved, self.last_safe_head)
+        self._unsaved = []
+        if self._store.needs_compaction():
+            self._store.compact(self.seen, self.last_safe_head)
+
+    def _update_pool_index(self, b0: int, b1: int) -> None:
+        """Index the pools created up to b1 (an empty index starts at b0, PoolIndex.backfill fills the history)"""
+        if self.pool_index is None:
             return
-        data = {
-            "last_safe_head": self.last_safe_head,
-            "seen_tx": self.seen.to_list(),
-            "dedup_capacity": self.seen.capacity,
-        }
-        tmp = self.state_path + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f)
-        os.replace(tmp, self.state_path)
+        try:
+            added = self.pool_index.update(self.w3, b1, start=b0)
+            if added:
+                print(f"[runner] pool index: {added} new pools")
+        except Exception as e:
+            # Progress is unchanged, the next round scans these blocks again
+            print(f"[runner] pool index update failed: {e}")
+
+    def _collect(self, b0: int, b1: int) -> List[dict]:
+        """Logs of the watchlist in [b0, b1]"""
+        return collect_tx_hashes(self.w3, self.watchlist, b0, b1, topics=self.topics, shard_size=self.shard_size)
+
+    @staticmethod
+    def _logs_of(logs: List[dict], todo: List[str]) -> List[dict]:
+        """log_only mode: the collected logs of the `todo` tx hashes"""
+        pending = set(todo)
+        return [log for log in logs if to_hexstr(log["transactionHash"]).lower() in pending]
+
+    def _decode_collected(self, logs: List[dict], todo: List[str]) -> List[dict]:
+        """log_only mode: decode the collected logs of the `todo` tx hashes, no RPC call"""
+        out = decode_logs(self._logs_of(logs, todo))
+        if self.store_tx_analyze:
+            for r in out:
+                save_normalized_events(r["events"])
+                save_unknown_events(r["unknown_events_raw"])
+        return out
+
+    @staticmethod
+    def _todo_by_block(by_block: Dict[int, List[str]], todo: List[str]) -> Dict[int, List[str]]:
+        """block_mode: the `todo` tx hashes of each block, blocks without any left out"""
+        pending = set(todo)
+        sel = {bn: [h for h in hashes if h in pending] for bn, hashes in by_block.items()}
+        return {bn: hashes for bn, hashes in sel.items() if hashes}
+
+    def _process(self, logs: List[dict], by_block: Dict[int, List[str]], todo: List[str]) -> List[dict]:
+        """Analyze the `todo` tx hashes of the collected logs with the configured mode (log_only / block_mode / per tx)"""
+        if self.log_only:
+            out = self._decode_collected(logs, todo)
+        elif self.block_mode:
+            out = []
+            for bn, sel in self._todo_by_block(by_block, todo).items():
+                out.extend(analyze_block(self.w3, bn, sel, save_data=self.store_tx_analyze))
+        else:
+            out = analyze_many(self.w3, todo, batch_size=self.batch_size, save_data=self.store_tx_analyze)
+        return out
 
     def proceed(self) -> int:
         safe = self._safe_head()
+        self.safe_seen = safe
         if self.last_safe_head is not None and safe <= self.last_safe_head:
             # print(f"[runner] no new safe head ({safe}), skip")
             return 0
@@ -122,30 +213,129 @@ class Runner:
             return 0
 
         # print(f"DEBUG range: [{b0}, {b1}] span={b1-b0+1} window={self.window} overlap={self.overlap_blocks}")
-        cand = collect_tx_hashes(self.w3, [PANCAKE_V2_BCFX_BUSD_ADDR], b0, b1, topics=self.topics)
-        todo = [h for h in cand if h not in self.seen]
+        self._update_pool_index(b0, b1)
+        logs = self._collect(b0, b1)
+        by_block = self._group_by_block(logs)
+        cand = [h for hashes in by_block.values() for h in hashes]
+        todo = self._unseen(cand)
 
-        out = [analyze_tx(self.w3, h, save_data=self.store_tx_analyze) for h in todo]
-        for h in todo:
-            self.seen.add(h)
+        out = self._process(logs, by_block, todo)
+        self._mark_seen(todo)
 
         self.last_safe_head = b1
         self._save_state()
         print(f"[runner] blocks [{b0},{b1}] candidates={len(cand)} processed={len(out)}")
         return len(out)
 
+    def _pause(self, secs: float, error: bool=False) -> float:
+        """Seconds to sleep after a round of `secs` seconds: sleep_secs, or the scheduler decision"""
+        if self.scheduler is None:
+            return self.sleep_secs
+        return self.scheduler.after_round(self.safe_seen, self.last_safe_head, secs, error=error)
+
     def run_loop(self) -> None:
         print(f"[runner] loop start: window={self.window}, conf={self.confirmations}, interval={self.sleep_secs}s")
         try:
             while True:
+                t0, error = time.monotonic(), False
                 try:
                     self.proceed()
                 except Exception as e:
+                    error = True
                     print(f"[runner] step error: {e}")
-                time.sleep(self.sleep_secs)
+                time.sleep(self._pause(time.monotonic() - t0, error))
         except KeyboardInterrupt:
             print("[runner] stopped")
 
+class AsyncRunner(Runner):
+    """
+    asyncio version of Runner on top of AsyncWeb3, same window / confirmations / overlap / state semantics
+    and the same log_only / block_mode / per tx (batch_size) modes.
+    - max_in_flight: max RPC requests in flight (a JSON-RPC batch counts as one), shared by the safe head,
+      eth_getLogs and transaction / block fetches of a round
+    - proceed / run_loop are coroutines, the async stages have their own `_async_*` names
+    """
+    def __init__(self, w3, max_in_flight: int=16, **kwargs):
+        super().__init__(w3, **kwargs)
+        self.max_in_flight = int(max_in_flight)
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def _limit(self) -> asyncio.Semaphore:
+        # Created on first use, inside the running event loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_in_flight)
+        return self._sem
+
+    async def _async_safe_head(self) -> int:
+        async with self._limit():
+            latest = await self.w3.eth.block_number
+        return max(0, latest - self.confirmations)
+
+    async def _async_update_pool_index(self, b0: int, b1: int) -> None:
+        if self.pool_index is None:
+            return
+        try:
+            added = await self.pool_index.async_update(self.w3, b1, start=b0)
+            if added:
+                print(f"[runner] pool index: {added} new pools")
+        except Exception as e:
+            print(f"[runner] pool index update failed: {e}")
+
+    async def _async_collect(self, b0: int, b1: int) -> List[dict]:
+        return await async_collect_tx_hashes(self.w3, self.watchlist, b0, b1, topics=self.topics, shard_size=self.shard_size, sem=self._limit())
+
+    async def _async_process(self, logs: List[dict], by_block: Dict[int, List[str]], todo: List[str]) -> List[dict]:
+        """Same dispatch as `Runner._process`, blocks / batches are sent concurrently"""
+        if self.log_only:
+            return self._decode_collected(logs, todo)
+        sem = self._limit()
+        if self.block_mode:
+            parts = await asyncio.gather(*(async_analyze_block(self.w3, bn, sel, save_data=self.store_tx_analyze, sem=sem)
+                                           for bn, sel in self._todo_by_block(by_block, todo).items()))
+            return [r for part in parts for r in part]
+        return await async_analyze_many(self.w3, todo, batch_size=self.batch_size, save_data=self.store_tx_analyze, sem=sem)
+
+    async def proceed(self) -> int:
+        safe = await self._async_safe_head()
+        self.safe_seen = safe
+        if self.last_safe_head is not None and safe <= self.last_safe_head:
+            return 0
+
+        b0, b1 = self._range_this_round(safe)
+        if b0 > b1:
+            return 0
+
+        await self._async_update_pool_index(b0, b1)
+        logs = await self._async_collect(b0, b1)
+        by_block = self._group_by_block(logs)
+        cand = [h for hashes in by_block.values() for h in hashes]
+        todo = self._unseen(cand)
+
+        out = await self._async_process(logs, by_block, todo)
+        self._mark_seen(todo)
+
+        self.last_safe_head = b1
+        self._save_state()
+        print(f"[runner] blocks [{b0},{b1}] candidates={len(cand)} processed={len(out)}")
+        return len(out)
+
+    async def run_loop(self) -> None:
+        print(f"[runner] async loop start: window={self.window}, conf={self.confirmations}, interval={self.sleep_secs}s, in_flight={self.max_in_flight}")
+        try:
+            while True:
+                t0, error = time.monotonic(), False
+                try:
+                    await self.proceed()
+                except Exception as e:
+                    error = True
+                    print(f"[runner] step error: {e}")
+                await asyncio.sleep(self._pause(time.monotonic() - t0, error))
+        except KeyboardInterrupt:
+            print("[runner] stopped")
+        except asyncio.CancelledError:
+            print("[runner] stopped")
+            raise  # let the caller's task.cancel() / wait_for see the cancellation
+
 def _test_runner():
     import os, json
     from dotenv import load_dotenv
@@ -0,0 +1,258 @@
+"""
+Event sinks: buffered, idempotent bulk writes of decoded events and unknown raw events.
+- EventSink buffers rows, flushing every `batch_size` rows or `flush_interval` seconds after the oldest buffered row
+  (timer thread: rows are written even when nothing else is added)
+- Inserts are idempotent on (block_number, tx_hash, log_index): replaying a window never duplicates rows
+- retract_blocks(first, last) removes the rows of blocks dropped by a reorg (SQLite / PostgreSQL)
+- SQLiteSink: local file, WAL mode, one transaction of INSERT OR IGNORE per flush
+- PostgresSink: schema from sql/schema.sql, COPY into a staging table then INSERT ... ON CONFLICT DO NOTHING
+  (psycopg 3), or multi-row inserts (psycopg2)
+- sink_from_url("sqlite:///path.db" | "postgresql://...")
+"""
+
+from typing import Any, Dict, List, Optional
+import json, os, sqlite3, threading, time
+
+EVENT_COLUMNS = ("block_number", "tx_hash", "log_index", "contract", "type", "name", "args")
+UNKNOWN_COLUMNS = ("block_number", "block_hash", "tx_hash", "tx_index", "log_index", "address", "topic0",
+                   "topics", "topics_count", "data_hex", "data_len", "removed", "parse_error")
+
+PARTITION_BLOCKS = 1_000_000
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "sql", "schema.sql")
+
+def event_row(ev: Dict[str, Any]) -> tuple:
+    """Row of the events table; args as JSON text (uint256 stay exact)"""
+    return (ev["block_number"], ev["tx_hash"], ev["log_index"], ev["contract"], ev["type"], ev.get("name"),
+            json.dumps(ev["args"]))
+
+def unknown_row(raw: Dict[str, Any]) -> tuple:
+    return tuple(raw.get(c) for c in UNKNOWN_COLUMNS)
+
+class EventSink:
+    """Buffering base class, subclasses implement _write(events_rows, unknown_rows) in one transaction"""
+    def __init__(self, batch_size: int=1000, flush_interval: float=2.0):
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self._events: List[tuple] = []
+        self._unknown: List[tuple] = []
+        self._oldest: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def add_events(self, events: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._events.extend(event_row(ev) for ev in events)
+        self._maybe_flush()
+
+    def add_unknown(self, rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._unknown.extend(unknown_row(r) for r in rows)
+        self._maybe_flush()
+
+    def pending(self) -> int:
+        return len(self._events) + len(self._unknown)
+
+    def _maybe_flush(self) -> None:
+        n = self.pending()
+        if not n:
+            return
+        now = time.monotonic()
+        if self._oldest is None:
+            self._oldest = now
+            self._arm_timer()
+        if n >= self.batch_size or now - self._oldest >= self.flush_interval:
+            self.flush()
+
+    def _arm_timer(self) -> None:
+        """Flush `flush_interval` seconds after the first buffered row, even if no other row is added"""
+        if self.flush_interval <= 0:
+            return
+        self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _timed_flush(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            # Rows stay buffered, the next add / flush retries them
+            print(f"[sink] timed flush failed: {e}")
+
+    def flush(self) -> None:
+        """Write every buffered row now"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        with self._lock:
+            events, unknown = self._events, self._unknown
+            self._events, self._unknown, self._oldest = [], [], None
+            if events or unknown:
+                try:
+                    self._write(events, unknown)
+                except Exception:
+                    # Put the rows back in front, the next flush retries them (writes are idempotent)
+                    self._events, self._unknown = events + self._events, unknown + self._unknown
+                    self._oldest = time.monotonic()
+                    raise
+                self.written += len(events) + len(unknown)
+
+    def _write(self, events: List[tuple], unknown: List[tuple]) -> None:
+        raise NotImplementedError
+
+    @property
+    def can_retract(self) -> bool:
+        return type(self)._delete is not EventSink._delete
+
+    def retract_blocks(self, first: int, last: int) -> None:
+        """Remove the rows of blocks [first, last], written or still buffered (blocks dropped by a reorg)"""
+        if not self.can_retract:
+            raise NotImplementedError(f"{type(self).__name__} cannot retract written rows")
+        keep = lambda r: not first <= (r[0] if isinstance(r, tuple) else r["block_number"]) <= last
+        with self._lock:
+            self._events = [r for r in self._events if keep(r)]
+            self._unknown = [r for r in self._unknown if keep(r)]
+            self._delete(first, last)
+
+    def _delete(self, first: int, last: int) -> None:
+        """Delete written rows of blocks [first, last] (lock held)"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "EventSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER NOT NULL, tx_hash TEXT NOT NULL, log_index INTEGER NOT NULL,
+    contract TEXT NOT NULL, type TEXT NOT NULL, name TEXT, args TEXT NOT NULL,
+    PRIMARY KEY (block_number, tx_hash, log_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS events_type_block_idx ON events (type, block_number);
+CREATE INDEX IF NOT EXISTS events_contract_block_idx ON events (contract, block_number);
+CREATE INDEX IF NOT EXISTS events_tx_idx ON events (tx_hash);
+CREATE TABLE IF NOT EXISTS unknown_events_raw (
+    block_number INTEGER NOT NULL, block_hash TEXT, tx_hash TEXT NOT NULL, tx_index INTEGER,
+    log_index INTEGER NOT NULL, address TEXT NOT NULL, topic0 TEXT, topics TEXT NOT NULL,
+    topics_count INTEGER NOT NULL, data_hex TEXT NOT NULL, data_len INTEGER NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0, parse_error TEXT,
+    PRIMARY KEY (block_number, tx_hash, log_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS unknown_topic0_block_idx ON unknown_events_raw (topic0, block_number);
+CREATE INDEX IF NOT EXISTS unknown_address_block_idx ON unknown_events_raw (address, block_number);
+"""
+
+class SQLiteSink(EventSink):
+    def __init__(self, path: str, batch_size: int=1000, flush_interval: float=2.0):
+        super().__init__(batch_size, flush_interval)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SQLITE_SCHEMA)
+
+    def _write(self, events: List[tuple], unknown: List[tuple]) -> None:
+        # topics list -> JSON text for SQLite
+        topics_at = UNKNOWN_COLUMNS.index("topics")
+        unknown = [r[:topics_at] + (json.dumps(r[topics_at]),) + r[topics_at + 1:] for r in unknown]
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO events ({','.join(EVENT_COLUMNS)}) VALUES ({','.join('?' * len(EVENT_COLUMNS))})", events)
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO unknown_events_raw ({','.join(UNKNOWN_COLUMNS)}) VALUES ({','.join('?' * len(UNKNOWN_COLUMNS))})", unknown)
+
+    def _delete(self, first: int, last: int) -> None:
+        with self.conn:
+            for table in ("events", "unknown_events_raw"):
+                self.conn.execute(f"DELETE FROM {table} WHERE block_number BETWEEN ? AND ?", (first, last))
+
+    def close(self) -> None:
+        super().close()
+        self.conn.close()
+
+class PostgresSink(EventSink):
+    """Needs psycopg (3, uses COPY) or psycopg2 (multi-row inserts)"""
+    def __init__(self, dsn: str, batch_size: int=5000, flush_interval: float=2.0, create_schema: bool=True):
+        super().__init__(batch_size, flush_interval)
+        try:
+            import psycopg
+            self._copy = True
+            self.conn = psycopg.connect(dsn)
+        except ImportError:
+            try:
+                import psycopg2
+            except ImportError:
+                raise ImportError("PostgresSink requires psycopg (or psycopg2): pip install 'psycopg[binary]'")
+            self._copy = False
+            self.conn = psycopg2.connect(dsn)
+        self._partitions: set = set()
+        if create_schema:
+            with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+                ddl = f.read()
+            with self.conn.cursor() as cur:
+                cur.execute(ddl)
+            self.conn.commit()
+
+    def _ensure_partitions(self, cur, table: str, rows: List[tuple]) -> None:
+        for p in {r[0] // PARTITION_BLOCKS for r in rows}:
+            if (table, p) in self._partitions:
+                continue
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {table}_p{p} PARTITION OF {table} "
+                        f"FOR VALUES FROM ({p * PARTITION_BLOCKS}) TO ({(p + 1) * PARTITION_BLOCKS})")
+            self._partitions.add((table, p))
+
+    def _insert(self, cur, table: str, columns: tuple, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        self._ensure_partitions(cur, table, rows)
+        cols = ",".join(columns)
+        if self._copy:
+            stage = f"{table}_stage"
+            cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {table}) ON COMMIT DELETE ROWS")
+            with cur.copy(f"COPY {stage} ({cols}) FROM STDIN") as copy:
+                for r in rows:
+                    copy.write_row(r)
+            cur.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} ON CONFLICT DO NOTHING")
+        else:
+            from psycopg2.extras import execute_values
+            execute_values(cur, f"INSERT INTO {table} ({cols}) VALUES %s ON CONFLICT DO NOTHING", rows, page_size=1000)
+
+    def _write(self, events: List[tuple], unknown: List[tuple]) -> None:
+        try:
+            with self.conn.cursor() as cur:
+                self._insert(cur, "events", EVENT_COLUMNS, events)
+                self._insert(cur, "unknown_events_raw", UNKNOWN_COLUMNS, unknown)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self._partitions.clear()
+            raise
+
+    def _delete(self, first: int, last: int) -> None:
+        try:
+            with self.conn.cursor() as cur:
+                for table in ("events", "unknown_events_raw"):
+                    cur.execute(f"DELETE FROM {table} WHERE block_number BETWEEN %s AND %s", (first, last))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def close(self) -> None:
+        super().close()
+        self.conn.close()
+
+def sink_from_url(url: str, batch_size: int=1000, flush_interval: float=2.0) -> EventSink:
+    """sqlite:///relative.db, sqlite:////absolute.db, or a postgresql:// DSN"""
+    if url.startswith("sqlite:///"):
+        return SQLiteSink(url[len("sqlite:///"):], batch_size=batch_size, flush_interval=flush_interval)
+    if url.startswith(("postgresql://", "postgres://")):
+        return PostgresSink(url, batch_size=batch_size, flush_interval=flush_interval)
+    raise ValueError(f"Unsupported sink url: {url}")
+
+# End of file
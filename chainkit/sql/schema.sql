@@ -1,3 +1,45 @@
 -- schema.sql
 -- Definition of the PostgreSQL schema for storing transactions and events.
--- TODO: add CREATE TABLE statements here
+-- - Both tables are partitioned by RANGE (block_number); PostgresSink creates one partition
+--   per PARTITION_BLOCKS (1,000,000) blocks on demand, e.g. events_p58 = [58000000, 59000000)
+-- - Primary keys on (block_number, tx_hash, log_index) make inserts idempotent (ON CONFLICT DO NOTHING)
+-- - uint256 values stay exact: args is JSONB, whose numbers are arbitrary precision
+
+CREATE TABLE IF NOT EXISTS events (
+    block_number  BIGINT   NOT NULL,
+    tx_hash       TEXT     NOT NULL,
+    log_index     INTEGER  NOT NULL,
+    contract      TEXT     NOT NULL,
+    type          TEXT     NOT NULL,
+    name          TEXT,
+    args          JSONB    NOT NULL,
+    PRIMARY KEY (block_number, tx_hash, log_index)
+) PARTITION BY RANGE (block_number);
+
+CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT;
+
+CREATE INDEX IF NOT EXISTS events_type_block_idx     ON events (type, block_number);
+CREATE INDEX IF NOT EXISTS events_contract_block_idx ON events (contract, block_number);
+CREATE INDEX IF NOT EXISTS events_tx_idx             ON events (tx_hash);
+
+CREATE TABLE IF NOT EXISTS unknown_events_raw (
+    block_number  BIGINT   NOT NULL,
+    block_hash    TEXT,
+    tx_hash       TEXT     NOT NULL,
+    tx_index      INTEGER,
+    log_index     INTEGER  NOT NULL,
+    address       TEXT     NOT NULL,
+    topic0        TEXT,
+    topics        TEXT[]   NOT NULL,
+    topics_count  SMALLINT NOT NULL,
+    data_hex      TEXT     NOT NULL,
+    data_len      INTEGER  NOT NULL,
+    removed       BOOLEAN  NOT NULL DEFAULT FALSE,
+    parse_error   TEXT,
+    PRIMARY KEY (block_number, tx_hash, log_index)
+) PARTITION BY RANGE (block_number);
+
+CREATE TABLE IF NOT EXISTS unknown_events_raw_default PARTITION OF unknown_events_raw DEFAULT;
+
+CREATE INDEX IF NOT EXISTS unknown_topic0_block_idx  ON unknown_events_raw (topic0, block_number);
+CREATE INDEX IF NOT EXISTS unknown_address_block_idx ON unknown_events_raw (address, block_number);
@@ -0,0 +1,124 @@
+"""
+Incremental, crash-safe runner state.
+- `<path>.snap`: snapshot = last_safe_head + CompactDedup binary snapshot, replaced atomically
+- `<path>.journal`: append-only records, one per round: newly seen keys + new last_safe_head (CRC32 checked, fsync'ed)
+- Compaction rewrites the snapshot and starts an empty journal; both carry a generation number,
+  so a crash between the two steps never replays a journal already folded into the snapshot
+- A torn record at the journal tail (crash while appending) is dropped on load
+- A legacy JSON state file at `<path>` is migrated on first load
+"""
+
+from typing import Iterable, Optional, Tuple
+import json, os, struct, zlib
+
+from .dedup import CompactDedup, TX_KEY_SIZE, _raw
+
+_SNAP = struct.Struct(">4sBQQ")     # magic, version, generation, last_safe_head + 1 (0: None)
+_JOURNAL = struct.Struct(">4sBQ")   # magic, version, generation
+_RECORD = struct.Struct(">IIQ")     # crc32, n_keys, last_safe_head + 1
+
+def _fsync_write(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _note_resize(stored: int, capacity: int) -> None:
+    if stored != capacity:
+        print(f"[state] dedup capacity {stored} -> {capacity}" + (" (oldest keys dropped)" if capacity < stored else ""))
+
+class StateStore:
+    def __init__(self, path: str, compact_every: int=200, key_size: int=TX_KEY_SIZE):
+        self.path = path
+        self.snap_path = path + ".snap"
+        self.journal_path = path + ".journal"
+        self.compact_every = int(compact_every)
+        self.key_size = int(key_size)
+        self.generation = 0
+        self._appends = 0
+
+    def load(self, capacity: int) -> Tuple[Optional[int], CompactDedup]:
+        """Return (last_safe_head, seen) from snapshot + journal, or a fresh state; seen always has `capacity`"""
+        last_safe_head: Optional[int] = None
+        seen = CompactDedup(capacity, self.key_size)
+        if os.path.exists(self.snap_path):
+            with open(self.snap_path, "rb") as f:
+                data = f.read()
+            magic, version, self.generation, head = _SNAP.unpack_from(data, 0)
+            if magic != b"CKST" or version != 1:
+                raise ValueError(f"{self.snap_path} is not a state snapshot")
+            last_safe_head = head - 1 if head else None
+            seen = CompactDedup.from_bytes(data[_SNAP.size:], capacity)
+            _note_resize(CompactDedup.stored_capacity(data[_SNAP.size:]), capacity)
+        elif os.path.exists(self.path):
+            # Legacy full JSON state
+            with open(self.path, "r", encoding="utf-8") as f:
+                st = json.load(f)
+            last_safe_head = st.get("last_safe_head")
+            _note_resize(st.get("dedup_capacity", capacity), capacity)
+            seen = CompactDedup.from_list(st.get("seen_tx", []), capacity=capacity, key_size=self.key_size)
+            self.compact(seen, last_safe_head)
+            return last_safe_head, seen
+
+        replayed = self._replay(seen)
+        if replayed is not None:
+            last_safe_head = replayed
+        return last_safe_head, seen
+
+    def _replay(self, seen: CompactDedup) -> Optional[int]:
+        """Apply journal records of the current generation to seen, return the last recorded head"""
+        data = b""
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        if len(data) < _JOURNAL.size or _JOURNAL.unpack_from(data, 0) != (b"CKJL", 1, self.generation):
+            # Missing, or left over from before the last compaction: start a journal of this generation
+            _fsync_write(self.journal_path, _JOURNAL.pack(b"CKJL", 1, self.generation))
+            return None
+        head: Optional[int] = None
+        pos = _JOURNAL.size
+        while pos + _RECORD.size <= len(data):
+            crc, n, h = _RECORD.unpack_from(data, pos)
+            end = pos + _RECORD.size + n * self.key_size
+            if end > len(data) or zlib.crc32(data[pos + 4:end]) != crc:
+                break
+            body = memoryview(data)[pos + _RECORD.size:end]
+            for i in range(n):
+                seen.add(body[i * self.key_size:(i + 1) * self.key_size])
+            head = h - 1 if h else None
+            pos = end
+            self._appends += 1
+        if pos != len(data):
+            print(f"[state] dropped torn journal tail ({len(data) - pos} bytes)")
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(pos)
+        return head
+
+    def append(self, new_keys: Iterable, last_safe_head: Optional[int]) -> None:
+        """Durably record one round: keys seen for the first time and the new last_safe_head"""
+        keys = b"".join(_raw(k) for k in new_keys)
+        n = len(keys) // self.key_size
+        body = struct.pack(">IQ", n, 0 if last_safe_head is None else last_safe_head + 1) + keys
+        if not os.path.exists(self.journal_path):
+            _fsync_write(self.journal_path, _JOURNAL.pack(b"CKJL", 1, self.generation))
+        with open(self.journal_path, "ab") as f:
+            f.write(struct.pack(">I", zlib.crc32(body)) + body)
+            f.flush()
+            os.fsync(f.fileno())
+        self._appends += 1
+
+    def needs_compaction(self) -> bool:
+        return self._appends >= self.compact_every
+
+    def compact(self, seen: CompactDedup, last_safe_head: Optional[int]) -> None:
+        """Write a full snapshot, then start an empty journal of the next generation"""
+        gen = self.generation + 1
+        head = 0 if last_safe_head is None else last_safe_head + 1
+        _fsync_write(self.snap_path, _SNAP.pack(b"CKST", 1, gen, head) + seen.to_bytes())
+        _fsync_write(self.journal_path, _JOURNAL.pack(b"CKJL", 1, gen))
+        self.generation = gen
+        self._appends = 0
+
+# End of file
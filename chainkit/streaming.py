@@ -0,0 +1,231 @@
+"""
+Reorg-aware streaming at the chain head (no confirmation delay).
+- Every new block is processed once, as soon as it is seen; its (number, hash, results) go to a ring buffer of `reorg_depth` blocks
+- A reorg is detected by a parent hash mismatch, by logs of another block hash than the header, or by `removed: true` logs
+- On a reorg the ring is walked back to the fork point: only the dropped blocks are handed to `on_rollback`,
+  then the new branch is processed and its results emitted again
+- Blocks leaving the ring are treated as final (pool index updates)
+- With store_tx_analyze, rows of the dropped blocks are retracted from the sink (SQLite / PostgreSQL) before the new
+  branch is stored
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+from collections import deque
+from web3 import Web3
+import time
+
+from .runner import Runner
+from .tx_tracker import fetch_many, get_sink
+
+class HeadRunner(Runner):
+    """
+    Runner following the head block by block, reorgs are rolled back instead of waited for.
+    - reorg_depth: blocks kept in the ring buffer, deeper reorgs are reported and resumed from the oldest kept block
+    - sink: callable(results) called once per round with the results of the new blocks
+    - on_rollback: callable(blocks) with the dropped ring entries {"number", "hash", "parent_hash", "results"}, oldest first
+    - confirmations defaults to 0, sleep_secs to 1s; window (or the scheduler span) caps the blocks processed per round while catching up
+    """
+    def __init__(self, w3: Web3, reorg_depth: int=64, sink: Optional[Callable[[List[Dict[str, Any]]], None]]=None,
+                 on_rollback: Optional[Callable[[List[Dict[str, Any]]], None]]=None, **kwargs):
+        kwargs.setdefault("confirmations", 0)
+        kwargs.setdefault("sleep_secs", 1.0)
+        super().__init__(w3, **kwargs)
+        if self.store_tx_analyze and not get_sink().can_retract:
+            raise ValueError(f"HeadRunner with store_tx_analyze needs a sink able to retract reorged blocks, not {type(get_sink()).__name__}")
+        self.ring: deque = deque(maxlen=max(1, int(reorg_depth)))
+        self.sink = sink
+        self.on_rollback = on_rollback or self._print_rollback
+        self.reorgs = 0
+        self.rolled_back_blocks = 0
+
+    @staticmethod
+    def _print_rollback(blocks: List[Dict[str, Any]]) -> None:
+        n = sum(len(b["results"]) for b in blocks)
+        print(f"[head] reorg: rolled back blocks [{blocks[0]['number']},{blocks[-1]['number']}], {n} results retracted")
+
+    def _headers(self, b0: int, b1: int) -> List[Dict[str, Any]]:
+        """Headers of [b0, b1] in one JSON-RPC batch, cut at the first block missing or not chained to the previous one"""
+        blocks = [t[0] for t in fetch_many(self.w3, list(range(b0, b1 + 1)), batch_size=self.batch_size, methods=("get_block",))]
+        out: List[Dict[str, Any]] = []
+        for block in blocks:
+            if block is None or (out and block["parentHash"] != out[-1]["hash"]):
+                break  # head moved while fetching, the rest is picked up next round
+            out.append({"number": block["number"], "hash": bytes(block["hash"]), "parent_hash": bytes(block["parentHash"]), "results": []})
+        return out
+
+    def _rollback(self) -> int:
+        """Drop the ring blocks no longer canonical, hand them to on_rollback, return the first block to process again"""
+        dropped: List[Dict[str, Any]] = []
+        while self.ring:
+            ref = self.ring[-1]
+            block = self.w3.eth.get_block(ref["number"])
+            if block is not None and bytes(block["hash"]) == ref["hash"]:
+                break
+            dropped.append(self.ring.pop())
+        if not self.ring:
+            print(f"[head] reorg deeper than the ring ({self.ring.maxlen} blocks), resuming from the oldest kept block")
+        dropped.reverse()
+        if dropped:
+            self.reorgs += 1
+            self.rolled_back_blocks += len(dropped)
+            if self.store_tx_analyze:
+                get_sink().retract_blocks(dropped[0]["number"], dropped[-1]["number"])
+            self.on_rollback(dropped)
+            self.last_safe_head = dropped[0]["number"] - 1
+            self._save_state()
+            return dropped[0]["number"]
+        return self.ring[-1]["number"] + 1
+
+    def _span(self, lag: int) -> int:
+        return self.window if self.scheduler is None else self.scheduler.span_for(lag)
+
+    def _next_block(self, head: int) -> int:
+        if self.ring:
+            return self.ring[-1]["number"] + 1
+        if self.last_safe_head is not None:
+            return self.last_safe_head + 1
+        return max(0, head - self.window + 1)
+
+    def proceed(self) -> int:
+        head = self._safe_head()
+        self.safe_seen = head
+        b0 = self._next_block(head)
+        if b0 > head:
+            return 0
+        headers = self._headers(b0, min(head, b0 + self._span(head - b0 + 1) - 1))
+        if headers and self.ring and headers[0]["parent_hash"] != self.ring[-1]["hash"]:
+            b0 = self._rollback()
+            headers = self._headers(b0, min(head, b0 + self._span(head - b0 + 1) - 1))
+        if not headers:
+            return 0
+        b1 = headers[-1]["number"]
+
+        logs = self._collect(b0, b1)
+        by_number = {h["number"]: h for h in headers}
+        for log in logs:
+            ref = by_number.get(log["blockNumber"])
+            if ref is None or log.get("removed") or bytes(log["blockHash"]) != ref["hash"]:
+                # Logs of another branch: keep the blocks before it, the rest is checked again next round
+                b1 = log["blockNumber"] - 1
+                break
+        headers = [h for h in headers if h["number"] <= b1]
+        if not headers:
+            return 0
+        logs = [log for log in logs if log["blockNumber"] <= b1]
+
+        by_block = self._group_by_block(logs)
+        out = self._process(logs, by_block, [h for hashes in by_block.values() for h in hashes])
+        for r in out:
+            by_number[r["block_number"]]["results"].append(r)
+        numbers = [b["number"] for b in self.ring] + [h["number"] for h in headers]
+        evicted = numbers[:max(0, len(numbers) - self.ring.maxlen)]
+        self.ring.extend(headers)
+        if evicted:
+            self._update_pool_index(evicted[0], evicted[-1])  # one scan over the blocks leaving the ring
+        if self.sink is not None and out:
+            self.sink(out)
+
+        self.last_safe_head = b1
+        self._save_state()
+        print(f"[head] blocks [{b0},{b1}] processed={len(out)}")
+        return len(out)
+
+    def run_loop(self) -> None:
+        print(f"[head] loop start: reorg_depth={self.ring.maxlen}, conf={self.confirmations}, interval={self.sleep_secs}s")
+        try:
+            while True:
+                t0, error = time.monotonic(), False
+                try:
+                    self.proceed()
+                except Exception as e:
+                    error = True
+                    print(f"[head] step error: {e}")
+                time.sleep(self._pause(time.monotonic() - t0, error))
+        except KeyboardInterrupt:
+            print("[head] stopped")
+
+def _test_head_runner() -> None:
+    """Offline check against a fake chain: head processing, 2-block reorg rolled back, re-emitted and retracted from the sink, stale logs"""
+    import os, sqlite3, tempfile
+    from .fake_node import FakeNode
+    from .decoders import sig_topic
+    from .sink import SQLiteSink
+    from .tx_tracker import set_sink
+
+    swap = sig_topic("Swap(address,uint256,uint256,uint256,uint256,address)")
+    pair = "0x" + "a1" * 20
+    word = lambda x: "0x" + x.to_bytes(32, "big").hex()
+
+    class Chain:
+        def __init__(self):
+            self.blocks: List[Dict[str, Any]] = []
+            self.stale_logs = False
+            for _ in range(10):
+                self.mine(fork=0)
+
+        def mine(self, fork: int) -> None:
+            n = len(self.blocks)
+            parent = self.blocks[-1]["hash"] if self.blocks else word(0)
+            self.blocks.append({"number": n, "hash": word((fork << 32) + n + 1), "parentHash": parent, "fork": fork})
+
+        def reorg(self, depth: int, fork: int) -> None:
+            del self.blocks[-depth:]
+            for _ in range(depth + 1):
+                self.mine(fork)
+
+        def log(self, b: Dict[str, Any]) -> Dict[str, Any]:
+            tx = word((b["fork"] << 40) + b["number"])
+            return {"address": pair, "topics": [swap, word(1), word(2)], "data": "0x" + "00" * 96 + f"{b['number']:064x}",
+                    "blockNumber": hex(b["number"]), "blockHash": word(999) if self.stale_logs else b["hash"],
+                    "transactionHash": tx, "transactionIndex": "0x0", "logIndex": "0x0", "removed": False}
+
+        def get_block(self, p):
+            n = int(p[0], 16)
+            if n >= len(self.blocks):
+                return None
+            b = self.blocks[n]
+            return {"number": hex(n), "hash": b["hash"], "parentHash": b["parentHash"], "timestamp": hex(n * 3),
+                    "transactions": [], "logsBloom": "0x" + "00" * 256, "miner": "0x" + "00" * 20, "gasLimit": "0x0",
+                    "gasUsed": "0x0", "difficulty": "0x0", "extraData": "0x", "size": "0x0"}
+
+        def get_logs(self, p):
+            b0, b1 = int(p[0]["fromBlock"], 16), int(p[0]["toBlock"], 16)
+            return [self.log(b) for b in self.blocks[b0:b1 + 1]]
+
+    chain = Chain()
+    emitted: List[Dict[str, Any]] = []
+    rolled: List[List[Dict[str, Any]]] = []
+    handlers = {"eth_chainId": lambda p: "0x38", "eth_blockNumber": lambda p: hex(len(chain.blocks) - 1),
+                "eth_getBlockByNumber": chain.get_block, "eth_getLogs": chain.get_logs}
+    with FakeNode(handlers) as node, tempfile.TemporaryDirectory() as d:
+        db = os.path.join(d, "events.db")
+        store = SQLiteSink(db)
+        set_sink(store)
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        runner = HeadRunner(w3, window=5, reorg_depth=8, log_only=True, watchlist=[pair], sink=emitted.extend, on_rollback=rolled.append,
+                            store_tx_analyze=True)
+        assert runner.proceed() == 5 and runner.last_safe_head == 9  # starts right at the head
+        chain.mine(0)
+        assert runner.proceed() == 1 and runner.last_safe_head == 10
+
+        chain.reorg(2, fork=1)  # blocks 9, 10 replaced, 11 mined on the new branch
+        assert runner.proceed() == 3
+        assert [b["number"] for b in rolled[0]] == [9, 10] and all(r["block_number"] in (9, 10) for b in rolled[0] for r in b["results"])
+        assert [r["block_number"] for r in emitted[-3:]] == [9, 10, 11] and runner.reorgs == 1
+        assert emitted[-1]["tx_hash"] == word((1 << 40) + 11)
+        rows = sqlite3.connect(db).execute("SELECT block_number, tx_hash FROM events WHERE block_number >= 9 ORDER BY block_number").fetchall()
+        assert rows == [(b, word((1 << 40) + b)) for b in (9, 10, 11)], rows  # orphaned rows of blocks 9, 10 retracted
+
+        chain.stale_logs = True  # logs answered from another branch than the headers: nothing processed yet
+        chain.mine(1)
+        assert runner.proceed() == 0 and runner.last_safe_head == 11
+        chain.stale_logs = False
+        assert runner.proceed() == 1 and runner.last_safe_head == 12 and len(runner.ring) == 8 and runner.reorgs == 1
+        set_sink(None)
+        store.close()
+    print("[head] head processing, rollback and re-emission OK")
+
+if __name__ == "__main__":
+    _test_head_runner()
+
+# End of file
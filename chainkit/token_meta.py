@@ -0,0 +1,258 @@
+"""
+Token metadata (decimals / symbol / name) service.
+- Misses are resolved with one Multicall3 aggregate3 round (3 calls per token, chunked); a chunk failing on the
+  transport only loses its own tokens, tokens whose calls revert / exhaust the gas are isolated by aggregate3
+- In-memory LRU in front of a SQLite store: restarts start warm, resolved tokens are never asked again
+- Negative cache: a token without a valid decimals() is remembered as not ERC20 for `negative_ttl` seconds
+- enrich_events(): events carry "normalized" amounts (ERC20 Transfer / Approval, WBNB Deposit / Withdrawal),
+  exact Decimals: a float keeps ~16 digits, uint256 amounts with 18 decimals need up to 78
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+from collections import OrderedDict
+from decimal import Decimal
+from eth_abi import decode
+from web3 import Web3
+import sqlite3, threading, time
+
+from .decoders import fn_selector
+from .multicall import aggregate3, MULTICALL_CHUNK
+
+DECIMALS, SYMBOL, NAME = fn_selector("decimals()"), fn_selector("symbol()"), fn_selector("name()")
+
+def scale(amount: int, decimals: int) -> Decimal:
+    """amount / 10 ** decimals, exact (built from the digits: Decimal arithmetic would round to the context precision)"""
+    return Decimal(f"{int(amount)}e{-int(decimals)}")
+
+# event type -> amount args, in units of the emitting token contract
+NORMALIZED_AMOUNTS = {
+    "erc20_transfer": ("value",),
+    "erc20_approval": ("value",),
+    "wrap_deposit": ("wad",),
+    "wrap_withdrawal": ("wad",),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_meta (
+    address TEXT PRIMARY KEY, ok INTEGER NOT NULL, decimals INTEGER, symbol TEXT, name TEXT, checked_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+def _decode_text(ret: bytes) -> Optional[str]:
+    """ABI string, or the bytes32 some old tokens (MKR style) return"""
+    if len(ret) == 32:
+        return ret.rstrip(b"\0").decode("utf-8", "replace")
+    try:
+        return decode(["string"], ret)[0]
+    except Exception:
+        return None
+
+def _decode_decimals(ret: bytes) -> Optional[int]:
+    if len(ret) < 32:
+        return None
+    v = int.from_bytes(ret[:32], "big")
+    return v if v <= 255 else None
+
+class TokenMetadata:
+    def __init__(self, w3: Web3, path: Optional[str]="token_meta.db", capacity: int=50000, negative_ttl: float=86400.0, chunk_size: int=MULTICALL_CHUNK):
+        self.w3 = w3
+        self.capacity = int(capacity)
+        self.negative_ttl = float(negative_ttl)
+        self.chunk_size = int(chunk_size)
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rpc_rounds = 0  # aggregate3 rounds sent so far
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(_SCHEMA)
+
+    def _remember(self, addr: str, meta: Dict[str, Any]) -> None:
+        self._lru[addr] = meta
+        self._lru.move_to_end(addr)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def _fresh(self, meta: Dict[str, Any], now: float) -> bool:
+        return meta["ok"] or now - meta["checked_at"] < self.negative_ttl
+
+    def _from_disk(self, addrs: List[str]) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        if self.conn is None or not addrs:
+            return out
+        for i in range(0, len(addrs), 500):
+            chunk = addrs[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT address, ok, decimals, symbol, name, checked_at FROM token_meta WHERE address IN ({','.join('?' * len(chunk))})", chunk)
+            for a, ok, dec, sym, name, t in rows:
+                out[a] = {"ok": bool(ok), "decimals": dec, "symbol": sym, "name": name, "checked_at": t}
+        return out
+
+    def _fetch(self, addrs: List[str]) -> Dict[str, Dict[str, Any]]:
+        """One aggregate3 round for decimals / symbol / name of every address, chunk by chunk"""
+        self.rpc_rounds += 1
+        per_chunk = max(1, self.chunk_size // 3)
+        out: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(addrs), per_chunk):
+            group = addrs[i:i + per_chunk]
+            try:
+                results = aggregate3(self.w3, [(a, sel) for a in group for sel in (DECIMALS, SYMBOL, NAME)], chunk_size=3 * per_chunk)
+            except Exception as e:
+                # Transient RPC failure: the tokens of this chunk are not cached, asked again next time
+                print(f"[token_meta] multicall failed for {len(group)} tokens: {e}")
+                continue
+            now = time.time()
+            for j, a in enumerate(group):
+                (ok_d, r_d), (ok_s, r_s), (ok_n, r_n) = results[3 * j:3 * j + 3]
+                decimals = _decode_decimals(r_d) if ok_d else None
+                out[a] = {
+                    "ok": decimals is not None,
+                    "decimals": decimals,
+                    "symbol": _decode_text(r_s) if ok_s and decimals is not None else None,
+                    "name": _decode_text(r_n) if ok_n and decimals is not None else None,
+                    "checked_at": now,
+                }
+        return out
+
+    def get_many(self, tokens: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        {address (lowercase): {"decimals", "symbol", "name"} or None when not an ERC20}
+        Memory first, then disk, then one Multicall round for what is left.
+        """
+        addrs = list(dict.fromkeys(t.lower() for t in tokens))
+        now = time.time()
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            missing = []
+            for a in addrs:
+                meta = self._lru.get(a)
+                if meta is not None and self._fresh(meta, now):
+                    self._lru.move_to_end(a)
+                    found[a] = meta
+                else:
+                    missing.append(a)
+            for a, meta in self._from_disk(missing).items():
+                if self._fresh(meta, now):
+                    self._remember(a, meta)
+                    found[a] = meta
+            missing = [a for a in missing if a not in found]
+
+        if missing:
+            fetched = self._fetch(missing)
+            with self._lock:
+                for a, meta in fetched.items():
+                    self._remember(a, meta)
+                    found[a] = meta
+                if self.conn is not None and fetched:
+                    with self.conn:
+                        self.conn.executemany(
+                            "INSERT OR REPLACE INTO token_meta (address, ok, decimals, symbol, name, checked_at) VALUES (?,?,?,?,?,?)",
+                            [(a, int(m["ok"]), m["decimals"], m["symbol"], m["name"], m["checked_at"]) for a, m in fetched.items()])
+
+        return {a: ({k: found[a][k] for k in ("decimals", "symbol", "name")} if a in found and found[a]["ok"] else None)
+                for a in addrs}
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([token])[token.lower()]
+
+    def normalize(self, token: str, amount: int) -> Optional[Decimal]:
+        """Raw integer amount in token units, None for unknown / non ERC20 tokens"""
+        meta = self.get(token)
+        return None if meta is None else scale(amount, meta["decimals"])
+
+    def enrich_events(self, events: List[Dict[str, Any]]) -> None:
+        """
+        Add ev["normalized"] = {"token", "symbol", <amount arg>: Decimal} in place, one metadata lookup for all events.
+        Event dicts only (lazy EventRecord are read-only).
+        """
+        todo = [ev for ev in events if isinstance(ev, dict) and ev.get("type") in NORMALIZED_AMOUNTS]
+        metas = self.get_many(ev["contract"] for ev in todo)
+        for ev in todo:
+            token = ev["contract"].lower()
+            meta = metas.get(token)
+            if meta is None:
+                continue
+            norm = {"token": token, "symbol": meta["symbol"]}
+            for arg in NORMALIZED_AMOUNTS[ev["type"]]:
+                norm[arg] = scale(ev["args"][arg], meta["decimals"])
+            ev["normalized"] = norm
+
+    def enrich(self, results: Iterable[Dict[str, Any]]) -> None:
+        """enrich_events over `analyze_tx`-shaped results"""
+        self.enrich_events([ev for r in results for ev in r["events"]])
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+
+def _test_token_meta() -> None:
+    """Offline check against a fake node answering aggregate3: batching, LRU, disk warm start, negative cache"""
+    import os, tempfile
+    from eth_abi import encode
+    from .fake_node import FakeNode, RPCError
+    from .multicall import AGGREGATE3
+
+    tokens = {
+        "0x" + "11" * 20: (18, encode(["string"], ["AAA"]), encode(["string"], ["Token A"])),
+        "0x" + "22" * 20: (6, b"MKR".ljust(32, b"\0"), b"Maker".ljust(32, b"\0")),  # bytes32 text
+    }
+    not_token = "0x" + "33" * 20
+    gas_eater = "0x" + "44" * 20  # symbol() burns all the gas: the whole aggregate3 fails
+    flaky = {"0x" + "55" * 20: 1}  # first eth_call containing it fails on the transport
+    tokens["0x" + "55" * 20] = (8, encode(["string"], ["EEE"]), encode(["string"], ["Token E"]))
+    tokens[gas_eater] = (18, b"", b"")
+
+    def eth_call(params):
+        data = bytes.fromhex(params[0]["data"][2:])
+        assert data[:4] == AGGREGATE3
+        calls = decode(["(address,bool,bytes)[]"], data[4:])[0]
+        targets = {target.lower() for target, _, _ in calls}
+        for a in targets & set(flaky):
+            if flaky[a] > 0:
+                flaky[a] -= 1
+                raise RPCError(-32603, "upstream connection reset")
+        if any(t == gas_eater and c[:4] == SYMBOL for t, _, c in ((x.lower(), y, z) for x, y, z in calls)):
+            raise RPCError(-32000, "out of gas")
+        out = []
+        for target, _, calldata in calls:
+            t = tokens.get(target.lower())
+            if t is None:
+                out.append((False, b""))
+                continue
+            dec, sym, name = t
+            out.append((True, {DECIMALS: dec.to_bytes(32, "big"), SYMBOL: sym, NAME: name}[calldata[:4]]))
+        return "0x" + encode(["(bool,bytes)[]"], [out]).hex()
+
+    with FakeNode({"eth_call": eth_call, "eth_chainId": lambda p: "0x38"}) as node, tempfile.TemporaryDirectory() as d:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        path = os.path.join(d, "meta.db")
+        tm = TokenMetadata(w3, path=path, capacity=2, chunk_size=6)  # 2 tokens per aggregate3
+        got = tm.get_many(["0x" + "11" * 20, "0x" + "22" * 20, not_token, gas_eater, "0x" + "55" * 20])
+        assert got["0x" + "11" * 20] == {"decimals": 18, "symbol": "AAA", "name": "Token A"}
+        assert got["0x" + "22" * 20]["symbol"] == "MKR" and got[not_token] is None
+        assert got[gas_eater] == {"decimals": 18, "symbol": None, "name": None}  # isolated, the rest of its chunk resolved
+        assert got["0x" + "55" * 20] is None and tm.rpc_rounds == 1  # its chunk failed on the transport, not cached
+        eth_calls = lambda: sum(1 for m, _ in node.calls if m == "eth_call")
+        before = eth_calls()
+        got = tm.get_many(list(tokens) + [not_token])  # LRU (capacity 2) + disk, negative cached, the flaky token asked again
+        assert got["0x" + "55" * 20]["symbol"] == "EEE" and eth_calls() == before + 1
+        ev = {"type": "erc20_transfer", "contract": "0x" + "22" * 20, "args": {"value": 2_500_000}}
+        tm.enrich_events([ev])
+        assert ev["normalized"] == {"token": "0x" + "22" * 20, "symbol": "MKR", "value": Decimal("2.5")}
+        big = 2 ** 256 - 1  # 78 digits, no digit lost
+        assert str(tm.normalize("0x" + "11" * 20, big)) == str(big)[:-18] + "." + str(big)[-18:]
+        tm.close()
+
+        warm = TokenMetadata(w3, path=path)
+        assert warm.get("0x" + "11" * 20)["decimals"] == 18 and warm.rpc_rounds == 0
+        warm.negative_ttl = 0  # expired negative entry: asked again
+        warm.get(not_token)
+        assert warm.rpc_rounds == 1
+        warm.close()
+    print("[token_meta] multicall batching, failure isolation, LRU, disk and negative cache OK")
+
+if __name__ == "__main__":
+    _test_token_meta()
+
+# End of file
@@ -1,82 +1,583 @@
 """Transaction Tracker"""
 
 from web3 import Web3
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List, Mapping, Optional
+from contextlib import nullcontext
+import asyncio, atexit, os
 
 from .decoders import to_hexstr, to_bytes
-from .registry_event import build_registry, make_unknown_raw
+from .registry_event import HexTopics, build_registry, check_layout, make_unknown_raw, raw_topic_registry
+from .collector import provider_key
+from .sink import EventSink, sink_from_url
+from .records import EventRecord
 
-REGISTRY = build_registry()
+# Built on first use, not at import: EXTRA_ABI_PATHS set by a .env loaded in the entry point (load_dotenv) is read
+REGISTRY: Optional[Mapping[str, Mapping[str, Any]]] = None
+# Same entries keyed by raw 32-byte topic0, used on the decode path
+REGISTRY_BY_TOPIC: Optional[Dict[bytes, Mapping[str, Any]]] = None
+
+def registry_from_env() -> Mapping[str, Mapping[str, Any]]:
+    """Builtin handlers + the ABI JSON files (comma separated) of EXTRA_ABI_PATHS, see registry_event.load_extras"""
+    return build_registry([p.strip() for p in os.getenv("EXTRA_ABI_PATHS", "").split(",") if p.strip()])
+
+def set_registry(registry) -> None:
+    """Decode with another registry (e.g. build_registry(extra_paths)); None: rebuilt from the environment on next use"""
+    global REGISTRY, REGISTRY_BY_TOPIC
+    REGISTRY = registry
+    REGISTRY_BY_TOPIC = None if registry is None else raw_topic_registry(registry)
+
+def get_registry() -> Mapping[str, Mapping[str, Any]]:
+    if REGISTRY is None:
+        set_registry(registry_from_env())
+    return REGISTRY
+
+def registry_by_topic() -> Dict[bytes, Mapping[str, Any]]:
+    if REGISTRY_BY_TOPIC is None:
+        set_registry(registry_from_env())
+    return REGISTRY_BY_TOPIC
+
+# Largest JSON-RPC batch (number of calls) accepted so far by each provider
+BATCH_CAPS: Dict[str, int] = {}
+
+# Fragments seen in batch size rejections (JSON-RPC error or HTTP status of the whole batch)
+BATCH_LIMIT_MARKERS = (
+    "batch size", "batch limit", "batch too large", "too many requests in batch", "max batch",
+    "request entity too large", "payload too large", "413 client error",
+)
+
+class BatchSizeError(ValueError):
+    """The provider answered only part of a batch"""
+
+def is_batch_limit_error(e: Exception) -> bool:
+    """Check if an exception is a rejection of the batch size rather than a failure of its calls"""
+    if isinstance(e, BatchSizeError):
+        return True
+    msg = str(e).lower()
+    return any(m in msg for m in BATCH_LIMIT_MARKERS)
+
+# Replies of providers without a JSON-RPC method (geth: "the method ... does not exist/is not available")
+METHOD_MISSING_PHRASES = ("not found", "does not exist", "not available", "not supported", "unsupported")
+
+def is_method_missing(e: Exception) -> bool:
+    """Check if an exception says the provider lacks the called method (-32601), not that the call failed"""
+    error = (getattr(e, "rpc_response", None) or {}).get("error")
+    if isinstance(error, dict) and error.get("code") == -32601:
+        return True
+    msg = str(e).lower()
+    return "-32601" in msg or ("method" in msg and any(p in msg for p in METHOD_MISSING_PHRASES))
 
 def check_tx_success(w3: Web3, tx_hash: str) -> bool:
     """Check if a transaction was successful by its hash."""
     receipt = w3.eth.get_transaction_receipt(tx_hash)
     return receipt["status"] == 1
 
-def analyze_tx(w3: Web3, tx_hash: str, save_data: bool=False) -> Dict[str, Any]:
-    """Analyze a transaction by its hash, decode events and record unregistered events. Can save database if necessary."""
-    tx = w3.eth.get_transaction(tx_hash)
-    receipt = w3.eth.get_transaction_receipt(tx_hash)
-    result = {
-        "tx_hash": to_hexstr(receipt["transactionHash"]).lower(),
-        "from": tx["from"].lower(),
-        "block_number": receipt["blockNumber"],
-        "gas_used": receipt["gasUsed"],
-        "status": "success" if receipt["status"] == 1 else "failed",
-        "events": [],
-        "unknown_events_raw": [],
-    }
-
-    for log in sorted(receipt["logs"], key=lambda x: x["logIndex"]):
-        topics_hex = [to_hexstr(t).lower() for t in log.get("topics", [])]
-        data_bytes = to_bytes(log.get("data", "0x"))
-        if not topics_hex:
+def _decode_logs_into(result: Dict[str, Any], tx: Optional[Dict[str, Any]], receipt: Dict[str, Any], logs: Iterable[Dict[str, Any]], lazy: bool=False) -> None:
+    """
+    Run the REGISTRY handlers over logs of one transaction, appending to result["events"] / result["unknown_events_raw"].
+    lazy: append EventRecord (raw log kept, args decoded on access) instead of event dicts
+    """
+    # Raw topic0 lookup, topics turned to hex only when a handler reads them, tx hash hex once per tx
+    tx_hash_raw = to_bytes(receipt["transactionHash"])
+    tx_hash = "0x" + tx_hash_raw.hex()
+    by_topic = REGISTRY_BY_TOPIC if REGISTRY_BY_TOPIC is not None else registry_by_topic()
+    for log in sorted(logs, key=lambda x: x["logIndex"]):
+        topics = log.get("topics") or []
+        if not topics:
             result["unknown_events_raw"].append(make_unknown_raw(tx, receipt, log))
             continue
 
-        topic0 = topics_hex[0]
-        meta = REGISTRY.get(topic0)
+        topic0 = topics[0]
+        meta = by_topic.get(topic0 if isinstance(topic0, bytes) else to_bytes(topic0))
         if meta is None:
             result["unknown_events_raw"].append(make_unknown_raw(tx, receipt, log))
             continue
 
+        # One plain bytes object per log: slicing HexBytes builds HexBytes objects, and a memoryview slice
+        # (~180 B) costs more than the 32-byte copy it saves on each field (see _bench_decode_path)
+        data = log.get("data", b"")
+        data_bytes = bytes(data) if isinstance(data, (bytes, bytearray)) else to_bytes(data)
+        error = check_layout(meta, len(topics), len(data_bytes))
+        if error is not None:
+            raw = make_unknown_raw(tx, receipt, log)
+            raw["parse_error"] = error
+            result["unknown_events_raw"].append(raw)
+            continue
+
         handler = meta["handler"]
+        if lazy:
+            layout = meta.get("layout")
+            if layout is None or not layout[2]:
+                # Dynamic / generic args (or no layout): decoded once here so failures go to unknown like the eager path
+                try:
+                    handler(log, HexTopics(topics), data_bytes)
+                except Exception as e:
+                    raw = make_unknown_raw(tx, receipt, log)
+                    raw["parse_error"] = str(e)
+                    result["unknown_events_raw"].append(raw)
+                    continue
+            result["events"].append(EventRecord(
+                meta, bytes.fromhex(log["address"][2:]), b"".join(t if isinstance(t, bytes) else to_bytes(t) for t in topics),
+                data_bytes, receipt["blockNumber"], tx_hash_raw, log["logIndex"]))
+            continue
+
         try:
-            ev = handler(log, topics_hex, data_bytes)
-            ev.update({
-                "block_number": receipt["blockNumber"],
-                "tx_hash": to_hexstr(receipt["transactionHash"]).lower(),
-                "log_index": log["logIndex"],
-            })
+            ev = handler(log, HexTopics(topics), data_bytes)
+            ev["block_number"] = receipt["blockNumber"]
+            ev["tx_hash"] = tx_hash
+            ev["log_index"] = log["logIndex"]
             result["events"].append(ev)
         except Exception as e:
             raw = make_unknown_raw(tx, receipt, log)
             raw["parse_error"] = str(e)
             result["unknown_events_raw"].append(raw)
 
+def decode_receipt(tx: Dict[str, Any], receipt: Dict[str, Any], lazy: bool=False) -> Dict[str, Any]:
+    """Decode all logs of a receipt with the REGISTRY handlers. `tx` only needs the sender ("from"). lazy: see _decode_logs_into"""
+    result = {
+        "tx_hash": to_hexstr(receipt["transactionHash"]).lower(),
+        "from": tx["from"].lower(),
+        "block_number": receipt["blockNumber"],
+        "gas_used": receipt["gasUsed"],
+        "status": "success" if receipt["status"] == 1 else "failed",
+        "events": [],
+        "unknown_events_raw": [],
+    }
+    _decode_logs_into(result, tx, receipt, receipt["logs"], lazy=lazy)
+    return result
+
+def decode_logs(logs: Iterable[Dict[str, Any]], lazy: bool=False) -> List[Dict[str, Any]]:
+    """
+    Decode already collected logs (e.g. from `collect_tx_hashes`) without any RPC call.
+    - logs are grouped by transaction, results in (block, logIndex) order
+    - return `analyze_tx`-shaped results with "from", "gas_used" and "status" set to None,
+      see `fill_tx_details` to fetch them when needed
+    - only the given logs are decoded: with a topics filter, other events of the tx are absent
+    - lazy: events as compact EventRecord (see records.py), e.g. to hold a long backfill in memory
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for log in sorted(logs, key=lambda x: (x["blockNumber"], x["logIndex"])):
+        groups.setdefault(to_hexstr(log["transactionHash"]).lower(), []).append(log)
+
+    out = []
+    for tx_hash, group in groups.items():
+        result = {
+            "tx_hash": tx_hash,
+            "from": None,
+            "block_number": group[0]["blockNumber"],
+            "gas_used": None,
+            "status": None,
+            "events": [],
+            "unknown_events_raw": [],
+        }
+        # Logs carry blockNumber / blockHash / transactionHash / transactionIndex, as a receipt would
+        _decode_logs_into(result, None, group[0], group, lazy=lazy)
+        out.append(result)
+    return out
+
+def fill_tx_details(w3: Web3, results: Iterable[Dict[str, Any]], batch_size: int=100) -> None:
+    """Fetch "from", "gas_used" and "status" (receipts in JSON-RPC batches) for results of `decode_logs`, in place"""
+    missing = [r for r in results if r.get("status") is None]
+    if not missing:
+        return
+    receipts = fetch_receipts(w3, [r["tx_hash"] for r in missing], batch_size=batch_size)
+    for r, receipt in zip(missing, receipts):
+        r["from"] = receipt["from"].lower()
+        r["gas_used"] = receipt["gasUsed"]
+        r["status"] = "success" if receipt["status"] == 1 else "failed"
+
+def analyze_tx(w3: Web3, tx_hash: str, save_data: bool=False) -> Dict[str, Any]:
+    """Analyze a transaction by its hash, decode events and record unregistered events. Can save database if necessary."""
+    tx = w3.eth.get_transaction(tx_hash)
+    receipt = w3.eth.get_transaction_receipt(tx_hash)
+    result = decode_receipt(tx, receipt)
+
     if save_data:
         save_normalized_events(result["events"])
         save_unknown_events(result["unknown_events_raw"])
+        flush_events()
 
     return result
 
-def save_normalized_events(events: list) -> None:
+def fetch_block(w3: Web3, block_number: int, tx_hashes: Optional[Iterable[str]]=None) -> List[tuple]:
+    """
+    (tx, receipt) pairs of one block with 2 RPC calls in total:
+    eth_getBlockReceipts for all receipts, and one full block fetch for the senders.
+    - tx_hashes: only keep these transactions (default: every transaction of the block)
+    - pairs ordered by transaction index
+    - providers without eth_getBlockReceipts fall back to `fetch_many`; other errors are raised
+    """
+    selected = None if tx_hashes is None else [to_hexstr(h).lower() for h in tx_hashes]
+    wanted = None if selected is None else set(selected)
+    try:
+        receipts = w3.eth.get_block_receipts(block_number)
+    except Exception as e:
+        if wanted is None or not is_method_missing(e):
+            raise
+        print(f"[tx_tracker] eth_getBlockReceipts unavailable ({e}), fallback to per tx calls")
+        return fetch_many(w3, selected)
+
+    block = w3.eth.get_block(block_number, full_transactions=True)
+    txs = {to_hexstr(tx["hash"]).lower(): tx for tx in block["transactions"]}
+
+    out = []
+    for receipt in sorted(receipts, key=lambda x: x["transactionIndex"]):
+        h = to_hexstr(receipt["transactionHash"]).lower()
+        if wanted is not None and h not in wanted:
+            continue
+        tx = txs.get(h)
+        if tx is None:
+            # Block changed between both calls (reorg at head), use the single tx path
+            tx = w3.eth.get_transaction(h)
+        out.append((tx, receipt))
+    return out
+
+def analyze_block(w3: Web3, block_number: int, tx_hashes: Optional[Iterable[str]]=None, save_data: bool=False) -> List[Dict[str, Any]]:
+    """
+    Analyze transactions of one block with 2 RPC calls in total (see `fetch_block`).
+    - tx_hashes: only keep these transactions (default: every transaction of the block)
+    - return `analyze_tx`-shaped results, ordered by transaction index
+    """
+    out = []
+    for tx, receipt in fetch_block(w3, block_number, tx_hashes):
+        result = decode_receipt(tx, receipt)
+        if save_data:
+            save_normalized_events(result["events"])
+            save_unknown_events(result["unknown_events_raw"])
+        out.append(result)
+    if save_data:
+        flush_events()
+    return out
+
+async def _guarded(sem: Optional[asyncio.Semaphore], aw):
+    """Await `aw` holding one slot of `sem` (None: no limit)"""
+    async with sem if sem is not None else nullcontext():
+        return await aw
+
+async def async_analyze_tx(w3, tx_hash: str, save_data: bool=False, sem: Optional[asyncio.Semaphore]=None) -> Dict[str, Any]:
+    """
+    Same as `analyze_tx` for an AsyncWeb3 instance, both calls are sent concurrently.
+    - sem: taken once per RPC call, bounds the requests in flight across concurrent analyses
+    """
+    tx, receipt = await asyncio.gather(
+        _guarded(sem, w3.eth.get_transaction(tx_hash)),
+        _guarded(sem, w3.eth.get_transaction_receipt(tx_hash)),
+    )
+    result = decode_receipt(tx, receipt)
+
+    if save_data:
+        save_normalized_events(result["events"])
+        save_unknown_events(result["unknown_events_raw"])
+        flush_events()
+
+    return result
+
+TX_AND_RECEIPT = ("get_transaction", "get_transaction_receipt")
+
+def _fetch_batch(w3: Web3, tx_hashes: List[str], methods: tuple) -> List[tuple]:
+    """Call every `w3.eth` method of `methods` for each hash in a single JSON-RPC batch"""
+    n = len(methods)
+    with w3.batch_requests() as batch:
+        for h in tx_hashes:
+            for m in methods:
+                batch.add(getattr(w3.eth, m)(h))
+        responses = batch.execute()
+    if len(responses) != n * len(tx_hashes):
+        raise BatchSizeError(f"batch answered {len(responses)} of {n * len(tx_hashes)} calls")
+    return [tuple(responses[n * i:n * i + n]) for i in range(len(tx_hashes))]
+
+def fetch_many(w3: Web3, tx_hashes: Iterable[str], batch_size: int=100, methods: tuple=TX_AND_RECEIPT, retries: int=2) -> List[tuple]:
+    """
+    Fetch (tx, receipt) pairs, sending eth_getTransactionByHash / eth_getTransactionReceipt as JSON-RPC batches.
+    - batch_size: max number of calls per batch (len(methods) calls per tx)
+    - methods: `w3.eth` getters called for each hash, one tuple item each
+    - a batch rejected for its size (`is_batch_limit_error`) is halved and retried, the accepted size is remembered
+      per provider; at 1 tx per batch, fall back to plain calls
+    - other errors are retried `retries` times at the same size, then raised
+    - return tuples in input order
+    """
+    hashes = list(tx_hashes)
+    key = provider_key(w3)
+    n = len(methods)
+    size = max(1, min(int(batch_size), BATCH_CAPS.get(key, int(batch_size))) // n)
+
+    out: List[tuple] = []
+    i = failures = 0
+    while i < len(hashes):
+        chunk = hashes[i:i + size]
+        try:
+            if size == 1:
+                out.append(tuple(getattr(w3.eth, m)(chunk[0]) for m in methods))
+            else:
+                out.extend(_fetch_batch(w3, chunk, methods))
+        except Exception as e:
+            if size > 1 and is_batch_limit_error(e):
+                size = max(1, size // 2)
+                BATCH_CAPS[key] = n * size
+                print(f"[tx_tracker] batch of {n * len(chunk)} calls rejected ({e}), retry with {n * size}")
+                continue
+            failures += 1
+            if failures > retries:
+                raise
+            print(f"[tx_tracker] batch of {n * len(chunk)} calls failed ({e}), retry {failures}/{retries}")
+            continue
+        i += len(chunk)
+        failures = 0
+    return out
+
+def fetch_receipts(w3: Web3, tx_hashes: Iterable[str], batch_size: int=100) -> List[Dict[str, Any]]:
+    """Fetch receipts in JSON-RPC batches, in input order"""
+    return [t[0] for t in fetch_many(w3, tx_hashes, batch_size=batch_size, methods=("get_transaction_receipt",))]
+
+def analyze_many(w3: Web3, tx_hashes: Iterable[str], batch_size: int=100, save_data: bool=False) -> List[Dict[str, Any]]:
+    """
+    Analyze many transactions with JSON-RPC batches (see `fetch_many`).
+    Return `analyze_tx`-shaped results in input order.
+    """
+    out: List[Dict[str, Any]] = []
+    for tx, receipt in fetch_many(w3, tx_hashes, batch_size=batch_size):
+        result = decode_receipt(tx, receipt)
+        if save_data:
+            save_normalized_events(result["events"])
+            save_unknown_events(result["unknown_events_raw"])
+        out.append(result)
+    if save_data:
+        flush_events()
+    return out
+
+async def async_analyze_block(w3, block_number: int, tx_hashes: Optional[Iterable[str]]=None, save_data: bool=False, sem: Optional[asyncio.Semaphore]=None) -> List[Dict[str, Any]]:
+    """Same as `analyze_block` for an AsyncWeb3 instance, both block calls are sent concurrently (see `async_analyze_tx` for sem)"""
+    selected = None if tx_hashes is None else [to_hexstr(h).lower() for h in tx_hashes]
+    wanted = None if selected is None else set(selected)
+    receipts_call = _guarded(sem, w3.eth.get_block_receipts(block_number))
+    block_call = _guarded(sem, w3.eth.get_block(block_number, full_transactions=True))
+    receipts, block = await asyncio.gather(receipts_call, block_call, return_exceptions=True)
+    if isinstance(receipts, Exception):
+        if wanted is None or not is_method_missing(receipts):
+            raise receipts
+        print(f"[tx_tracker] eth_getBlockReceipts unavailable ({receipts}), fallback to analyze_tx")
+        return await async_analyze_many(w3, selected, save_data=save_data, sem=sem)
+    if isinstance(block, Exception):
+        raise block
+    txs = {to_hexstr(tx["hash"]).lower(): tx for tx in block["transactions"]}
+
+    out = []
+    for receipt in sorted(receipts, key=lambda x: x["transactionIndex"]):
+        h = to_hexstr(receipt["transactionHash"]).lower()
+        if wanted is not None and h not in wanted:
+            continue
+        tx = txs.get(h)
+        if tx is None:
+            tx = await _guarded(sem, w3.eth.get_transaction(h))
+        result = decode_receipt(tx, receipt)
+        if save_data:
+            save_normalized_events(result["events"])
+            save_unknown_events(result["unknown_events_raw"])
+        out.append(result)
+    if save_data:
+        flush_events()
+    return out
+
+async def _async_fetch_chunk(w3, chunk: List[str], methods: tuple, retries: int, sem: Optional[asyncio.Semaphore]) -> List[tuple]:
+    """One batch of `fetch_many`, split in halves while the provider rejects its size"""
+    n = len(methods)
+    failures = 0
+    while True:
+        try:
+            if len(chunk) == 1:
+                return [tuple(await asyncio.gather(*(_guarded(sem, getattr(w3.eth, m)(chunk[0])) for m in methods)))]
+            async with sem if sem is not None else nullcontext():
+                async with w3.batch_requests() as batch:
+                    for h in chunk:
+                        for m in methods:
+                            batch.add(getattr(w3.eth, m)(h))
+                    responses = await batch.async_execute()
+            if len(responses) != n * len(chunk):
+                raise BatchSizeError(f"batch answered {len(responses)} of {n * len(chunk)} calls")
+            return [tuple(responses[n * i:n * i + n]) for i in range(len(chunk))]
+        except Exception as e:
+            if len(chunk) > 1 and is_batch_limit_error(e):
+                half = len(chunk) // 2
+                key = provider_key(w3)
+                BATCH_CAPS[key] = min(BATCH_CAPS.get(key, n * half), n * half)
+                print(f"[tx_tracker] batch of {n * len(chunk)} calls rejected ({e}), retry with {n * half}")
+                parts = await asyncio.gather(*(_async_fetch_chunk(w3, part, methods, retries, sem) for part in (chunk[:half], chunk[half:])))
+                return parts[0] + parts[1]
+            failures += 1
+            if failures > retries:
+                raise
+            print(f"[tx_tracker] batch of {n * len(chunk)} calls failed ({e}), retry {failures}/{retries}")
+
+async def async_fetch_many(w3, tx_hashes: Iterable[str], batch_size: int=100, methods: tuple=TX_AND_RECEIPT, retries: int=2, sem: Optional[asyncio.Semaphore]=None) -> List[tuple]:
     """
-    TODO:
+    Same as `fetch_many` for an AsyncWeb3 instance, batches are sent concurrently.
+    - sem: taken once per HTTP request (a whole batch, or each plain call at 1 tx per batch)
     """
-    raise NotImplementedError
-    return
+    hashes = list(tx_hashes)
+    n = len(methods)
+    size = max(1, min(int(batch_size), BATCH_CAPS.get(provider_key(w3), int(batch_size))) // n)
+    parts = await asyncio.gather(*(_async_fetch_chunk(w3, hashes[i:i + size], methods, retries, sem) for i in range(0, len(hashes), size)))
+    return [t for part in parts for t in part]
+
+async def async_analyze_many(w3, tx_hashes: Iterable[str], batch_size: int=100, save_data: bool=False, sem: Optional[asyncio.Semaphore]=None) -> List[Dict[str, Any]]:
+    """Same as `analyze_many` for an AsyncWeb3 instance (see `async_fetch_many`)"""
+    out: List[Dict[str, Any]] = []
+    for tx, receipt in await async_fetch_many(w3, tx_hashes, batch_size=batch_size, sem=sem):
+        result = decode_receipt(tx, receipt)
+        if save_data:
+            save_normalized_events(result["events"])
+            save_unknown_events(result["unknown_events_raw"])
+        out.append(result)
+    if save_data:
+        flush_events()
+    return out
+
+_SINK: Optional[EventSink] = None
+
+def set_sink(sink: Optional[EventSink]) -> None:
+    """Use `sink` for save_normalized_events / save_unknown_events (None: back to the SINK_URL default)"""
+    global _SINK
+    _SINK = sink
+
+def get_sink() -> EventSink:
+    """Current sink, created on first use from the SINK_URL environment variable (default: sqlite:///chainkit.db)"""
+    global _SINK
+    if _SINK is None:
+        _SINK = sink_from_url(os.environ.get("SINK_URL", "sqlite:///chainkit.db"))
+    return _SINK
+
+def save_normalized_events(events: list) -> None:
+    """Buffer decoded events into the current sink (idempotent on tx_hash / log_index)"""
+    if events:
+        get_sink().add_events(events)
 
 def save_unknown_events(rows: list) -> None:
+    """Buffer unknown raw events into the current sink (idempotent on tx_hash / log_index)"""
+    if rows:
+        get_sink().add_unknown(rows)
+
+def flush_events() -> None:
+    """Write out everything buffered so far, e.g. before committing runner state"""
+    if _SINK is not None:
+        _SINK.flush()
+
+# Rows buffered by analyze_* / save_* calls outside a runner are written before the interpreter exits
+atexit.register(flush_events)
+
+def _test_analyze_many():
+    """Offline check of analyze_many against a local fake JSON-RPC node capping batches at 6 calls"""
+    from .decoders import sig_topic
+    from .fake_node import FakeNode
+
+    transfer = sig_topic("Transfer(address,address,uint256)")
+    def word(x: int) -> str:
+        return "0x" + x.to_bytes(32, "big").hex()
+    def tx_of(i: int) -> dict:
+        return {"hash": word(i), "from": "0x" + f"{i:040x}", "to": "0x" + "22" * 20, "blockNumber": hex(100 + i),
+                "blockHash": word(7), "transactionIndex": hex(i), "nonce": "0x0", "value": "0x0", "gas": "0x5208",
+                "gasPrice": "0x1", "input": "0x", "type": "0x0", "v": "0x1b", "r": word(1), "s": word(1)}
+    def receipt_of(i: int) -> dict:
+        log = {"address": "0x" + "ab" * 20, "topics": [transfer, word(i), word(2)], "data": word(i * 10),
+               "logIndex": hex(i), "blockNumber": hex(100 + i), "blockHash": word(7), "transactionHash": word(i),
+               "transactionIndex": hex(i), "removed": False}
+        return {"transactionHash": word(i), "blockNumber": hex(100 + i), "blockHash": word(7), "transactionIndex": hex(i),
+                "from": "0x" + f"{i:040x}", "to": "0x" + "22" * 20, "gasUsed": hex(21000 + i), "cumulativeGasUsed": "0x0",
+                "status": "0x1", "logs": [log], "logsBloom": "0x" + "00" * 256, "type": "0x0",
+                "effectiveGasPrice": "0x1", "contractAddress": None}
+    ids = {word(i): i for i in range(1, 12)}
+    handlers = {
+        "eth_chainId": lambda p: "0x38",
+        "eth_getTransactionByHash": lambda p: tx_of(ids[p[0]]),
+        "eth_getTransactionReceipt": lambda p: receipt_of(ids[p[0]]),
+    }
+    with FakeNode(handlers, max_batch=6) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        hashes = list(reversed(list(ids)))
+        expected = [analyze_tx(w3, h) for h in hashes]
+        node.http_requests = 0
+        got = analyze_many(w3, hashes, batch_size=20)
+        assert got == expected, "analyze_many differs from analyze_tx"
+        assert [r["tx_hash"] for r in got] == hashes
+        assert BATCH_CAPS[provider_key(w3)] <= 6
+        print(f"[tx_tracker] analyze_many ok: {len(hashes)} txs in {node.http_requests} http requests")
+
+
+def _bench_decode_path(n_logs: int=20000, repeat: int=3) -> Dict[str, Any]:
     """
-    TODO:
+    Micro-benchmark of the per-log decode path against the previous one (hex topics, hex registry keys),
+    on web3-shaped logs (HexBytes): time per log, and memory allocated but not kept (peak - retained) per log
     """
-    raise NotImplementedError
-    return
+    import random, timeit, tracemalloc
+    from hexbytes import HexBytes
+    from .decoders import sig_topic
+
+    def legacy(result, receipt, logs):
+        for log in sorted(logs, key=lambda x: x["logIndex"]):
+            topics_hex = [to_hexstr(t).lower() for t in log.get("topics", [])]
+            data_bytes = to_bytes(log.get("data", "0x"))
+            meta = get_registry().get(topics_hex[0])
+            if meta is None:
+                result["unknown_events_raw"].append(make_unknown_raw(None, receipt, log))
+                continue
+            ev = meta["handler"](log, topics_hex, data_bytes)
+            ev.update({
+                "block_number": receipt["blockNumber"],
+                "tx_hash": to_hexstr(receipt["transactionHash"]).lower(),
+                "log_index": log["logIndex"],
+            })
+            result["events"].append(ev)
+
+    rnd = random.Random(11)
+    word = lambda: rnd.getrandbits(96).to_bytes(32, "big")
+    addr = lambda: HexBytes(bytes(12) + rnd.randbytes(20))
+    shapes = [
+        ("Swap(address,uint256,uint256,uint256,uint256,address)", 2, 4),
+        ("Transfer(address,address,uint256)", 2, 1),
+        ("Sync(uint112,uint112)", 0, 2),
+        ("Swap(address,address,int256,int256,uint160,uint128,int24)", 2, 5),
+    ]
+    receipt = {"transactionHash": HexBytes(rnd.randbytes(32)), "blockNumber": 1, "blockHash": HexBytes(bytes(32)), "transactionIndex": 0}
+    logs = []
+    for i in range(n_logs):
+        sig, n_idx, n_words = shapes[i % len(shapes)]
+        logs.append({
+            "address": "0x" + rnd.randbytes(20).hex(), "logIndex": i,
+            "topics": [HexBytes(sig_topic(sig))] + [addr() for _ in range(n_idx)],
+            "data": HexBytes(b"".join(word() for _ in range(n_words))),
+        })
+
+    def run(fn, items):
+        result = {"events": [], "unknown_events_raw": []}
+        fn(result, receipt, items)
+        return result
+
+    new = lambda result, receipt, items: _decode_logs_into(result, None, receipt, items)
+    assert run(legacy, logs) == run(new, logs)
 
+    out: Dict[str, Any] = {"logs": n_logs}
+    for label, fn in (("legacy", legacy), ("zero_copy", new)):
+        best = min(timeit.repeat(lambda: run(fn, logs), number=1, repeat=repeat))
+        transient = []
+        for log in logs[:len(shapes)]:
+            run(fn, [log])  # warm up
+            tracemalloc.start()
+            kept = run(fn, [log])
+            cur, peak = tracemalloc.get_traced_memory()
+            del kept
+            tracemalloc.stop()
+            transient.append(peak - cur)
+        out[f"{label}_us_per_log"] = round(best / n_logs * 1e6, 2)
+        out[f"{label}_transient_bytes_per_log"] = round(sum(transient) / len(transient))
+    print(f"[tx_tracker] {out}")
+    return out
 
 if __name__ == "__main__":
     import sys, json, os
+    if sys.argv[1:] == ["--bench"]:
+        _bench_decode_path()
+        sys.exit(0)
+    if sys.argv[1:] == ["--test"]:
+        _test_analyze_many()
+        sys.exit(0)
     from dotenv import load_dotenv
     load_dotenv()
     RPC_URL = os.environ["RPC_URL"]
@@ -0,0 +1,240 @@
+"""
+Push-based runner over WebSocket (eth_subscribe newHeads / logs).
+- Each newHeads notification runs a round right away, with the window / confirmations / dedup / state logic of Runner
+- Logs pushed by the `logs` subscriptions are buffered per block and used instead of eth_getLogs
+  from the first newHeads notification of the connection on; `removed: true` logs are dropped from the buffer
+- A `removed: true` log of a block already processed rolls back like HeadRunner: rows of the blocks from there on are
+  retracted from the sink (store_tx_analyze), and these blocks are processed again, txs included in both branches too
+- The block of the latest newHeads (confirmations=0) is still read with eth_getLogs, its logs may be pushed after the header
+- Disconnect or silent connection: reconnect with exponential backoff, blocks missed meanwhile are filled with eth_getLogs
+- Transactions / receipts are still fetched over the HTTP `w3` of the Runner
+- Requires websockets >= 12 (sync client), installed along with web3
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+from hexbytes import HexBytes
+from web3 import Web3
+import json, threading
+
+from .runner import Runner
+from .collector import shard_addresses
+from .tx_tracker import get_sink
+
+def _format_log(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-RPC log object to the shape returned by w3.eth.get_logs"""
+    return {
+        "address": Web3.to_checksum_address(raw["address"]),
+        "topics": [HexBytes(t) for t in raw.get("topics", [])],
+        "data": HexBytes(raw.get("data", "0x")),
+        "blockNumber": int(raw["blockNumber"], 16),
+        "blockHash": HexBytes(raw["blockHash"]),
+        "transactionHash": HexBytes(raw["transactionHash"]),
+        "transactionIndex": int(raw["transactionIndex"], 16),
+        "logIndex": int(raw["logIndex"], 16),
+        "removed": bool(raw.get("removed", False)),
+    }
+
+def _log_id(log: Dict[str, Any]) -> Tuple[bytes, int]:
+    return bytes(log["transactionHash"]), log["logIndex"]
+
+class WsRunner(Runner):
+    """
+    Runner driven by eth_subscribe notifications instead of a fixed sleep.
+    - ws_url: WebSocket endpoint of the same chain as `w3`
+    - idle_timeout: seconds without any message before the connection is considered dead
+    - backoff: (first, max) reconnection delay in seconds, doubled after each failed attempt
+    - reorg_depth: processed blocks whose tx hashes are kept, to process them again after a reorg
+    """
+    def __init__(self, w3: Web3, ws_url: str, idle_timeout: float=30.0, backoff: Tuple[float, float]=(1.0, 30.0), reorg_depth: int=64, **kwargs):
+        super().__init__(w3, **kwargs)
+        if self.store_tx_analyze and not get_sink().can_retract:
+            raise ValueError(f"WsRunner with store_tx_analyze needs a sink able to retract reorged blocks, not {type(get_sink()).__name__}")
+        self.ws_url = ws_url
+        self.idle_timeout = float(idle_timeout)
+        self.backoff = (float(backoff[0]), float(backoff[1]))
+        self._head: Optional[int] = None          # last pushed head
+        self._covered_from: Optional[int] = None  # first block whose logs are all pushed on the live connection
+        self._pushed: Dict[int, Dict[Tuple[bytes, int], Dict[str, Any]]] = {}
+        self._stop = threading.Event()
+        self._ws = None
+        self.reorg_depth = max(1, int(reorg_depth))
+        self._recent: Dict[int, List[str]] = {}  # tx hashes of the last processed blocks
+        self._reorged_from: Optional[int] = None  # first processed block with a removed log
+        self._redo: Set[str] = set()              # rolled back tx hashes, processed again even if seen
+        self._redo_until = -1                     # ... until the rounds are back past this block
+        self.reorgs = 0
+        self.rolled_back_blocks = 0
+        self.reconnects = 0
+        self.pushed_logs = 0
+        self.gap_filled_blocks = 0  # blocks collected with eth_getLogs
+
+    # ---- Runner hooks ----
+
+    def _safe_head(self) -> int:
+        head = self._head if self._head is not None else self.w3.eth.block_number
+        return max(0, head - self.confirmations)
+
+    def _collect(self, b0: int, b1: int) -> List[dict]:
+        """Pushed logs for the covered blocks, eth_getLogs for the others"""
+        for bn in [bn for bn in self._pushed if bn < b0]:
+            del self._pushed[bn]  # rounds only move forward
+        cov = self._covered_from
+        # Pushed logs of a block are complete once a later head is announced
+        lo, hi = (b1 + 1, b1) if cov is None else (max(b0, cov), min(b1, self._head - 1))
+        spans = [(b0, b1)] if lo > hi else [(b0, lo - 1), (hi + 1, b1)]
+        merged: Dict[Tuple[bytes, int], Dict[str, Any]] = {}
+        for s, e in spans:
+            if s > e:
+                continue
+            for log in super()._collect(s, e):
+                merged[_log_id(log)] = log
+            self.gap_filled_blocks += e - s + 1
+        for bn in range(lo, hi + 1):
+            merged.update(self._pushed.get(bn, {}))
+        return sorted(merged.values(), key=lambda x: (x["blockNumber"], x["logIndex"]))
+
+    def _unseen(self, cand: List[str]) -> List[str]:
+        return [h for h in cand if h not in self.seen or h in self._redo]
+
+    def _process(self, logs: List[dict], by_block: Dict[int, List[str]], todo: List[str]) -> List[dict]:
+        out = super()._process(logs, by_block, todo)
+        for bn, hashes in by_block.items():
+            self._recent[bn] = hashes
+        for bn in sorted(self._recent)[:-self.reorg_depth]:
+            del self._recent[bn]
+        return out
+
+    def _rollback(self) -> None:
+        """Retract the blocks from the first one with a removed log to last_safe_head, and rewind to process them again"""
+        first, last = self._reorged_from, self.last_safe_head
+        self._reorged_from = None
+        if last is None or first > last:
+            return
+        if not self._recent or first < min(self._recent):
+            print(f"[ws_runner] reorg deeper than the {self.reorg_depth} blocks kept, txs of the older blocks are not processed again")
+        redo = [h for bn in range(first, last + 1) for h in self._recent.pop(bn, [])]
+        if self.store_tx_analyze:
+            get_sink().retract_blocks(first, last)
+        self._redo.update(redo)
+        self._redo_until = max(self._redo_until, last)
+        self.reorgs += 1
+        self.rolled_back_blocks += last - first + 1
+        print(f"[ws_runner] reorg: rolled back blocks [{first},{last}], {len(redo)} txs to process again")
+        self.last_safe_head = first - 1
+        self._save_state()
+
+    def proceed(self) -> int:
+        if self._reorged_from is not None:
+            self._rollback()
+        n = super().proceed()
+        if self._redo and self.last_safe_head is not None and self.last_safe_head >= self._redo_until:
+            self._redo.clear()  # the new branch is processed, txs not included again are dropped
+        return n
+
+    # ---- WebSocket ----
+
+    def _connect(self):
+        try:
+            from websockets.sync.client import connect
+        except ImportError as e:
+            raise ImportError("WsRunner needs websockets >= 12: pip install -U websockets") from e
+        return connect(self.ws_url, open_timeout=self.idle_timeout, max_size=None)
+
+    def _subscribe(self, ws) -> Dict[str, str]:
+        """Subscribe newHeads and logs (one subscription per watchlist shard), return {subscription id: kind}"""
+        requests = [["newHeads"]]
+        for shard in shard_addresses(self.watchlist, self.shard_size):
+            flt: Dict[str, Any] = {"address": shard}
+            if self.topics:
+                flt["topics"] = [self.topics]
+            requests.append(["logs", flt])
+        for i, params in enumerate(requests, 1):
+            ws.send(json.dumps({"jsonrpc": "2.0", "id": i, "method": "eth_subscribe", "params": params}))
+
+        subs: Dict[str, str] = {}
+        early: List[Dict[str, Any]] = []
+        while len(subs) < len(requests):
+            msg = json.loads(ws.recv(timeout=self.idle_timeout))
+            i = msg.get("id")
+            if i is None:
+                early.append(msg)  # notification of a subscription confirmed before the others
+                continue
+            if "error" in msg:
+                raise RuntimeError(f"eth_subscribe {requests[i - 1][0]} rejected: {msg['error']}")
+            subs[msg["result"]] = requests[i - 1][0]
+        # Coverage starts at the first pushed head (_on_message), not at the HTTP head which may lag
+        for msg in early:
+            self._on_message(msg, subs)
+        return subs
+
+    def _on_message(self, msg: Dict[str, Any], subs: Dict[str, str]) -> bool:
+        """Apply one notification, return True for a new head"""
+        params = msg.get("params") or {}
+        kind = subs.get(params.get("subscription"))
+        result = params.get("result")
+        if kind == "newHeads":
+            self._head = int(result["number"], 16)
+            if self._covered_from is None:
+                self._covered_from = self._head  # imported after the subscriptions, every log of it is pushed
+            return True
+        if kind == "logs":
+            log = _format_log(result)
+            block = self._pushed.setdefault(log["blockNumber"], {})
+            if log["removed"]:
+                block.pop(_log_id(log), None)
+                if self.last_safe_head is not None and log["blockNumber"] <= self.last_safe_head:
+                    # Reorg of a block already processed: rolled back at the next round
+                    self._reorged_from = min(self._reorged_from or log["blockNumber"], log["blockNumber"])
+            else:
+                block[_log_id(log)] = log
+                self.pushed_logs += 1
+        return False
+
+    def _round(self) -> None:
+        try:
+            self.proceed()
+        except Exception as e:
+            print(f"[ws_runner] step error: {e}")
+
+    def _reset_connection_state(self) -> None:
+        self._ws = None
+        self._head = None
+        self._covered_from = None
+        self._pushed.clear()
+
+    def stop(self) -> None:
+        """Stop run_loop from another thread"""
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+
+    def run_loop(self) -> None:
+        print(f"[ws_runner] loop start: {self.ws_url}, window={self.window}, conf={self.confirmations}")
+        delay = self.backoff[0]
+        self._stop.clear()
+        try:
+            while not self._stop.is_set():
+                try:
+                    with self._connect() as ws:
+                        self._ws = ws
+                        subs = self._subscribe(ws)
+                        delay = self.backoff[0]
+                        self._round()  # catch up on what was missed while disconnected
+                        while not self._stop.is_set():
+                            if self._on_message(json.loads(ws.recv(timeout=self.idle_timeout)), subs):
+                                self._round()
+                except Exception as e:
+                    self._reset_connection_state()
+                    if self._stop.is_set():
+                        break
+                    self.reconnects += 1
+                    print(f"[ws_runner] connection lost ({e!r}), reconnecting in {delay:.1f}s")
+                    self._stop.wait(delay)
+                    delay = min(self.backoff[1], delay * 2)
+        except KeyboardInterrupt:
+            pass
+        self._reset_connection_state()
+        print("[ws_runner] stopped")
+
+# End of file
@@ -0,0 +1,110 @@
+"""
+AsyncRunner against the local fake node replaying a synthetic fixture:
+same results as Runner in every mode, batch_size honored, max_in_flight bounds the requests in flight,
+run_loop re-raises a cancellation.
+"""
+
+import asyncio, threading
+import pytest
+from web3 import AsyncWeb3, Web3
+
+from chainkit.bench import synthetic_fixture
+from chainkit.fake_node import FakeNode, replay_handlers
+from chainkit.runner import AsyncRunner, Runner
+
+class CountingNode(FakeNode):
+    """FakeNode recording the largest number of HTTP requests handled at the same time"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = self.peak = 0
+        self._count_lock = threading.Lock()
+
+    def handle(self, payload):
+        with self._count_lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            return super().handle(payload)
+        finally:
+            with self._count_lock:
+                self.in_flight -= 1
+
+MODES = {
+    "per_tx": {"batch_size": 20},
+    "block_mode": {"block_mode": True},
+    "log_only": {"log_only": True},
+}
+
+@pytest.fixture(scope="module")
+def fx():
+    return synthetic_fixture(n_blocks=20, txs_per_block=5, pairs=4)
+
+def run_sync(fx, **kwargs):
+    out = []
+    class Probe(Runner):
+        def _process(self, logs, by_block, todo):
+            res = super()._process(logs, by_block, todo)
+            out.extend(res)
+            return res
+    with CountingNode(replay_handlers(fx)) as node:
+        Probe(Web3(Web3.HTTPProvider(node.url)), window=20, confirmations=0, watchlist=fx["meta"]["watchlist"], **kwargs).proceed()
+    return out
+
+def run_async(fx, max_in_flight, **kwargs):
+    out = []
+    class Probe(AsyncRunner):
+        async def _async_process(self, logs, by_block, todo):
+            res = await super()._async_process(logs, by_block, todo)
+            out.extend(res)
+            return res
+    with CountingNode(replay_handlers(fx), latency=0.01) as node:
+        runner = Probe(AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(node.url)), max_in_flight=max_in_flight, window=20, confirmations=0,
+                       watchlist=fx["meta"]["watchlist"], **kwargs)
+        async def one_round():
+            try:
+                return await runner.proceed()
+            finally:
+                await runner.w3.provider.disconnect()
+        processed = asyncio.run(one_round())
+    return out, processed, node
+
+@pytest.mark.parametrize("mode", list(MODES))
+def test_async_matches_sync(fx, mode):
+    expected = run_sync(fx, **MODES[mode])
+    got, processed, node = run_async(fx, 4, **MODES[mode])
+    assert expected and got == expected and processed == len(expected)
+    assert node.peak <= 4
+
+def test_batch_size_is_used(fx):
+    got, _, node = run_async(fx, 4, batch_size=20)
+    calls = sum(1 for m, _ in node.calls if m in ("eth_getTransactionByHash", "eth_getTransactionReceipt"))
+    assert calls == 2 * len(got)
+    assert node.http_requests < calls // 5  # 10 txs per batch instead of one request per call
+
+def test_in_flight_counts_requests(fx):
+    # batch_size 2: one tx per batch, i.e. two plain calls per tx; at most 3 of them in flight
+    _, _, node = run_async(fx, 3, batch_size=2)
+    assert node.peak == 3
+
+def test_async_helpers_do_not_shadow_runner():
+    assert not asyncio.iscoroutinefunction(AsyncRunner._safe_head)
+    assert not asyncio.iscoroutinefunction(AsyncRunner._update_pool_index)
+    assert not asyncio.iscoroutinefunction(AsyncRunner._process)
+
+def test_cancel_propagates(fx):
+    with CountingNode(replay_handlers(fx)) as node:
+        runner = AsyncRunner(AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(node.url)), window=20, confirmations=0,
+                             watchlist=fx["meta"]["watchlist"], log_only=True)
+        runner.sleep_secs = 0.05
+        async def cancel_later():
+            task = asyncio.create_task(runner.run_loop())
+            await asyncio.sleep(0.3)
+            task.cancel()
+            try:
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+            finally:
+                await runner.w3.provider.disconnect()
+        asyncio.run(cancel_later())
+
+# End of file
@@ -0,0 +1,93 @@
+"""
+is_limit_error on provider messages, and collect_tx_hashes against the local fake node:
+limit rejections shrink the span, a timeout is retried once first, unrelated errors are raised as they are.
+"""
+
+import time
+import pytest
+import requests
+from web3 import Web3
+from web3.exceptions import Web3RPCError
+
+from chainkit.collector import SpanTuner, collect_tx_hashes, is_limit_error, is_timeout
+from chainkit.fake_node import FakeNode, RPCError
+
+LIMIT_MESSAGES = [
+    "{'code': -32005, 'message': 'query returned more than 10000 results'}",
+    "{'code': -32602, 'message': 'Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range'}",
+    "{'code': -32000, 'message': 'exceed maximum block range: 5000'}",
+    "{'code': -32000, 'message': 'block range is too wide'}",
+    "413 Client Error: Request Entity Too Large for url: https://rpc.example",
+    "{'code': -32005, 'message': 'too many addresses in filter'}",
+]
+
+UNRELATED_MESSAGES = [
+    "{'code': -32000, 'message': 'execution reverted: transfer amount exceeds balance'}",
+    "{'code': -32602, 'message': 'invalid argument 0: hex string without 0x prefix'}",
+    "{'code': -32000, 'message': 'missing trie node, state is not available'}",
+    "{'code': -32000, 'message': 'rate limit: too many requests'}",
+    "{'code': -32005, 'message': 'limit exceeded'}",
+    "{'code': -32005, 'message': 'project ID request rate exceeded'}",
+    "{'code': -32005, 'message': 'rate limit exceeded, block range too wide to retry'}",
+    "{'code': -32000, 'message': 'header not found'}",
+    "{'code': -32000, 'message': 'index out of range'}",
+]
+
+@pytest.mark.parametrize("msg", LIMIT_MESSAGES)
+def test_limit_messages(msg):
+    assert is_limit_error(Web3RPCError(msg))
+
+@pytest.mark.parametrize("msg", UNRELATED_MESSAGES)
+def test_unrelated_messages(msg):
+    assert not is_limit_error(Web3RPCError(msg))
+
+def test_timeouts_are_not_limits_by_themselves():
+    e = requests.exceptions.ReadTimeout("HTTPSConnectionPool(host='rpc.example'): Read timed out.")
+    assert is_timeout(e) and not is_limit_error(e)
+
+def logs_handler(max_span, error=None, slow=lambda span, n: False):
+    """eth_getLogs rejecting spans over max_span; slow(span, n) delays the n-th call with that span past the client timeout"""
+    tries = {}
+    def get_logs(params):
+        b0, b1 = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+        if error is not None:
+            raise RPCError(-32000, error)
+        n = tries[b1 - b0 + 1] = tries.get(b1 - b0 + 1, 0) + 1
+        if slow(b1 - b0 + 1, n):
+            time.sleep(0.5)
+        if b1 - b0 + 1 > max_span:
+            raise RPCError(-32000, f"exceed maximum block range: {max_span}")
+        return []
+    return {"eth_chainId": lambda p: "0x38", "eth_getLogs": get_logs}
+
+def test_limit_rejection_shrinks_the_span():
+    with FakeNode(logs_handler(max_span=100)) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        assert collect_tx_hashes(w3, ["0x" + "ab" * 20], 1000, 1999, tuner=SpanTuner()) == []
+        spans = [int(p[0]["toBlock"], 16) - int(p[0]["fromBlock"], 16) + 1 for m, p in node.calls if m == "eth_getLogs"]
+        assert spans[0] == 1000 and min(spans) <= 100  # first try the whole range, then under the provider limit
+
+def test_unrelated_error_is_raised_once():
+    with FakeNode(logs_handler(max_span=100, error="missing trie node, state exceeds pruning window")) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        with pytest.raises(Web3RPCError, match="missing trie node"):
+            collect_tx_hashes(w3, ["0x" + "ab" * 20], 1000, 1999, tuner=SpanTuner())
+        assert sum(1 for m, _ in node.calls if m == "eth_getLogs") == 1
+
+def timing_out_w3(node):
+    return Web3(Web3.HTTPProvider(node.url, request_kwargs={"timeout": 0.2}, exception_retry_configuration=None))
+
+def logs_spans(node):
+    return [int(p[0]["toBlock"], 16) - int(p[0]["fromBlock"], 16) + 1 for m, p in node.calls if m == "eth_getLogs"]
+
+def test_timeout_is_retried_once():
+    with FakeNode(logs_handler(max_span=10000, slow=lambda span, n: n == 1)) as node:
+        collect_tx_hashes(timing_out_w3(node), ["0x" + "ab" * 20], 1000, 1999, tuner=SpanTuner())
+        assert logs_spans(node) == [1000, 1000]  # retried with the same span, no shrink
+
+def test_repeated_timeout_shrinks_the_span():
+    with FakeNode(logs_handler(max_span=10000, slow=lambda span, n: span > 300)) as node:
+        collect_tx_hashes(timing_out_w3(node), ["0x" + "ab" * 20], 1000, 1999, tuner=SpanTuner())
+        assert logs_spans(node)[:4] == [1000, 1000, 500, 500]
+
+# End of file
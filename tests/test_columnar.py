@@ -0,0 +1,55 @@
+"""
+decode_batch against the per-log handlers: same events and same split between batch and per-log decoding,
+whatever the payload type (bytes / HexBytes / '0x' string) and with extra topics or trailing data bytes.
+"""
+
+import pytest
+from hexbytes import HexBytes
+
+np = pytest.importorskip("numpy")
+
+from chainkit.columnar import decode_batch
+from chainkit.decoders import sig_topic, to_bytes, to_hexstr
+from chainkit.registry_event import BUILTIN_EVENTS, check_layout
+
+TRANSFER = sig_topic("Transfer(address,address,uint256)")
+
+def word(x: int) -> bytes:
+    return x.to_bytes(32, "big")
+
+def transfer(i: int, topics_extra: int=0, data: bytes=None, as_str: bool=False, ntopics: int=3):
+    topics = [HexBytes(TRANSFER), HexBytes(word(0xa0 + i)), HexBytes(word(0xb0 + i))][:ntopics]
+    topics += [HexBytes(word(0xc0 + j)) for j in range(topics_extra)]
+    payload = word(1000 + i) if data is None else data
+    return {"address": "0x" + f"{i + 1:040x}", "topics": topics, "data": "0x" + payload.hex() if as_str else HexBytes(payload),
+            "blockNumber": 10, "logIndex": i, "transactionHash": HexBytes(word(i))}
+
+def per_log(log):
+    topics_hex = [to_hexstr(t).lower() for t in log["topics"]]
+    data = to_bytes(log["data"])
+    meta = BUILTIN_EVENTS[topics_hex[0]]
+    if check_layout(meta, len(topics_hex), len(data)) is not None:
+        return None
+    ev = meta["handler"](log, topics_hex, data)
+    ev.update({"block_number": log["blockNumber"], "tx_hash": to_hexstr(log["transactionHash"]).lower(), "log_index": log["logIndex"]})
+    return ev
+
+def test_batch_matches_handlers():
+    logs = [
+        transfer(0),
+        transfer(1, as_str=True),
+        transfer(2, data=word(7) + word(8) + b"\x01\x02"),   # 66 bytes: 2 + 2 * 32, but bytes, not a hex string
+        transfer(3, data=word(9) + word(10), as_str=True),  # trailing word in a hex string
+        transfer(4, topics_extra=1),                        # extra topic
+        transfer(5, data=b"\x01" * 31),                     # short data
+        transfer(6, ntopics=2),                             # missing topic
+        transfer(7, data=b""),                              # ERC721 shaped, no data
+    ]
+    batches, rest = decode_batch(logs)
+    rows = batches[TRANSFER.lower()].rows()
+    expected = [per_log(log) for log in logs]
+    assert rows == [ev for ev in expected if ev is not None]
+    assert [log["logIndex"] for log in rest] == [i for i, ev in enumerate(expected) if ev is None]
+    assert rows[2]["args"]["value"] == 7
+
+# End of file
@@ -0,0 +1,127 @@
+"""
+fetch_many / analyze_many against the local fake JSON-RPC node:
+batch cap shrink on size rejections only, retries of other errors, input order;
+fetch_block falls back to per tx calls only when eth_getBlockReceipts is missing.
+"""
+
+import asyncio, random
+import pytest
+from web3 import AsyncWeb3, Web3
+
+from chainkit import tx_tracker
+from chainkit.collector import provider_key
+from chainkit.fake_node import FakeNode, RPCError
+from chainkit.tx_tracker import BATCH_CAPS, analyze_many, analyze_tx, async_analyze_block, fetch_block, fetch_many
+
+def word(x: int) -> str:
+    return "0x" + x.to_bytes(32, "big").hex()
+
+def tx_of(i: int) -> dict:
+    return {"hash": word(i), "from": "0x" + f"{i:040x}", "to": "0x" + "22" * 20, "blockNumber": hex(100 + i),
+            "blockHash": word(7), "transactionIndex": hex(i), "nonce": "0x0", "value": "0x0", "gas": "0x5208",
+            "gasPrice": "0x1", "input": "0x", "type": "0x0", "v": "0x1b", "r": word(1), "s": word(1)}
+
+def receipt_of(i: int) -> dict:
+    log = {"address": "0x" + "ab" * 20, "topics": [word(0xdd), word(i), word(2)], "data": word(i * 10),
+           "logIndex": hex(i), "blockNumber": hex(100 + i), "blockHash": word(7), "transactionHash": word(i),
+           "transactionIndex": hex(i), "removed": False}
+    return {"transactionHash": word(i), "blockNumber": hex(100 + i), "blockHash": word(7), "transactionIndex": hex(i),
+            "from": "0x" + f"{i:040x}", "to": "0x" + "22" * 20, "gasUsed": hex(21000 + i), "cumulativeGasUsed": "0x0",
+            "status": "0x1", "logs": [log], "logsBloom": "0x" + "00" * 256, "type": "0x0",
+            "effectiveGasPrice": "0x1", "contractAddress": None}
+
+IDS = {word(i): i for i in range(1, 30)}
+
+def handlers(fail=None):
+    """eth_getTransactionByHash / eth_getTransactionReceipt; fail(i) may raise before a receipt is answered"""
+    def receipt(p):
+        if fail is not None:
+            fail(IDS[p[0]])
+        return receipt_of(IDS[p[0]])
+    return {
+        "eth_chainId": lambda p: "0x38",
+        "eth_getTransactionByHash": lambda p: tx_of(IDS[p[0]]),
+        "eth_getTransactionReceipt": receipt,
+    }
+
+def test_cap_shrinks_on_batch_size_rejection():
+    with FakeNode(handlers(), max_batch=6) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        hashes = list(IDS)
+        pairs = fetch_many(w3, hashes, batch_size=40)
+        assert [tx["hash"].hex() for tx, _ in pairs] == [h[2:] for h in hashes]
+        cap = BATCH_CAPS[provider_key(w3)]
+        assert 2 <= cap <= 6
+
+        # The remembered cap is used right away by the next call
+        node.http_requests = 0
+        fetch_many(w3, hashes[:6], batch_size=40)
+        assert node.http_requests == -(-6 * 2 // cap)
+
+def test_other_errors_keep_the_batch_size():
+    failed = set()
+    def flaky(i: int) -> None:
+        if i % 5 == 0 and i not in failed:
+            failed.add(i)
+            raise RPCError(-32000, "header not found")
+
+    with FakeNode(handlers(flaky), max_batch=100) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        hashes = list(IDS)
+        pairs = fetch_many(w3, hashes, batch_size=20)
+        assert [r["transactionHash"].hex() for _, r in pairs] == [h[2:] for h in hashes]
+        assert failed
+        assert provider_key(w3) not in BATCH_CAPS
+
+def test_persistent_error_is_raised():
+    def broken(i: int) -> None:
+        if i == 3:
+            raise RPCError(-32000, "internal error")
+
+    with FakeNode(handlers(broken)) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        with pytest.raises(Exception, match="internal error"):
+            fetch_many(w3, list(IDS), batch_size=10, retries=2)
+        assert provider_key(w3) not in BATCH_CAPS
+
+def test_analyze_many_keeps_input_order():
+    hashes = list(IDS)
+    random.Random(7).shuffle(hashes)
+    with FakeNode(handlers(), max_batch=6, latency=0.001) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        expected = [analyze_tx(w3, h) for h in hashes]
+        got = analyze_many(w3, hashes, batch_size=20)
+        assert got == expected
+        assert [r["tx_hash"] for r in got] == hashes
+
+def receipts_failing(code, message):
+    def get_block_receipts(p):
+        raise RPCError(code, message)
+    return dict(handlers(), eth_getBlockReceipts=get_block_receipts)
+
+def test_missing_block_receipts_falls_back():
+    with FakeNode(receipts_failing(-32601, "the method eth_getBlockReceipts does not exist/is not available")) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        pairs = fetch_block(w3, 101, [word(1)])
+        assert [r["transactionHash"].hex() for _, r in pairs] == [word(1)[2:]]
+
+def test_other_block_receipts_errors_are_raised():
+    with FakeNode(receipts_failing(-32000, "header not found")) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        with pytest.raises(Exception, match="header not found"):
+            fetch_block(w3, 101, [word(1)])
+        assert not any(m == "eth_getTransactionReceipt" for m, _ in node.calls)
+
+        async def run():
+            aw3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(node.url))
+            try:
+                return await async_analyze_block(aw3, 101, [word(1)])
+            finally:
+                await aw3.provider.disconnect()
+        with pytest.raises(Exception, match="header not found"):
+            asyncio.run(run())
+
+def test_module_self_check():
+    tx_tracker._test_analyze_many()
+
+# End of file
@@ -0,0 +1,49 @@
+"""
+PipelineRunner against the local fake node replaying a synthetic fixture: same results as Runner in every mode.
+"""
+
+import pytest
+from web3 import Web3
+
+from chainkit.bench import synthetic_fixture
+from chainkit.fake_node import FakeNode, replay_handlers
+from chainkit.pipeline import PipelineRunner
+from chainkit.runner import Runner
+
+MODES = {
+    "per_tx": {"batch_size": 20},
+    "block_mode": {"block_mode": True},
+    "log_only": {"log_only": True},
+}
+
+@pytest.fixture(scope="module")
+def fx():
+    return synthetic_fixture(n_blocks=20, txs_per_block=5, pairs=4)
+
+def run_sync(fx, **kwargs):
+    out = []
+    class Probe(Runner):
+        def _process(self, logs, by_block, todo):
+            res = super()._process(logs, by_block, todo)
+            out.extend(res)
+            return res
+    with FakeNode(replay_handlers(fx)) as node:
+        Probe(Web3(Web3.HTTPProvider(node.url)), window=20, confirmations=0, watchlist=fx["meta"]["watchlist"], **kwargs).proceed()
+    return out
+
+@pytest.mark.parametrize("mode", list(MODES))
+def test_pipeline_matches_runner(fx, mode):
+    expected = run_sync(fx, **MODES[mode])
+    got = []
+    with FakeNode(replay_handlers(fx)) as node:
+        runner = PipelineRunner(Web3(Web3.HTTPProvider(node.url)), sink=got.extend, window=20, confirmations=0,
+                                watchlist=fx["meta"]["watchlist"], **MODES[mode])
+        runner.run_loop(max_windows=1)
+        methods = {m for m, _ in node.calls}
+    assert expected and got == expected
+    if mode == "log_only":
+        assert methods <= {"eth_chainId", "eth_blockNumber", "eth_getLogs"}
+    elif mode == "block_mode":
+        assert "eth_getBlockReceipts" in methods and "eth_getTransactionReceipt" not in methods
+
+# End of file
@@ -0,0 +1,33 @@
+"""
+StateStore.load with a max_seen different from the stored one: seen is rebuilt with the current capacity.
+"""
+
+import json
+
+from chainkit.state import StateStore
+
+def key(i: int) -> str:
+    return "0x" + i.to_bytes(32, "big").hex()
+
+def test_snapshot_is_resized(tmp_path):
+    store = StateStore(str(tmp_path / "state.json"))
+    head, seen = store.load(10)
+    for i in range(10):
+        seen.add(key(i))
+    store.compact(seen, 42)
+
+    head, seen = StateStore(str(tmp_path / "state.json")).load(4)
+    assert head == 42 and seen.capacity == 4
+    assert seen.to_list() == [key(i) for i in range(6, 10)]  # newest keys kept
+
+    head, seen = StateStore(str(tmp_path / "state.json")).load(50)
+    assert seen.capacity == 50 and len(seen) == 10
+
+def test_legacy_state_uses_current_capacity(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps({"last_safe_head": 7, "seen_tx": [key(i) for i in range(5)], "dedup_capacity": 100}))
+    head, seen = StateStore(str(path)).load(3)
+    assert head == 7 and seen.capacity == 3
+    assert seen.to_list() == [key(i) for i in range(2, 5)]
+
+# End of file
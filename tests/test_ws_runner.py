@@ -0,0 +1,198 @@
+"""
+WsRunner against a local WebSocket stand-in replaying recorded blocks (newHeads + logs) and the fake HTTP node
+answering eth_getLogs: pushed blocks need no eth_getLogs, a dropped connection is resumed and its gap filled,
+removed logs are skipped, a removed log of a processed block rolls it back and processes it again.
+"""
+
+import json, os, queue, sqlite3, tempfile, threading, time
+from typing import Any, Dict, List, Optional
+import pytest
+from hexbytes import HexBytes
+from web3 import Web3
+
+pytest.importorskip("websockets")
+from websockets.sync.server import serve
+
+from chainkit.decoders import sig_topic
+from chainkit.fake_node import FakeNode
+from chainkit.sink import EventSink, SQLiteSink
+from chainkit.tx_tracker import set_sink
+from chainkit.ws_runner import WsRunner, _format_log, _log_id
+
+SWAP = sig_topic("Swap(address,uint256,uint256,uint256,uint256,address)")
+PAIR = "0x" + "a1" * 20
+
+def word(x: int) -> str:
+    return "0x" + x.to_bytes(32, "big").hex()
+
+def log_of(bn: int, i: int, removed: bool=False) -> Dict[str, Any]:
+    return {"address": PAIR, "topics": [SWAP, word(1), word(2)], "data": "0x" + "00" * 96 + f"{bn:064x}",
+            "blockNumber": hex(bn), "blockHash": word(bn), "transactionHash": word(bn * 10 + i),
+            "transactionIndex": hex(i), "logIndex": hex(i), "removed": removed}
+
+def wait_for(cond, timeout: float=10.0) -> None:
+    t = time.time()
+    while not cond():
+        assert time.time() - t < timeout, "timed out"
+        time.sleep(0.01)
+
+class Stand:
+    """Recorded chain served over HTTP (eth_blockNumber / eth_getLogs) and pushed over a WebSocket stand-in"""
+    def __init__(self):
+        self.chain = {"head": 100, "lag": 0}
+        self.recorded = {bn: [log_of(bn, 0), log_of(bn, 1)] for bn in range(90, 121)}
+        self.pushes: "queue.Queue" = queue.Queue()
+        self.subscribed = threading.Event()
+        self.processed: List[Dict[str, Any]] = []
+        handlers = {"eth_chainId": lambda p: "0x38", "eth_blockNumber": lambda p: hex(self.chain["head"] - self.chain["lag"]),
+                    "eth_getLogs": self.get_logs}
+        self.node = FakeNode(handlers).start()
+        self.server = serve(self.ws_handler, "127.0.0.1", 0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.ws_url = "ws://127.0.0.1:%d" % self.server.socket.getsockname()[1]
+        self.runner: Optional[WsRunner] = None
+        self.worker: Optional[threading.Thread] = None
+
+    def get_logs(self, params):
+        b0, b1 = int(params[0]["fromBlock"], 16), min(int(params[0]["toBlock"], 16), self.chain["head"])
+        return [log for bn in range(b0, b1 + 1) for log in self.recorded.get(bn, [])]
+
+    def get_logs_calls(self) -> List[Dict[str, Any]]:
+        return [p[0] for m, p in self.node.calls if m == "eth_getLogs"]
+
+    def ws_handler(self, conn) -> None:
+        subs = {}
+        for _ in range(2):
+            req = json.loads(conn.recv())
+            subs[req["params"][0]] = f"0x{req['id']:x}"
+            conn.send(json.dumps({"jsonrpc": "2.0", "id": req["id"], "result": subs[req["params"][0]]}))
+        self.subscribed.set()
+        while True:
+            item = self.pushes.get()
+            if item == "drop":
+                self.subscribed.clear()
+                return
+            kind, result = item
+            conn.send(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription", "params": {"subscription": subs[kind], "result": result}}))
+
+    def push_logs(self, logs: List[Dict[str, Any]]) -> None:
+        for log in logs:
+            self.pushes.put(("logs", log))
+
+    def mine(self, bn: int, push: bool=True, extra: Optional[List[Dict[str, Any]]]=None) -> None:
+        self.chain["head"] = bn
+        if push:
+            self.push_logs(self.recorded[bn] + (extra or []))
+            self.pushes.put(("newHeads", {"number": hex(bn), "hash": word(bn)}))
+
+    def start(self, **kwargs) -> WsRunner:
+        processed = self.processed
+        class Probe(WsRunner):
+            def _process(self, logs, by_block, todo):
+                out = super()._process(logs, by_block, todo)
+                processed.extend(out)
+                return out
+        self.runner = Probe(Web3(Web3.HTTPProvider(self.node.url)), self.ws_url, window=20, confirmations=1, log_only=True,
+                            watchlist=[PAIR], backoff=(0.05, 0.2), **kwargs)
+        self.worker = threading.Thread(target=self.runner.run_loop, daemon=True)
+        self.worker.start()
+        wait_for(lambda: self.runner.last_safe_head == 99)  # initial catch-up with eth_getLogs
+        return self.runner
+
+    def close(self) -> None:
+        if self.runner is not None:
+            self.runner.stop()
+            self.worker.join(timeout=5)
+        self.pushes.put("drop")  # release the stand-in handler so the server can shut down
+        self.server.shutdown()
+        self.node.stop()
+
+@pytest.fixture
+def stand():
+    s = Stand()
+    try:
+        yield s
+    finally:
+        s.close()
+
+def test_pushes_reconnect_and_removed_logs(stand):
+    runner = stand.start()
+    for bn in range(101, 106):
+        stand.mine(bn)
+    wait_for(lambda: runner.last_safe_head == 104)
+    assert all(int(p["toBlock"], 16) <= 100 for p in stand.get_logs_calls())  # 101..104 came from the pushes
+
+    stand.pushes.put("drop")
+    for bn in range(106, 111):
+        stand.mine(bn, push=False)  # missed while disconnected
+    stand.chain["lag"] = 3  # the HTTP endpoint lags behind the WebSocket one after the reconnect
+    wait_for(lambda: runner.reconnects == 1 and stand.subscribed.is_set() and runner.last_safe_head == 106)
+    stand.chain["lag"] = 0
+    removed = log_of(113, 2)  # pushed, then retracted by a removed: true log before its block is processed
+    for bn in range(111, 115):
+        stand.mine(bn, extra=[removed, dict(removed, removed=True)] if bn == 113 else None)
+    wait_for(lambda: runner.last_safe_head == 113)
+
+    hashes = [r["tx_hash"] for r in stand.processed]
+    expected = {log["transactionHash"] for bn in range(90, 114) for log in stand.recorded[bn]}
+    assert len(hashes) == len(set(hashes)) and set(hashes) == expected
+    assert all(int(p["toBlock"], 16) < 111 for p in stand.get_logs_calls())
+    assert runner.gap_filled_blocks > 0 and runner.pushed_logs >= 16 and runner.reorgs == 0
+
+def test_removed_log_of_processed_block_rolls_back(stand):
+    with tempfile.TemporaryDirectory() as d:
+        db = os.path.join(d, "events.db")
+        store = SQLiteSink(db)
+        set_sink(store)
+        try:
+            runner = stand.start(store_tx_analyze=True)
+            for bn in range(101, 106):
+                stand.mine(bn)
+            wait_for(lambda: runner.last_safe_head == 104)
+
+            # 103..105 replaced: the first tx of 103 is included again, the others are new
+            old = {bn: stand.recorded[bn] for bn in (103, 104, 105)}
+            stand.recorded.update({bn: [dict(log_of(bn, i + 5), blockHash=word(bn + 1000)) for i in range(2)] for bn in (104, 105)})
+            stand.recorded[103] = [dict(old[103][0], blockHash=word(1103)), dict(log_of(103, 5), blockHash=word(1103))]
+            stand.push_logs([dict(log, removed=True) for bn in (103, 104, 105) for log in old[bn]])
+            for bn in (103, 104, 105):
+                stand.push_logs(stand.recorded[bn])
+            stand.mine(106)
+            wait_for(lambda: runner.last_safe_head == 105)
+            assert runner.reorgs == 1 and runner.rolled_back_blocks == 2
+
+            rows = sqlite3.connect(db).execute("SELECT block_number, tx_hash FROM events WHERE block_number >= 103 ORDER BY block_number, tx_hash").fetchall()
+            assert rows == sorted((bn, log["transactionHash"]) for bn in (103, 104, 105) for log in stand.recorded[bn]), rows
+            reprocessed = [r["tx_hash"] for r in stand.processed if r["block_number"] == 103]
+            assert reprocessed.count(old[103][0]["transactionHash"]) == 2  # seen before the reorg, processed again
+        finally:
+            stand.runner.stop()
+            stand.worker.join(timeout=5)
+            set_sink(None)
+            store.close()
+
+def test_store_needs_a_retracting_sink():
+    class AppendOnly(SQLiteSink):
+        _delete = EventSink._delete
+    with tempfile.TemporaryDirectory() as d:
+        store = AppendOnly(os.path.join(d, "events.db"))
+        set_sink(store)
+        try:
+            with pytest.raises(ValueError, match="retract"):
+                WsRunner(Web3(Web3.HTTPProvider("http://127.0.0.1:1")), "ws://127.0.0.1:1", store_tx_analyze=True)
+        finally:
+            set_sink(None)
+            store.close()
+
+def test_head_block_read_with_get_logs(stand):
+    # confirmations=0: a log of the head block pushed after its newHeads is not lost
+    stand.chain["head"] = 120
+    runner = WsRunner(Web3(Web3.HTTPProvider(stand.node.url)), stand.ws_url, confirmations=0, log_only=True, watchlist=[PAIR])
+    runner._head, runner._covered_from = 120, 118
+    runner._pushed = {bn: {_log_id(l): l for l in map(_format_log, stand.recorded[bn])} for bn in (118, 119)}
+    runner._pushed[120] = {_log_id(l): l for l in map(_format_log, stand.recorded[120][:1])}  # second log not pushed yet
+    got = runner._collect(118, 120)
+    assert [(p["fromBlock"], p["toBlock"]) for p in stand.get_logs_calls()] == [(hex(120), hex(120))]
+    assert {bytes(l["transactionHash"]) for l in got} == {bytes(HexBytes(l["transactionHash"])) for bn in (118, 119, 120) for l in stand.recorded[bn]}
+
+# End of file